@@ -1,42 +1,364 @@
+import time
+
+# First, so startup timing counts everything below
+import startup
+
 import streamlit as st
-import pandas as pd
 
 from db_functions import (
 connect_to_db,
-get_basic_info,
-get_additional_tables,
-get_suppliers,
+get_dashboard_panels,
+BASIC_INFO_KEYS,
+ADDITIONAL_TABLES,
+METRIC_WINDOWS,
+METRIC_CHANGE_TYPES,
+METRIC_DIMENSIONS,
+get_supplier_index,
 get_categories,add_new_manual_id,
-get_all_products,
-get_product_history,
+get_product_index,
+get_product_history_page,
+get_product_history_summary,
 place_reorder,
 get_pending_reorders,
-mark_reorder_as_received
+get_low_stock,
+mark_reorders_as_received,
+get_panel_freshness,
+get_backend_status
 )
+import change_feed
+import instrumentation
+import query_cache
+
+# pandas, pyarrow (table_view) and bulk_import load in the panels that use them
+startup.mark("imports")
 
 # sidebar
 
 st.sidebar.title("Inventory Management Dashboard")
 option=st.sidebar.radio("Select Options:",["Basic Information","Operational Task"])
+show_diagnostics=st.sidebar.checkbox("Query diagnostics")
+rerun=instrumentation.start_rerun(enabled=show_diagnostics)
+calls_at_start=instrumentation.session_calls()
 
 # Main Space
 st.title("Inventory and Supply Chain Dashboard")
 
+def interaction_calls(start):
+    # Debug counter: backend calls made by this session since `start`
+    if show_diagnostics:
+        st.caption(f"Backend calls this interaction: {instrumentation.session_calls()-start}")
+
+def stale_note(freshness):
+    # Results kept from before a refresh or a backend outage are marked with their age
+    if freshness and freshness["stale"]:
+        age=freshness["age"]
+        age=f"{age/60:.0f} min" if age>=120 else f"{age:.0f} s"
+        st.caption(f"⏳ Last updated {age} ago; refreshing in the background")
+
+@st.fragment
+def paged_table(key,table):
+    # Sorted, filtered and sliced here; only the visible page goes to the browser.
+    # A fragment: its controls rerun only this table
+    import table_view
+    start=instrumentation.session_calls()
+    control_cols=st.columns([3,2,1,1])
+    search=control_cols[0].text_input("Filter",key=f"{key}_search",placeholder="Search all columns")
+    sort_by=control_cols[1].selectbox("Sort by",[None,*table.column_names],key=f"{key}_sort",
+                                      format_func=lambda name: "(unsorted)" if name is None else name)
+    descending=control_cols[2].toggle("Desc",key=f"{key}_desc")
+    page_size=control_cols[3].selectbox("Rows",[25,50,100,250],index=1,key=f"{key}_size")
+
+    matching=table_view.filter_rows(table,search)
+    pages=table_view.page_count(matching.num_rows,page_size)
+    number=st.number_input("Page",min_value=1,max_value=pages,value=1,key=f"{key}_page")
+    st.dataframe(table_view.page(matching,sort_by,descending,number,page_size),hide_index=True)
+    st.caption(f"{matching.num_rows} rows · page {number} of {pages}")
+    interaction_calls(start)
+
 # Connect to database with error handling
 try:
     supabase = connect_to_db()
+    startup.mark("connected")
 except Exception as e:
     st.error(f"Failed to connect to database: {str(e)}")
     st.stop()
 
+# Search box + top matches instead of a selectbox over every product;
+# the selection is resolved by product_id, so duplicate names stay distinct
+LOW_STOCK_PAGE_SIZE = 25
+PICKER_LIMIT = 50
+# Seconds a session reuses a memoized result when nothing was written meanwhile
+SESSION_MEMO_TTL = 30
+
+def session_memo(fetch,*args):
+    # fetch(supabase,*args), remembered for this session and these inputs until any write
+    # (query_cache.version) or SESSION_MEMO_TTL, so unrelated widget changes refetch nothing
+    memo=st.session_state.get("memo",{})
+    version=query_cache.version()
+    key=(fetch.__name__,args)
+    hit=memo.get(key)
+    if hit is not None and hit[0]==version and time.monotonic()-hit[1]<SESSION_MEMO_TTL:
+        return hit[2]
+    value=fetch(supabase,*args)
+    # Results from before a write are stale whatever their inputs
+    memo={k:v for k,v in memo.items() if v[0]==version}
+    memo[key]=(version,time.monotonic(),value)
+    st.session_state["memo"]=memo
+    return value
+
+def product_picker(key):
+    product_index = get_product_index(supabase)
+    search_cols = st.columns([3, 1])
+    query = search_cols[0].text_input("Search Product (name or ID)", key=f"{key}_query")
+    category = search_cols[1].selectbox("Category", [None] + product_index.categories(),
+                                        format_func=lambda c: "All" if c is None else c,
+                                        key=f"{key}_category")
+    matches = product_index.search(query, limit=PICKER_LIMIT, category=category)
+    product_id = st.selectbox("Select An product", options=[p["product_id"] for p in matches],
+                              format_func=product_index.label, key=key)
+    return product_id, product_index
+
+@st.fragment
+def low_stock_panel():
+    import pandas as pd
+    import table_view
+    start=instrumentation.session_calls()
+    low_stock_page=st.number_input("Page",min_value=1,value=1,key="low_stock_page")
+    low_stock=get_low_stock(supabase,low_stock_page,LOW_STOCK_PAGE_SIZE)
+    st.dataframe(pd.DataFrame(low_stock["rows"],columns=["product_id","product_name","stock_quantity","reorder_level"]),
+                 hide_index=True)
+    st.caption(f"{low_stock['total']} products · page {low_stock_page} of "
+               f"{table_view.page_count(low_stock['total'],LOW_STOCK_PAGE_SIZE)}")
+    interaction_calls(start)
+
+@st.fragment
+def window_metrics_panel(metrics):
+    start=instrumentation.session_calls()
+    control_cols=st.columns(2)
+    window=control_cols[0].radio("Window",METRIC_WINDOWS,index=METRIC_WINDOWS.index(90),
+                                 format_func=lambda days: f"Last {days} days",horizontal=True)
+    breakdown=control_cols[1].selectbox("Break down by",["None",*METRIC_DIMENSIONS])
+
+    selected=metrics[metrics["window"]==window]
+    totals=selected.groupby("change_type")[["quantity","value"]].sum()
+
+    cols=st.columns(len(METRIC_CHANGE_TYPES))
+    for col,change_type in zip(cols,METRIC_CHANGE_TYPES):
+        value=totals["value"].get(change_type,0)
+        quantity=totals["quantity"].get(change_type,0)
+        col.metric(label=f"{change_type} Value",value=round(float(value),2),
+                   help=f"{int(quantity)} units")
+
+    if breakdown!="None":
+        dimension=METRIC_DIMENSIONS[breakdown]
+        table=selected.pivot_table(index=dimension,columns="change_type",values=["value","quantity"],
+                                   aggfunc="sum",fill_value=0)
+        table.columns=[f"{change_type} {measure}" for measure,change_type in table.columns]
+        table=table.sort_values("Sale value",ascending=False) if "Sale value" in table else table
+        st.dataframe(table.round(2))
+    interaction_calls(start)
+
+# -------------------- Operational Task panels -----------------------------
+
+@st.fragment
+def add_product_panel():
+    start=instrumentation.session_calls()
+    st.header("Add new Product")
+    categories= get_categories(supabase)
+    supplier_index=get_supplier_index(supabase)
+
+    with st.form("Add Product Form"):
+        product_name=st.text_input("Product Name")
+        product_category=st.selectbox("Category",categories)
+        product_price=st.number_input("Price",min_value=0.00)
+        product_stock=st.number_input("Stock Quantity",min_value=0,step=1)
+        product_level= st.number_input("Reorder Level", min_value=0, step=1)
+
+
+        supplier_ids=[s["supplier_id"] for s in supplier_index.search(limit=len(supplier_index))]
+
+        supplier_id=st.selectbox(
+            "Supplier",
+            options=supplier_ids,
+            format_func=supplier_index.label
+        )
+
+        submitted=st.form_submit_button("Add Product")
+        if submitted:
+            if not product_name:
+                st.error("Please enter the Product Name")
+            else:
+                try:
+                    add_new_manual_id(supabase,
+                                      None,
+                                      product_name,
+                                      product_category,
+                                      product_price,
+                                      product_stock,
+                                      product_level,
+                                      supplier_id)
+                    st.success(f"Product {product_name} Added Successfully")
+                except Exception as e:
+                          st.error(f"Error Adding the {e}")
+    interaction_calls(start)
+
+# ----------------------------- Bulk Import ---------------------
+
+@st.fragment
+def bulk_import_panel():
+    import pandas as pd
+    from bulk_import import import_products, DEFAULT_BATCH_SIZE
+    start=instrumentation.session_calls()
+    st.header("Bulk Import Products")
+    st.caption("CSV or Parquet with columns: product_name, category, price, stock_quantity, reorder_level, supplier_id")
+
+    uploaded_file = st.file_uploader("Product File", type=["csv", "parquet"])
+    batch_size = st.number_input("Batch Size", min_value=1, max_value=5000, value=DEFAULT_BATCH_SIZE, step=100)
+
+    if uploaded_file and st.button("Import Products"):
+        try:
+            with st.spinner("Importing products..."):
+                outcome = import_products(supabase, uploaded_file, batch_size=int(batch_size))
+            st.success(f"Imported {outcome['inserted']} products")
+            if outcome["rejected"]:
+                st.warning(f"{len(outcome['rejected'])} rows rejected")
+                st.dataframe(pd.DataFrame(outcome["rejected"]))
+            if outcome["incomplete"]:
+                st.warning(f"{len(outcome['incomplete'])} products were stored without their initial shipment or stock entry")
+                st.dataframe(pd.DataFrame(outcome["incomplete"]))
+        except Exception as e:
+            st.error(f"Error Importing Products {e}")
+    interaction_calls(start)
+
+# ----------------------------- product History ---------------------
+
+@st.fragment
+def product_history_panel():
+    import pandas as pd
+    start=instrumentation.session_calls()
+    st.header("Product Inventory History")
+
+    selected_product_id, _ = product_picker("history_product")
+
+    if selected_product_id is not None:
+
+        date_cols = st.columns(2)
+        date_from = date_cols[0].date_input("From", value=None)
+        date_to = date_cols[1].date_input("To", value=None)
+
+        # Pages already loaded for this product and range; reset when either changes
+        history_key = (selected_product_id, date_from, date_to)
+        if st.session_state.get("history_key") != history_key:
+            first_page = get_product_history_page(supabase, selected_product_id,
+                                                  date_from=date_from, date_to=date_to)
+            st.session_state["history_key"] = history_key
+            st.session_state["history_rows"] = first_page["rows"]
+            st.session_state["history_cursor"] = first_page["next_cursor"]
+
+        summary = session_memo(get_product_history_summary, selected_product_id, date_from, date_to)
+        if summary:
+            summary_cols = st.columns(len(summary))
+            for col, row in zip(summary_cols, summary):
+                label = row["change_type"] or row["record_type"]
+                col.metric(label=f"{label} ({row['record_count']})", value=row["total_quantity"])
+
+        history_data = st.session_state["history_rows"]
+        if history_data:
+            df = pd.DataFrame(history_data)
+            st.dataframe(df)
+
+            if st.session_state["history_cursor"] and st.button("Load More"):
+                next_page = get_product_history_page(supabase, selected_product_id,
+                                                     cursor=st.session_state["history_cursor"],
+                                                     date_from=date_from, date_to=date_to)
+                st.session_state["history_rows"] = history_data + next_page["rows"]
+                st.session_state["history_cursor"] = next_page["next_cursor"]
+                st.rerun(scope="fragment")
+        else:
+            st.info("No History found for the product Selected")
+    interaction_calls(start)
+
+#---------- Place reorder -----------
+
+@st.fragment
+def place_reorder_panel():
+    start=instrumentation.session_calls()
+    st.header("Place an Reorder")
+
+    selected_product_id, product_index = product_picker("reorder_product")
+    reorder_qty=st.number_input("Reorder Quantity", min_value=1, step=1)
+
+    if st.button("Place Reorder"):
+        if selected_product_id is None:
+            st.error("please Select an Product")
+        elif reorder_qty<=0:
+            st.error("Reorder Quantity must be greater than 0")
+        else:
+            try:
+                place_reorder(supabase, None, selected_product_id, reorder_qty)
+                st.success(f"Order placed for {product_index.label(selected_product_id)} with quantity {reorder_qty}")
+            except Exception as e:
+                st.error(f"Error Placing reorder {e}")
+    interaction_calls(start)
+
+#----------------RECEIVING AN ORDER ------------------
+
+@st.fragment
+def receive_reorder_panel():
+    import pandas as pd
+    start=instrumentation.session_calls()
+    st.header("Mark Reorder as Received")
+    # Fetch orders in Ordered Stage; ticking reorders below reuses this list
+    pending_reorders= session_memo(get_pending_reorders)
+    if not pending_reorders:
+        st.info("No Pending Orders to Receive.")
+    else:
+        reorder_labels={r['reorder_id']: f"ID {r['reorder_id']} - {r['product_name']}" for r in  pending_reorders}
+
+        receive_all = st.checkbox(f"Select all {len(reorder_labels)} pending reorders")
+        selected_reorder_ids = st.multiselect(
+            "Select Reorders to mark As Received",
+            options=list(reorder_labels),
+            default=list(reorder_labels) if receive_all else [],
+            format_func=lambda x: reorder_labels[x]
+        )
+
+        if selected_reorder_ids and st.button(f"Mark {len(selected_reorder_ids)} as Received"):
+            try:
+                with st.spinner("Receiving reorders..."):
+                    outcomes = mark_reorders_as_received(supabase, None, selected_reorder_ids)
+                received = [r for r, outcome in outcomes.items() if outcome == "Received"]
+                if received:
+                    st.success(f"{len(received)} reorders marked as received")
+                failed = {r: outcome for r, outcome in outcomes.items() if outcome != "Received"}
+                if failed:
+                    st.warning(f"{len(failed)} reorders were not received")
+                st.dataframe(pd.DataFrame(
+                    [{"reorder_id": r, "reorder": reorder_labels.get(r), "outcome": outcome}
+                     for r, outcome in outcomes.items()]
+                ))
+            except Exception as e:
+                st.error(f"Error {e}")
+    interaction_calls(start)
+
 # -------------------- Basic Information Page -----------------------------
 
 if option=="Basic Information":
     st.header("Basic Metrics")
 
-    # get basic information from database
+    # get basic information and the detailed tables from database, all panels at once
 
-    basic_info=get_basic_info(supabase)
+    panels,panel_errors=get_dashboard_panels(supabase)
+    freshness=get_panel_freshness(supabase)
+    backend=get_backend_status(supabase)
+    if backend is not None and backend["state"]!="closed":
+        st.warning(f"The database is not responding ({backend['last_error']}); "
+                   "showing the last results received")
+
+    if "Basic Metrics" in panel_errors:
+        st.error(f"Error fetching basic info: {panel_errors['Basic Metrics']}")
+    # None renders as a dash: no result yet is not the same as 0
+    basic_info=panels.get("Basic Metrics") or {key: None for key in BASIC_INFO_KEYS}
 
     cols=st.columns(3)
     keys=list(basic_info.keys())
@@ -47,154 +369,92 @@ if option=="Basic Information":
     cols=st.columns(3)
     for i in range(3,6):
         cols[i-3].metric(label=keys[i],value=basic_info[keys[i]])
+    stale_note(freshness.get("Basic Metrics"))
+
+    with st.expander("Products below reorder level with no pending reorder"):
+        low_stock_panel()
 
     st.divider()
 
+    # Activity per window; the panel holds every window and breakdown, so the
+    # selectors below only slice it
+    st.header("Activity by Window")
+    if "Window Metrics" in panel_errors:
+        st.error(f"Error fetching window metrics: {panel_errors['Window Metrics']}")
+    else:
+        stale_note(freshness.get("Window Metrics"))
+        window_metrics_panel(panels["Window Metrics"])
+
+    st.divider()
 
 
-    # fetch and display detailed tables
-    tables=get_additional_tables(supabase)
-    for labels,data in tables.items():
+    # display detailed tables
+    for labels in ADDITIONAL_TABLES:
         st.header(labels)
-        df=pd.DataFrame(data)
-        st.dataframe(df)
+        if labels in panel_errors:
+            st.error(f"Error fetching {labels}: {panel_errors[labels]}")
+        else:
+            stale_note(freshness.get(labels))
+            paged_table(labels,panels[labels])
         st.divider()
 
 elif option == "Operational Task":
     st.header("Operational Tasks")
-    selected_task=st.selectbox("Choose a Task",["Add new Product","Product History","Place Reorder","Receive Reorder"])
-
-    if selected_task=="Add new Product":
-        st.header("Add new Product")
-        categories= get_categories(supabase)
-        suppliers=get_suppliers(supabase)
-
-        with st.form("Add Product Form"):
-            product_name=st.text_input("Product Name")
-            product_category=st.selectbox("Category",categories)
-            product_price=st.number_input("Price",min_value=0.00)
-            product_stock=st.number_input("Stock Quantity",min_value=0,step=1)
-            product_level= st.number_input("Reorder Level", min_value=0, step=1)
-
-
-            supplier_ids=[s["supplier_id"] for s in suppliers]
-            supplier_names=[s["supplier_name"] for s in suppliers]
-
-            supplier_id=st.selectbox(
-                "Supplier",
-                options=supplier_ids,
-                format_func=lambda x: supplier_names[supplier_ids.index(x)]
-            )
-
-            submitted=st.form_submit_button("Add Product")
-            if submitted:
-                if not product_name:
-                    st.error("Please enter the Product Name")
-                else:
-                    try:
-                        add_new_manual_id(supabase,
-                                          None,
-                                          product_name,
-                                          product_category,
-                                          product_price,
-                                          product_stock,
-                                          product_level,
-                                          supplier_id)
-                        st.success(f"Product {product_name} Added Successfully")
-                    except Exception as e:
-                              st.error(f"Error Adding the {e}")
-
-    # ----------------------------- product History ---------------------
-
-    if selected_task == "Product History":
-        st.header("Product Inventory History")
-
-        # Get product List
-        products = get_all_products(supabase)
-        product_names = [p['product_name'] for p in products]
-        product_ids = [p['product_id'] for p in products]
-
-        selected_product_name = st.selectbox("Select An product", options=product_names)
-
-        if selected_product_name:
-            selected_product_id = product_ids[product_names.index(selected_product_name)]
-            history_data = get_product_history(supabase, selected_product_id)
-
-            if history_data:
-                df = pd.DataFrame(history_data)
-                st.dataframe(df)
-            else:
-                st.info("No History found for the product Selected")
-
-
-
-#---------- Place reorder -----------
-    if selected_task=="Place Reorder":
-        st.header("Place an Reorder")
-
-        products = get_all_products(supabase)
-        product_names = [p['product_name'] for p in products]
-        product_ids = [p['product_id'] for p in products]
-
-        selected_product_name = st.selectbox("Select An product", options=product_names)
-        reorder_qty=st.number_input("Reorder Quantity", min_value=1, step=1)
-
-        if st.button("Place Reorder"):
-            if not selected_product_name:
-                st.error("please Select an Product")
-            elif reorder_qty<=0:
-                st.error("Reorder Quantity must be greater than 0")
-            else:
-                selected_product_id = product_ids[product_names.index(selected_product_name)]
-                try:
-                    place_reorder(supabase, None, selected_product_id, reorder_qty)
-                    st.success(f"Order placed for {selected_product_name} with quantity {reorder_qty}")
-                except Exception as e:
-                    st.error(f"Error Placing reorder {e}")
-
-
-
-#----------------RECEIVING AN ORDER ------------------
-
-    elif selected_task=="Receive Reorder":
-        st.header("Mark Reorder as Received")
-        # Fetch orders in Ordered Stage
-        pending_reorders= get_pending_reorders(supabase)
-        if not pending_reorders:
-            st.info("No Pending Orders to Receive.")
-        else:
-            reorder_ids = [r['reorder_id'] for r in pending_reorders]
-            reorder_labels=[f"ID {r['reorder_id']} - {r['product_name']}" for r in  pending_reorders]
-
-            selected_label =st.selectbox("Select Reorder to mark As Received", options=reorder_labels)
-
-            if selected_label:
-                selected_reorder_id= reorder_ids[reorder_labels.index(selected_label)]
-
-                if st.button("Mark as Received"):
-                    try:
-                       mark_reorder_as_received(supabase, None, selected_reorder_id)
-                       st.success(f"Reorder ID {selected_reorder_id} marked as received")
-                    except Exception as e:
-                        st.error(f"Error {e}")
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+    selected_task=st.selectbox("Choose a Task",["Add new Product","Bulk Import Products","Product History","Place Reorder","Receive Reorder"])
+
+    # Each task is a fragment: typing or ticking inside it reruns only that task
+    task_panels={
+        "Add new Product": add_product_panel,
+        "Bulk Import Products": bulk_import_panel,
+        "Product History": product_history_panel,
+        "Place Reorder": place_reorder_panel,
+        "Receive Reorder": receive_reorder_panel,
+    }
+    task_panels[selected_task]()
+
+# Time-to-first-render: logged once per process, when the first run gets here
+startup.first_render()
+
+# -------------------- Query Diagnostics (sidebar) -----------------------------
+
+if show_diagnostics:
+    import pandas as pd
+    with st.sidebar.expander("Query diagnostics", expanded=True):
+        entries=instrumentation.records()
+        current=[r for r in entries if r["rerun"]==rerun]
+        st.caption(f"This interaction: {instrumentation.session_calls()-calls_at_start} backend calls "
+                   "(fragments show their own)")
+        st.caption(f"This rerun: {len(current)} queries, "
+                   f"{sum(r['ms'] for r in current):.0f} ms, "
+                   f"{sum(r['bytes'] or 0 for r in current)/1024:.0f} KiB")
+        shared=query_cache.saved_calls()
+        st.caption(f"Shared cache (all sessions): {shared['fetches']} fetches, {shared['hits']} hits, "
+                   f"{shared['coalesced']} joined an in-flight fetch, "
+                   f"{shared['stale']} served a kept result")
+        backend=get_backend_status(supabase)
+        if backend is not None:
+            st.caption(f"Backend: circuit {backend['state']}, {backend['failures']} consecutive failures"
+                       +(f", retry in {backend['retry_in']:.0f} s" if backend["retry_in"] is not None else ""))
+        feed=change_feed.status()
+        if feed is not None:
+            st.caption(f"Change feed: {'live' if feed['live'] else 'reconnecting, polling meanwhile'}, "
+                       f"{feed['events']} events, last at {feed['last_event'] or '-'}")
+
+        scope=st.radio("Scope",["This rerun","Session"],horizontal=True)
+        group_by=st.selectbox("Group by",["function","site","table","rerun"])
+        scoped=current if scope=="This rerun" else entries
+        if scoped:
+            st.dataframe(pd.DataFrame(instrumentation.summarize(scoped,by=group_by)),hide_index=True)
+
+            repeated=instrumentation.repeated_queries(scoped)
+            if repeated:
+                st.warning("Same query shape repeated within one rerun (possible N+1)")
+                st.dataframe(pd.DataFrame(repeated),hide_index=True)
+
+        st.download_button("Export JSON lines",instrumentation.to_jsonl(entries),
+                           file_name="query_log.jsonl",mime="application/jsonl")
+        if st.button("Clear log"):
+            instrumentation.clear()
+
+        st.caption("Startup (ms since the first run began)")
+        st.dataframe(pd.DataFrame(startup.report()),hide_index=True)
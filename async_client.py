@@ -0,0 +1,124 @@
+"""
+Async Supabase client on one process-wide event loop.
+All sessions share a single AsyncClient over a pooled keep-alive HTTP/2
+connection, so concurrent queries are multiplexed over a few sockets
+instead of each opening its own. LoopClient adapts it back to the
+synchronous builder interface db_functions uses: execute() runs the
+request on the loop and the calling thread waits for it, so threads
+still block on I/O as before; only the transport is shared.
+"""
+
+import asyncio
+import threading
+
+import httpx
+
+# Shared by every session; HTTP/2 multiplexes requests over these connections
+HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+
+_lock = threading.Lock()
+_loop = None
+_loop_thread = None
+
+
+def get_loop():
+    # The background event loop, started on first use
+    global _loop, _loop_thread
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name="supabase-io", daemon=True)
+            _loop_thread.start()
+        return _loop
+
+
+def run(coro, loop=None, timeout=None):
+    # Run a coroutine on the loop from a synchronous thread and wait for its result
+    loop = loop or get_loop()
+    if _on_loop_thread(loop):
+        coro.close()
+        raise RuntimeError("blocking call on the event loop thread; await the async client instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
+
+def _on_loop_thread(loop):
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+def http_client():
+    # Pooled keep-alive HTTP/2 transport for the AsyncClient; requests carry absolute URLs
+    # and time out as the synchronous client's do
+    from db_functions import REQUEST_TIMEOUT
+    return httpx.AsyncClient(http2=True, limits=HTTP_LIMITS, timeout=httpx.Timeout(REQUEST_TIMEOUT),
+                             follow_redirects=True)
+
+
+async def acreate_client(url, key):
+    from supabase import AClientOptions
+    from supabase import acreate_client as create
+
+    return await create(url, key, options=AClientOptions(httpx_client=http_client()))
+
+
+class _LoopBuilder:
+    # Proxies an async request builder; every method but execute() is synchronous already
+
+    def __init__(self, target, loop):
+        self._target = target
+        self._loop = loop
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return self._wrap(attr)
+        return lambda *args, **kwargs: self._wrap(attr(*args, **kwargs))
+
+    def _wrap(self, value):
+        if hasattr(value, "execute") and not isinstance(value, _LoopBuilder):
+            return _LoopBuilder(value, self._loop)
+        return value
+
+    def execute(self):
+        return run(self._target.execute(), self._loop)
+
+
+class LoopClient:
+    # Drop-in for supabase.Client over an AsyncClient bound to `loop`
+
+    def __init__(self, client, loop=None):
+        self.async_client = client
+        self.loop = loop or get_loop()
+
+    def table(self, name):
+        return _LoopBuilder(self.async_client.table(name), self.loop)
+
+    def from_(self, name):
+        return self.table(name)
+
+    def rpc(self, name, params=None, *args, **kwargs):
+        return _LoopBuilder(self.async_client.rpc(name, params or {}, *args, **kwargs), self.loop)
+
+    def __getattr__(self, name):
+        return getattr(self.async_client, name)
+
+
+_adapters = {}   # (id(async client), id(loop)) -> LoopClient
+
+
+def adapter(client, loop):
+    # One LoopClient per async client and loop, so query_cache and the replicas,
+    # which are keyed by client identity, keep working across calls
+    key = (id(client), id(loop))
+    with _lock:
+        wrapped = _adapters.get(key)
+        if wrapped is None or wrapped.async_client is not client:
+            wrapped = _adapters[key] = LoopClient(client, loop)
+        return wrapped
+
+
+def connect(url, key):
+    # Synchronous entry point for connect_to_db: a LoopClient on the shared loop
+    return adapter(run(acreate_client(url, key)), get_loop())
@@ -0,0 +1,320 @@
+"""
+db_functions for asyncio callers, on an AsyncClient (async_client.acreate_client).
+Every request is awaited on the caller's loop and the independent ones are
+gathered, so no thread waits on I/O: get_dashboard_panels reads products,
+suppliers, reorders and the latest ledger date once, side by side, and every
+panel is computed from those reads. The computations are db_functions' own;
+the replicas and query_cache stay with the synchronous client, so each call
+here reads from the backend. Errors are raised to the caller rather than
+shown with st.error. Only the row-by-row write fallbacks, for projects
+without supabase_functions.sql, still run on a worker thread.
+
+    client = await async_client.acreate_client(url, key)
+    info, reorders = await asyncio.gather(
+        async_db.get_basic_info(client), async_db.get_pending_reorders(client))
+"""
+
+import asyncio
+from datetime import timedelta
+
+import db_functions
+import query_cache
+from async_client import adapter
+from db_functions import is_missing_rpc, is_missing_table
+from low_stock import LowStockTracker
+from paging import aiter_pages
+from replica import TABLES as REPLICA_TABLES
+
+
+async def _rows(client, table):
+    # Every row of a replicated table, in key order
+    spec = REPLICA_TABLES[table]
+    rows = []
+    async for page in aiter_pages(client, table, spec["columns"], key=spec["key"]):
+        rows.extend(page)
+    return rows
+
+
+class _Reads:
+    # The shared reads of one call: each is requested once, however many panels await it
+
+    def __init__(self, client):
+        self.client = client
+        self._tasks = {}
+
+    def _once(self, name, start):
+        task = self._tasks.get(name)
+        if task is None:
+            task = self._tasks[name] = asyncio.ensure_future(start())
+        return task
+
+    def rows(self, table):
+        return self._once(table, lambda: _rows(self.client, table))
+
+    def max_entry_date(self):
+        async def read():
+            return db_functions._entry_date_of(await db_functions._max_entry_date_query(self.client).execute())
+        return self._once("max_entry_date", read)
+
+
+async def _window_pages(client, change_types, since):
+    # db_functions._window_pages: the snapshot and the rows it lacks, else the rollup,
+    # else the raw ledger
+    from snapshots import is_exported, overlap_start, snapshot_state
+    state = snapshot_state("stock_entries", supabase=client)
+    if state is not None:
+        # Local Parquet files, not network
+        yield await asyncio.to_thread(db_functions._snapshot_frame, state, change_types, since)
+        exported = is_exported(state)
+        async for page in aiter_pages(client, **db_functions._ledger_query(
+                change_types, since, after_id=overlap_start(state))):
+            yield [row for row in page if not exported(row["entry_id"])]
+        return
+
+    started = False
+    try:
+        async for page in aiter_pages(client, **db_functions._rollup_query(change_types, since)):
+            started = True
+            yield db_functions._rollup_rows(page)
+        return
+    except Exception as e:
+        if started or not is_missing_table(e):
+            raise
+    async for page in aiter_pages(client, **db_functions._ledger_query(change_types, since)):
+        yield page
+
+
+async def _basic_info(client, reads):
+    from metrics_engine import ledger_values, price_index
+    try:
+        return db_functions._basic_info_from_rows((await client.rpc("get_all_basic_info", {}).execute()).data)
+    except Exception as e:
+        if not is_missing_rpc(e):
+            raise
+
+    # RPC not deployed yet - compute the cards from reads gathered side by side
+    async def supplier_count():
+        response = await client.table("suppliers").select("supplier_id", count="exact", head=True).execute()
+        return response.count
+
+    suppliers, products, reorders, max_date = await asyncio.gather(
+        supplier_count(), reads.rows("products_"), reads.rows("reorders"), reads.max_entry_date())
+    since = max_date - timedelta(days=db_functions.BASIC_INFO_WINDOW_DAYS)
+    prices = price_index({p["product_id"]: p["price"] for p in products})
+    change_types = tuple(db_functions.VALUE_KEYS.values())
+    totals = {change_type: 0 for change_type in change_types}
+    async for page in _window_pages(client, change_types, since):
+        for change_type, value in ledger_values(page, prices, change_types, since=since).items():
+            totals[change_type] += value
+    low = LowStockTracker.from_rows(products, reorders).count()
+    return db_functions._basic_info_result(suppliers, products, totals, low)
+
+
+async def _window_metrics(client, reads):
+    from metrics_engine import merge_window_metrics, window_metrics
+    products, suppliers, as_of = await asyncio.gather(
+        reads.rows("products_"), reads.rows("suppliers"), reads.max_entry_date())
+    products = db_functions._metrics_products(products, suppliers)
+    since = as_of - timedelta(days=max(db_functions.METRIC_WINDOWS))
+    group_by = tuple(db_functions.METRIC_DIMENSIONS.values())
+    return merge_window_metrics([
+        window_metrics(page, products, db_functions.METRIC_WINDOWS, as_of, group_by,
+                       db_functions.METRIC_CHANGE_TYPES)
+        async for page in _window_pages(client, db_functions.METRIC_CHANGE_TYPES, since)
+    ], group_by)
+
+
+async def _additional_tables(reads):
+    suppliers, products, reorders = await asyncio.gather(
+        reads.rows("suppliers"), reads.rows("products_"), reads.rows("reorders"))
+    return {
+        "Suppliers Contact Details": db_functions._supplier_contacts_table(suppliers),
+        "Products with Supplier and Stock": db_functions._products_with_supplier_table(products, suppliers),
+        "Products Needing Reorder": db_functions._needing_reorder_table(
+            LowStockTracker.from_rows(products, reorders)),
+    }
+
+
+async def get_basic_info(client):
+    return await _basic_info(client, _Reads(client))
+
+
+async def get_window_metrics(client):
+    # Rows of (window, category, supplier_name, change_type, quantity, value)
+    return await _window_metrics(client, _Reads(client))
+
+
+async def get_additional_tables(client):
+    return await _additional_tables(_Reads(client))
+
+
+async def get_dashboard_panels(client):
+    # Every Basic Information panel over one set of shared reads; returns
+    # ({panel: data}, {panel: exception}) so failures stay per panel
+    reads = _Reads(client)
+    outcomes = await asyncio.gather(
+        _basic_info(client, reads), _window_metrics(client, reads), _additional_tables(reads),
+        return_exceptions=True)
+    results, errors = {}, {}
+    for label, outcome in zip(("Basic Metrics", "Window Metrics"), outcomes):
+        (errors if isinstance(outcome, Exception) else results)[label] = outcome
+    tables = outcomes[2]
+    for label in db_functions.ADDITIONAL_TABLES:
+        if isinstance(tables, Exception):
+            errors[label] = tables
+        else:
+            results[label] = tables[label]
+    return results, errors
+
+
+async def get_low_stock(client, number=1, page_size=50, include_pending=False):
+    # {"total": low products, "rows": page `number` of them}, as db_functions.get_low_stock
+    products, reorders = await asyncio.gather(_rows(client, "products_"), _rows(client, "reorders"))
+    rows, total = LowStockTracker.from_rows(products, reorders).page(number, page_size, include_pending)
+    return {"total": total, "rows": rows}
+
+
+async def get_categories(client):
+    return db_functions._categories_of(await _rows(client, "products_"))
+
+
+async def get_suppliers(client):
+    return db_functions._supplier_options(await _rows(client, "suppliers"))
+
+
+async def get_all_products(client):
+    return db_functions._product_options(await _rows(client, "products_"))
+
+
+async def get_product_index(client):
+    return db_functions.SearchIndex(await _rows(client, "products_"), "product_id", "product_name", "category")
+
+
+async def get_supplier_index(client):
+    return db_functions.SearchIndex(await _rows(client, "suppliers"), "supplier_id", "supplier_name")
+
+
+async def get_pending_reorders(client):
+    reorders, products = await asyncio.gather(_rows(client, "reorders"), _rows(client, "products_"))
+    return db_functions._pending_reorder_rows(reorders, products)
+
+
+async def get_product_history_page(client, product_id, cursor=None, page_size=db_functions.HISTORY_PAGE_SIZE,
+                                   date_from=None, date_to=None):
+    params = db_functions._history_page_params(product_id, cursor, page_size, date_from, date_to)
+    try:
+        rows = (await client.rpc("get_product_history_page", params).execute()).data
+    except Exception as e:
+        if not is_missing_rpc(e):
+            raise
+        query = db_functions._history_view_query(client, product_id, cursor, page_size, date_from, date_to)
+        return db_functions._history_view_page((await query.execute()).data, cursor, page_size)
+    return db_functions._history_page(rows, page_size)
+
+
+async def get_product_history_summary(client, product_id, date_from=None, date_to=None):
+    params = db_functions._history_summary_params(product_id, date_from, date_to)
+    try:
+        return (await client.rpc("get_product_history_summary", params).execute()).data
+    except Exception as e:
+        if not is_missing_rpc(e):
+            raise
+        return []
+
+
+async def _fallback(func, client, *args):
+    # A synchronous row-by-row fallback on a worker thread, its requests sent on this loop
+    return await asyncio.to_thread(func, adapter(client, asyncio.get_running_loop()), *args)
+
+
+async def add_new_manual_id(client, db, p_name, p_category, p_price, p_stock, p_reorder, p_supplier):
+    try:
+        try:
+            response = await client.rpc("add_new_product_manual_id", {
+                "p_name": p_name,
+                "p_category": p_category,
+                "p_price": float(p_price),
+                "p_stock": int(p_stock),
+                "p_reorder": int(p_reorder),
+                "p_supplier": int(p_supplier)
+            }).execute()
+            return db_functions._new_product_id(response.data)
+        except Exception as e:
+            if not is_missing_rpc(e):
+                raise
+
+        return await _fallback(db_functions._add_product_rows, client,
+                               p_name, p_category, p_price, p_stock, p_reorder, p_supplier)
+
+    except Exception as e:
+        raise Exception(f"Failed to add product: {str(e)}")
+    finally:
+        query_cache.invalidate("products_")
+        query_cache.invalidate("shipments")
+        query_cache.invalidate("stock_entries")
+
+
+async def place_reorder(client, db, product_id, reorder_quantity):
+    from datetime import date
+    try:
+        response = await client.table("reorders").select("reorder_id").order("reorder_id", desc=True).limit(1).execute()
+        new_reorder_id = (response.data[0]["reorder_id"] + 1) if response.data else 1
+        await client.table("reorders").insert({
+            "reorder_id": new_reorder_id,
+            "product_id": product_id,
+            "reorder_quantity": reorder_quantity,
+            "reorder_date": date.today().isoformat(),
+            "status": "Ordered"
+        }).execute()
+    except Exception as e:
+        raise Exception(f"Failed to place reorder: {str(e)}")
+    finally:
+        query_cache.invalidate("reorders")
+
+
+async def mark_reorder_as_received(client, db, reorder_id):
+    try:
+        try:
+            await client.rpc("mark_reorder_as_received", {"in_reorder_id": int(reorder_id)}).execute()
+            return
+        except Exception as e:
+            if not is_missing_rpc(e):
+                raise
+
+        await _fallback(db_functions._receive_reorder_rows, client, reorder_id)
+
+    except Exception as e:
+        raise Exception(f"Failed to mark reorder as received: {str(e)}")
+    finally:
+        _invalidate_receipts()
+
+
+async def mark_reorders_as_received(client, db, reorder_ids):
+    # {reorder_id: outcome}, as db_functions.mark_reorders_as_received
+    reorder_ids = [int(r) for r in reorder_ids]
+    if not reorder_ids:
+        return {}
+
+    try:
+        try:
+            response = await client.rpc("receive_reorders", {"in_reorder_ids": reorder_ids}).execute()
+            return {row["reorder_id"]: row["outcome"] for row in response.data}
+        except Exception as e:
+            if not is_missing_rpc(e):
+                raise
+
+        received = await _fallback(db_functions._receive_reorders_rows, client, reorder_ids)
+        return {r: "Received" if r in received else db_functions.RECEIVE_FAILED for r in reorder_ids}
+
+    except Exception as e:
+        raise Exception(f"Failed to mark reorders as received: {str(e)}")
+    finally:
+        _invalidate_receipts()
+
+
+def _invalidate_receipts():
+    # Only stock levels and reorder status change; names and categories stay cached
+    query_cache.invalidate("reorders", ["status"])
+    query_cache.invalidate("products_", ["stock_quantity"])
+    query_cache.invalidate("shipments")
+    query_cache.invalidate("stock_entries")
@@ -0,0 +1,173 @@
+"""
+Offline benchmarks for db_functions against the in-memory fake client
+or the embedded SQLite backend.
+For each public function and dataset size this reports wall time (cold
+and warm cache), Supabase round trips and peak Python memory.
+
+    python benchmark.py --sizes 1000 10000 --latency 0.02 --output bench_output.txt
+    python benchmark.py --backend sqlite
+"""
+
+import argparse
+import statistics
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import pandas as pd
+
+import db_functions
+import query_cache
+import replica
+from bulk_import import import_products
+from fake_supabase import FakeSupabase, generate_dataset
+from sqlite_backend import SQLiteClient
+
+DEFAULT_SIZES = (1000, 10000)
+DEFAULT_REPEAT = 3
+IMPORT_ROWS = 100
+
+
+def _pending_ids(tables, count):
+    return [r["reorder_id"] for r in tables["reorders"] if r["status"] in ("Pending", "Ordered")][:count]
+
+
+def _import_frame(tables):
+    supplier_ids = [s["supplier_id"] for s in tables["suppliers"]]
+    return pd.DataFrame({
+        "product_name": [f"Imported item {i}" for i in range(IMPORT_ROWS)],
+        "category": "Electronics",
+        "price": 9.99,
+        "stock_quantity": 10,
+        "reorder_level": 5,
+        "supplier_id": [supplier_ids[i % len(supplier_ids)] for i in range(IMPORT_ROWS)],
+    })
+
+
+# (name, func(client, tables), writes) -- writes are never run twice on one client
+CASES = [
+    ("get_basic_info", lambda c, t: db_functions.get_basic_info(c), False),
+    ("get_additional_tables", lambda c, t: db_functions.get_additional_tables(c), False),
+    ("get_dashboard_panels", lambda c, t: db_functions.get_dashboard_panels(c), False),
+    ("get_categories", lambda c, t: db_functions.get_categories(c), False),
+    ("get_suppliers", lambda c, t: db_functions.get_suppliers(c), False),
+    ("get_all_products", lambda c, t: db_functions.get_all_products(c), False),
+    ("get_product_index", lambda c, t: db_functions.get_product_index(c).search("item 1"), False),
+    ("get_pending_reorders", lambda c, t: db_functions.get_pending_reorders(c), False),
+    ("get_product_history_page", lambda c, t: db_functions.get_product_history_page(
+        c, 1, date_from=date.today() - timedelta(days=90)), False),
+    ("get_product_history_summary", lambda c, t: db_functions.get_product_history_summary(c, 1), False),
+    ("add_new_manual_id", lambda c, t: db_functions.add_new_manual_id(
+        c, None, "Benchmark item", "Electronics", 9.99, 10, 5, t["suppliers"][0]["supplier_id"]), True),
+    ("place_reorder", lambda c, t: db_functions.place_reorder(c, None, 1, 25), True),
+    ("mark_reorder_as_received", lambda c, t: db_functions.mark_reorder_as_received(
+        c, None, _pending_ids(t, 1)[0]), True),
+    ("mark_reorders_as_received (10)", lambda c, t: db_functions.mark_reorders_as_received(
+        c, None, _pending_ids(t, 10)), True),
+    (f"import_products ({IMPORT_ROWS})", lambda c, t: import_products(c, _import_frame(t)), True),
+]
+
+
+def _fresh_client(tables, latency, backend="fake"):
+    # Each run starts without cached results or replicas
+    query_cache.clear()
+    replica.clear()
+    if backend == "sqlite":
+        client = SQLiteClient()
+        client.load_tables(tables)
+        return client
+    return FakeSupabase(tables, latency=latency)
+
+
+def _timed(func, client, tables):
+    client.reset_counters()
+    start = time.perf_counter()
+    func(client, tables)
+    return time.perf_counter() - start, client.requests
+
+
+def _peak_memory(func, tables, latency, backend):
+    client = _fresh_client(tables, latency, backend)
+    tracemalloc.start()
+    try:
+        func(client, tables)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(name, func, writes, tables, latency=0.0, repeat=DEFAULT_REPEAT, backend="fake"):
+    cold, warm = [], []
+    cold_trips = warm_trips = None
+    for _ in range(repeat):
+        client = _fresh_client(tables, latency, backend)
+        seconds, cold_trips = _timed(func, client, tables)
+        cold.append(seconds)
+        if not writes:
+            seconds, warm_trips = _timed(func, client, tables)
+            warm.append(seconds)
+
+    return {
+        "function": name,
+        "cold_ms": statistics.median(cold) * 1000,
+        "warm_ms": statistics.median(warm) * 1000 if warm else None,
+        "cold_trips": cold_trips,
+        "warm_trips": warm_trips,
+        # Measured on a separate run: tracemalloc slows the code it traces
+        "peak_kib": _peak_memory(func, tables, latency, backend) / 1024,
+    }
+
+
+def run(sizes=DEFAULT_SIZES, latency=0.0, repeat=DEFAULT_REPEAT, only=None, seed=0, backend="fake"):
+    # Returns {products: [result, ...]}
+    results = {}
+    for size in sizes:
+        tables = generate_dataset(products=size, seed=seed)
+        results[size] = [
+            run_case(name, func, writes, tables, latency, repeat, backend)
+            for name, func, writes in CASES
+            if not only or any(o in name for o in only)
+        ]
+    return results
+
+
+def format_results(results, latency):
+    def cell(value, fmt):
+        return "-" if value is None else format(value, fmt)
+
+    lines = []
+    for size, rows in results.items():
+        lines.append(f"products={size}  latency={latency * 1000:.0f} ms/request")
+        lines.append(f"{'function':<34}{'cold ms':>10}{'warm ms':>10}{'trips':>7}{'warm':>6}{'peak KiB':>11}")
+        for r in rows:
+            lines.append(
+                f"{r['function']:<34}{cell(r['cold_ms'], '.1f'):>10}{cell(r['warm_ms'], '.1f'):>10}"
+                f"{cell(r['cold_trips'], 'd'):>7}{cell(r['warm_trips'], 'd'):>6}{cell(r['peak_kib'], '.0f'):>11}"
+            )
+        lines.append("")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="product counts; the other tables scale with them")
+    parser.add_argument("--backend", choices=["fake", "sqlite"], default="fake",
+                        help="in-memory fake (client-side fallbacks) or embedded SQLite (RPCs as SQL)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request (fake only)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--only", nargs="*", help="run only functions whose name contains one of these")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.latency, args.repeat, args.only, args.seed, args.backend)
+    report = format_results(results, args.latency)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Bulk product import from CSV or Parquet.
+Rows are validated up front, then products, their initial shipments and
+Restock stock_entries are inserted as batches, each in one transaction via
+import_products() (supabase_functions.sql). Without that function the three
+tables are written one after another, and products whose shipment or ledger
+rows did not land are reported as incomplete.
+"""
+
+from __future__ import annotations
+
+from datetime import date
+from typing import TYPE_CHECKING
+
+import pandas as pd
+
+import query_cache
+from db_functions import _fetch_suppliers, is_missing_rpc
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+REQUIRED_COLUMNS = ["product_name", "category", "price", "stock_quantity", "reorder_level", "supplier_id"]
+DEFAULT_BATCH_SIZE = 500
+
+
+def read_product_file(source, file_format=None):
+    # source: a path or a file-like object such as Streamlit's UploadedFile
+    name = getattr(source, "name", source)
+    file_format = file_format or str(name).rsplit(".", 1)[-1].lower()
+    if file_format == "csv":
+        return pd.read_csv(source)
+    if file_format == "parquet":
+        return pd.read_parquet(source)
+    raise ValueError(f"Unsupported file format: {file_format} (use csv or parquet)")
+
+
+def validate_products(frame, supplier_ids):
+    # Returns (clean rows ready to insert, rejected rows with reasons)
+    missing = [c for c in REQUIRED_COLUMNS if c not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    # Row labels become file positions, whatever index the caller's frame has
+    frame = frame.reset_index(drop=True)
+
+    names = frame["product_name"].astype("string").str.strip()
+    category = frame["category"].astype("string").str.strip()
+    price = pd.to_numeric(frame["price"], errors="coerce")
+    stock = pd.to_numeric(frame["stock_quantity"], errors="coerce")
+    reorder = pd.to_numeric(frame["reorder_level"], errors="coerce")
+    supplier = pd.to_numeric(frame["supplier_id"], errors="coerce")
+
+    checks = [
+        (names.isna() | (names == ""), "missing product_name"),
+        (names.duplicated(keep="first") & names.notna(), "duplicate product_name in file"),
+        (price.isna() | (price < 0), "price must be a number >= 0"),
+        (stock.isna() | (stock < 0) | (stock % 1 != 0), "stock_quantity must be a whole number >= 0"),
+        (reorder.isna() | (reorder < 0) | (reorder % 1 != 0), "reorder_level must be a whole number >= 0"),
+        (~supplier.isin(list(supplier_ids)), "unknown supplier_id"),
+    ]
+
+    reasons = pd.Series([[] for _ in range(len(frame))], index=frame.index)
+    for failed, reason in checks:
+        for i in failed[failed.fillna(True)].index:
+            reasons[i].append(reason)
+
+    # row is the line number in the file, counting the header as line 1
+    rejected = [
+        {"row": int(i) + 2, "product_name": None if pd.isna(names[i]) else names[i], "reason": "; ".join(r)}
+        for i, r in reasons.items() if r
+    ]
+
+    ok = reasons.map(len) == 0
+    clean = pd.DataFrame({
+        "product_name": names[ok],
+        "category": category[ok].where(category[ok] != "", None),
+        "price": price[ok].round(2).astype(float),
+        "stock_quantity": stock[ok].astype(int),
+        "reorder_level": reorder[ok].astype(int),
+        "supplier_id": supplier[ok].astype(int),
+    })
+    return clean, rejected
+
+
+def _next_id(supabase: Client, table, key):
+    # MAX+1, as db_functions' row-by-row writes assign ids
+    response = supabase.table(table).select(key).order(key, desc=True).limit(1).execute()
+    return (response.data[0][key] + 1) if response.data else 1
+
+
+def _insert_batch_rows(supabase: Client, rows):
+    # Fallback without import_products(): returns (product_ids, error); a non-None
+    # error means the products were stored but their shipments or ledger rows were not.
+    # IDs are explicit like those of _add_product_rows and place_reorder, which do not
+    # advance the table sequences
+    today = date.today().isoformat()
+    first_id = _next_id(supabase, "products_", "product_id")
+    products = supabase.table("products_").insert([
+        dict(row, product_id=first_id + i) for i, row in enumerate(rows)
+    ]).execute().data
+    product_ids = [p["product_id"] for p in products]
+
+    try:
+        first_id = _next_id(supabase, "shipments", "shipment_id")
+        supabase.table("shipments").insert([{
+            "shipment_id": first_id + i,
+            "product_id": p["product_id"],
+            "supplier_id": p["supplier_id"],
+            "quantity_received": p["stock_quantity"],
+            "shipment_date": today
+        } for i, p in enumerate(products)]).execute()
+
+        first_id = _next_id(supabase, "stock_entries", "entry_id")
+        supabase.table("stock_entries").insert([{
+            "entry_id": first_id + i,
+            "product_id": p["product_id"],
+            "change_quantity": p["stock_quantity"],
+            "change_type": "Restock",
+            "entry_date": today
+        } for i, p in enumerate(products)]).execute()
+    except Exception as e:
+        return product_ids, e
+    return product_ids, None
+
+
+def _insert_batch(supabase: Client, rows):
+    # Returns (product_ids in row order, error after the products were stored)
+    try:
+        response = supabase.rpc("import_products", {"in_products": rows}).execute()
+    except Exception as e:
+        if not is_missing_rpc(e):
+            raise
+        return _insert_batch_rows(supabase, rows)
+    ids = {r["product_name"]: r["product_id"] for r in response.data}
+    return [ids[r["product_name"]] for r in rows], None
+
+
+def import_products(supabase: Client, source, batch_size=DEFAULT_BATCH_SIZE, file_format=None):
+    frame = source if isinstance(source, pd.DataFrame) else read_product_file(source, file_format)
+    # A failed read must fail the import, not reject every row as an unknown supplier
+    supplier_ids = {s["supplier_id"] for s in _fetch_suppliers(supabase)}
+    clean, rejected = validate_products(frame, supplier_ids)
+
+    records = clean.astype(object).where(clean.notna(), None).to_dict("records")
+    # Line numbers in the file, as in validate_products
+    lines = [int(i) + 2 for i in clean.index]
+    product_ids = []
+    incomplete = []
+    try:
+        for start in range(0, len(records), batch_size):
+            batch = records[start:start + batch_size]
+            batch_lines = lines[start:start + batch_size]
+            try:
+                ids, error = _insert_batch(supabase, batch)
+            except Exception as e:
+                # Nothing from this batch was stored
+                rejected.extend(
+                    {"row": line, "product_name": r["product_name"], "reason": f"batch insert failed: {str(e)}"}
+                    for line, r in zip(batch_lines, batch)
+                )
+                continue
+            product_ids.extend(ids)
+            if error is not None:
+                incomplete.extend(
+                    {"row": line, "product_id": product_id, "product_name": r["product_name"],
+                     "reason": f"stored without its initial shipment or stock entry: {str(error)}"}
+                    for line, product_id, r in zip(batch_lines, ids, batch)
+                )
+    finally:
+        query_cache.invalidate("products_")
+        query_cache.invalidate("shipments")
+        query_cache.invalidate("stock_entries")
+
+    return {"inserted": len(product_ids), "product_ids": product_ids, "rejected": rejected,
+            "incomplete": incomplete}
@@ -0,0 +1,219 @@
+"""
+Change-feed driven invalidation of the in-memory caches.
+A source delivers insert, update and delete events for the ledger and
+reference tables; each event patches the replicas and drops exactly the
+cached results that read the changed columns. While the source reports
+itself live, those caches stop expiring and the replicas stop polling,
+so an idle dashboard makes no requests. When it drops, the TTLs and
+polling take over again; after a reconnect everything catches up once.
+
+Production uses Supabase realtime (the tables must be in the
+supabase_realtime publication, see supabase_functions.sql); tests and the
+fake client use LocalEventSource.
+"""
+
+import asyncio
+import queue
+import threading
+import traceback
+from datetime import datetime
+
+import query_cache
+import replica
+
+FEED_TABLES = ("products_", "reorders", "stock_entries", "shipments", "suppliers")
+# Seconds between connection checks of the realtime socket
+HEALTH_CHECK_INTERVAL = 1.0
+
+
+def _event(table, type, record=None, old_record=None):
+    # Same keys as the "data" of a realtime postgres_changes payload
+    return {"table": table, "type": type, "record": record or {}, "old_record": old_record or {}}
+
+
+class LocalEventSource:
+    # In-process source: publish() delivers synchronously to every consumer
+
+    def __init__(self):
+        self._consumers = []
+        self._lock = threading.Lock()
+
+    def start(self, on_event, on_status):
+        with self._lock:
+            self._consumers.append((on_event, on_status))
+        on_status(True)
+
+    def stop(self):
+        with self._lock:
+            consumers, self._consumers = self._consumers, []
+        for _, on_status in consumers:
+            on_status(False)
+
+    def publish(self, table, type, record=None, old_record=None):
+        event = _event(table, type, record, old_record)
+        with self._lock:
+            consumers = list(self._consumers)
+        for on_event, _ in consumers:
+            on_event(event)
+
+
+class RealtimeEventSource:
+    # Supabase realtime postgres_changes on FEED_TABLES, on the shared async_client loop.
+    # Callbacks run on a dispatcher thread, never on the loop: handling an event takes
+    # replica and cache locks, whose holders may be waiting on a query on that loop.
+
+    def __init__(self, url, key, tables=FEED_TABLES, schema="public"):
+        self.url = url.rstrip("/")
+        self.key = key
+        self.tables = tables
+        self.schema = schema
+        self._loop = None
+        self._stopped = None
+        self._queue = queue.Queue()
+
+    def start(self, on_event, on_status):
+        import async_client
+
+        threading.Thread(target=self._dispatch, args=(on_event, on_status),
+                         name="change-feed", daemon=True).start()
+        asyncio.run_coroutine_threadsafe(
+            self._listen(lambda event: self._queue.put((on_event, event)),
+                         lambda live: self._queue.put((on_status, live))),
+            async_client.get_loop(),
+        )
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+    def _dispatch(self, on_event, on_status):
+        # In arrival order, until _listen has ended
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            callback, arg = item
+            try:
+                callback(arg)
+            except Exception:
+                # One bad event must not stop the feed
+                traceback.print_exc()
+
+    async def _listen(self, on_event, on_status):
+        from realtime import AsyncRealtimeClient
+
+        self._loop, self._stopped = asyncio.get_running_loop(), asyncio.Event()
+        client = AsyncRealtimeClient(f"{self.url}/realtime/v1", self.key, auto_reconnect=True)
+        try:
+            await client.connect()
+            channel = client.channel("inventory-changes")
+            for table in self.tables:
+                channel.on_postgres_changes(
+                    "*", table=table, schema=self.schema,
+                    callback=lambda payload: on_event(_event(**{
+                        k: payload["data"].get(k) for k in ("table", "type", "record", "old_record")
+                    })),
+                )
+            await channel.subscribe()
+
+            # The client reconnects and rejoins by itself; report the gaps so caches
+            # fall back to their TTLs meanwhile
+            live = False
+            while not self._stopped.is_set():
+                joined = client.is_connected and channel.is_joined
+                if joined != live:
+                    live = joined
+                    on_status(live)
+                try:
+                    await asyncio.wait_for(self._stopped.wait(), HEALTH_CHECK_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            on_status(False)
+            self._queue.put(None)
+            await client.close()
+
+
+def changed_columns(event):
+    # Columns an UPDATE changed, or None (= any) when old_record holds only the key,
+    # i.e. the table has the default REPLICA IDENTITY
+    record, old = event["record"], event["old_record"]
+    if event["type"] != "UPDATE" or not record or not set(record) <= set(old):
+        return None
+    return [column for column, value in record.items() if old.get(column) != value]
+
+
+class ChangeFeed:
+    def __init__(self, source, tables=FEED_TABLES):
+        self.source = source
+        self.tables = tables
+        self.live = False
+        self.events = 0
+        self.last_event = None
+        self._stopped = False
+
+    def start(self):
+        self.source.start(self.handle, self.set_live)
+        return self
+
+    def stop(self):
+        # The source may report its shutdown late; from here on it is ignored
+        self._stopped = True
+        self.live = False
+        query_cache.set_live(self.tables, False)
+        self.source.stop()
+
+    def handle(self, event):
+        table = event["table"]
+        if self._stopped or table not in self.tables:
+            return
+        self.events += 1
+        self.last_event = datetime.now().isoformat(timespec="seconds")
+
+        columns = changed_columns(event)
+        if columns == []:
+            return
+        if table in replica.TABLES:
+            replica.apply_change(table, event["type"], event["record"], event["old_record"], columns)
+        else:
+            query_cache.invalidate(table, columns)
+
+    def set_live(self, live):
+        if self._stopped:
+            return
+        if live and not self.live:
+            # Events may have been missed before (re)connecting: refresh once, then trust the feed
+            for table in self.tables:
+                query_cache.invalidate(table)
+        self.live = live
+        query_cache.set_live(self.tables, live)
+
+    def status(self):
+        return {"live": self.live, "events": self.events, "last_event": self.last_event}
+
+
+_lock = threading.Lock()
+_feed = None
+
+
+def start(source, tables=FEED_TABLES):
+    # One feed per process; a second call replaces the first
+    global _feed
+    with _lock:
+        if _feed is not None:
+            _feed.stop()
+        _feed = ChangeFeed(source, tables).start()
+        return _feed
+
+
+def stop():
+    global _feed
+    with _lock:
+        if _feed is not None:
+            _feed.stop()
+            _feed = None
+
+
+def status():
+    with _lock:
+        return _feed.status() if _feed is not None else None
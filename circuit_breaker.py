@@ -0,0 +1,189 @@
+"""
+Per-client circuit breaker around backend requests.
+guard() wraps the client so every execute() passes through its breaker,
+which is the only place outcomes are recorded: a failure is a transport
+error or the backend reporting itself unavailable, a success is any
+answer from it. After FAILURE_THRESHOLD consecutive failures the circuit
+opens: requests fail fast with BackendUnavailable and callers serve what
+they already have (query_cache's last good results, the replicas' rows).
+Once the backoff has passed, one trial request goes to the backend; an
+answer closes the circuit, another failure reopens it for twice as long,
+up to MAX_BACKOFF.
+"""
+
+import threading
+import time
+
+FAILURE_THRESHOLD = 3
+TRIAL = "trial"
+# Seconds the circuit stays open after tripping; doubles on every failed trial
+BASE_BACKOFF = 2.0
+MAX_BACKOFF = 60.0
+# SQLSTATE classes and PostgREST codes of a database that cannot serve right now:
+# connection exceptions, insufficient resources, operator intervention (incl. statement timeout)
+UNAVAILABLE_CODES = ("08", "53", "57", "PGRST000", "PGRST001", "PGRST002", "PGRST003")
+
+
+class BackendUnavailable(Exception):
+    # Raised instead of sending a request while the circuit is open
+    pass
+
+
+def is_backend_failure(error):
+    # A query the backend rejected (missing function, constraint violation) is an answer
+    import httpx
+    from postgrest.exceptions import APIError
+
+    if isinstance(error, (OSError, httpx.TransportError)):
+        return True
+    if isinstance(error, APIError):
+        # An int code is the HTTP status of a response that was not PostgREST's JSON (a gateway)
+        if isinstance(error.code, int):
+            return error.code >= 500
+        return str(error.code or "").startswith(UNAVAILABLE_CODES)
+    return False
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, base_backoff=BASE_BACKOFF, max_backoff=MAX_BACKOFF):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.failures = 0        # consecutive
+        self.trips = 0           # consecutive openings, for the backoff
+        self.retry_at = None     # monotonic time of the next trial while open
+        self.trial = False       # a trial request is in flight
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        # May the caller send a request? False while open, TRIAL for the one request let
+        # through once retry_at has passed; pass the answer on to failure/release
+        with self._lock:
+            if self.retry_at is None:
+                return True
+            if not self.trial and time.monotonic() >= self.retry_at:
+                self.trial = True
+                return TRIAL
+            return False
+
+    def is_open(self):
+        # Open and still backing off; unlike allow(), never hands out the trial
+        with self._lock:
+            return self.retry_at is not None and (self.trial or time.monotonic() < self.retry_at)
+
+    def success(self):
+        # Any answer from the backend, trial or not, shows it is reachable
+        with self._lock:
+            self.failures = self.trips = 0
+            self.retry_at = None
+            self.trial = False
+            self.last_error = None
+
+    def failure(self, error, allowed=True):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            if allowed is TRIAL:
+                # Reopen for twice as long
+                self.trial = False
+                self._open()
+            elif self.retry_at is None and self.failures >= self.failure_threshold:
+                self._open()
+            # Requests sent before the circuit opened only add to the count
+
+    def _open(self):
+        backoff = min(self.base_backoff * 2 ** self.trips, self.max_backoff)
+        self.trips += 1
+        self.retry_at = time.monotonic() + backoff
+
+    def release(self, allowed=True):
+        # The request ended without reaching the backend's verdict; another one may be the trial
+        with self._lock:
+            if allowed is TRIAL:
+                self.trial = False
+
+    def status(self):
+        with self._lock:
+            if self.retry_at is None:
+                state, retry_in = "closed", None
+            else:
+                state = "half-open" if self.trial else "open"
+                retry_in = max(self.retry_at - time.monotonic(), 0)
+            return {"state": state, "failures": self.failures, "retry_in": retry_in,
+                    "last_error": self.last_error}
+
+    def describe(self):
+        status = self.status()
+        if status["state"] == "closed":
+            return "backend available"
+        return (f"backend unavailable after {status['failures']} failures, "
+                f"retrying in {status['retry_in']:.0f} s: {status['last_error']}")
+
+
+class _GuardedBuilder:
+    # Proxies a request builder; execute() goes through the breaker
+
+    def __init__(self, target, breaker):
+        self._target = target
+        self._breaker = breaker
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return self._wrap(attr)
+        return lambda *args, **kwargs: self._wrap(attr(*args, **kwargs))
+
+    def _wrap(self, value):
+        if hasattr(value, "execute") and not isinstance(value, _GuardedBuilder):
+            return _GuardedBuilder(value, self._breaker)
+        return value
+
+    def execute(self):
+        from postgrest.exceptions import APIError
+
+        breaker = self._breaker
+        allowed = breaker.allow()
+        if not allowed:
+            raise BackendUnavailable(breaker.describe())
+        try:
+            response = self._target.execute()
+        except Exception as e:
+            if is_backend_failure(e):
+                breaker.failure(e, allowed)
+            elif isinstance(e, APIError):
+                breaker.success()
+            else:
+                breaker.release(allowed)
+            raise
+        breaker.success()
+        return response
+
+
+class GuardedClient:
+    # Drop-in for supabase.Client; anything other than table() and rpc() passes through
+
+    def __init__(self, client, breaker=None):
+        self._client = client
+        self.circuit_breaker = breaker or CircuitBreaker()
+
+    def table(self, name):
+        return _GuardedBuilder(self._client.table(name), self.circuit_breaker)
+
+    def from_(self, name):
+        return self.table(name)
+
+    def rpc(self, name, params=None, *args, **kwargs):
+        return _GuardedBuilder(self._client.rpc(name, params or {}, *args, **kwargs), self.circuit_breaker)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def guard(client):
+    return client if isinstance(client, GuardedClient) else GuardedClient(client)
+
+
+def get_breaker(supabase):
+    # The breaker of a guarded client (also through wrappers such as instrument()), else None
+    return getattr(supabase, "circuit_breaker", None)
@@ -1,14 +1,51 @@
+from __future__ import annotations
+
+import threading
+from itertools import chain
+from typing import TYPE_CHECKING
+
 import streamlit as st
-from supabase import create_client, Client
+
+import change_feed
+import circuit_breaker
+import query_cache
+from instrumentation import instrument
+from low_stock import OPEN_STATUSES, get_tracker
+from paging import iter_pages
+from parallel_fetch import fetch_concurrently
+from product_search import SearchIndex
+from replica import get_replica
+import startup
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+# pandas, pyarrow, supabase and the metrics modules are imported where they
+# are used, so a cold start loads only what its first page needs
+
+# Seconds the reference-data readers may serve from memory
+CATEGORIES_TTL = 600
+SUPPLIERS_TTL = 600
+PRODUCTS_TTL = 300
+METRICS_TTL = 300
+TABLES_TTL = 60
+# Short: the cards used to be recomputed on every rerun
+BASIC_INFO_TTL = 5
+# Seconds a PostgREST request may take; the client's default is 120
+REQUEST_TIMEOUT = 10
 
 @st.cache_resource
 def connect_to_db() -> Client:
     try:
-        supabase: Client = create_client(
-            st.secrets["SUPABASE_URL"],
-            st.secrets["SUPABASE_KEY"]
-        )
-        return supabase
+        with startup.timed("connect"):
+            supabase = _connect()
+        # Records per-query diagnostics for sessions that turn them on in the sidebar;
+        # every request passes the client's circuit breaker
+        client = instrument(circuit_breaker.guard(supabase))
+        # WARM_CACHE = true: fill the reference-data and metrics caches in the background
+        if st.secrets.get("WARM_CACHE", False):
+            threading.Thread(target=warm_caches, args=(client,), name="cache-warmer", daemon=True).start()
+        return client
     except Exception as e:
         st.error(f"❌ Database connection failed: {str(e)}")
         st.info("""
@@ -20,230 +57,672 @@ def connect_to_db() -> Client:
         st.stop()
 
 
-def get_basic_info(supabase: Client):
-    from datetime import datetime, timedelta
+def _connect():
+    # DATABASE_BACKEND = "sqlite" runs the dashboard on a local database file
+    if st.secrets.get("DATABASE_BACKEND", "supabase") == "sqlite":
+        from sqlite_backend import SQLiteClient
+
+        return SQLiteClient(st.secrets.get("SQLITE_PATH", "inventory.db"))
+
+    if st.secrets.get("ASYNC_CLIENT", False):
+        # Every session shares one AsyncClient over pooled HTTP/2 on a background loop
+        import async_client
+
+        supabase = async_client.connect(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
+    else:
+        from supabase import ClientOptions, create_client
+
+        supabase = create_client(
+            st.secrets["SUPABASE_URL"],
+            st.secrets["SUPABASE_KEY"],
+            options=ClientOptions(postgrest_client_timeout=REQUEST_TIMEOUT),
+        )
+    # CHANGE_FEED = true: keep the caches current from Supabase realtime instead of polling
+    if st.secrets.get("CHANGE_FEED", False):
+        change_feed.start(change_feed.RealtimeEventSource(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"]))
+    return supabase
+
+
+BASIC_INFO_KEYS = [
+    "Total Suppliers",
+    "Total Products",
+    "Total Categories Dealing",
+    "Total Sale Value (Last 3 Months)",
+    "Total Restock Value (Last 3 Months)",
+    "Below Reorder & No Pending Reorders",
+]
+
+VALUE_KEYS = {
+    "Total Sale Value (Last 3 Months)": "Sale",
+    "Total Restock Value (Last 3 Months)": "Restock",
+}
+# Window of the "Last 3 Months" cards; get_all_basic_info() uses the same 90 days
+BASIC_INFO_WINDOW_DAYS = 90
+
+# Windows and breakdowns offered by the activity section of the Basic Information page
+METRIC_WINDOWS = (7, 30, 90, 365)
+METRIC_CHANGE_TYPES = ("Sale", "Restock", "Adjustment")
+METRIC_DIMENSIONS = {"Category": "category", "Supplier": "supplier_name"}
+
+
+def is_missing_rpc(error):
+    # PostgREST answers PGRST202 when the function is not in its schema cache
+    return getattr(error, "code", None) == "PGRST202" or "Could not find the function" in str(error)
+
+
+def is_missing_table(error):
+    # PGRST205 from PostgREST 12 on, 42P01 (undefined_table) before it
+    return getattr(error, "code", None) in ("PGRST205", "42P01") or "Could not find the table" in str(error)
+
+
+def _basic_info_from_rpc(supabase: Client):
+    # All six cards in one round trip via get_all_basic_info() (supabase_functions.sql)
+    return _basic_info_from_rows(supabase.rpc("get_all_basic_info", {}).execute().data)
+
+
+def _basic_info_from_rows(rows):
+    values = {row["metric_name"]: row["metric_value"] for row in rows}
+
     result = {}
-    
+    for key in BASIC_INFO_KEYS:
+        value = values.get(key) or 0
+        result[key] = round(float(value), 2) if key in VALUE_KEYS else int(value)
+    return result
+
+
+def _rollup_query(change_types, since):
+    # iter_pages arguments for the daily (product_id, change_type, day) sums of the window
+    return {
+        "table": "stock_entries_daily",
+        "columns": "product_id, change_type, day, total_quantity, total_abs_quantity",
+        "key": "rollup_id",
+        "where": lambda q: q.in_("change_type", list(change_types)).gte("day", since.isoformat()),
+    }
+
+
+def _rollup_rows(page):
+    # Rollup rows shaped like ledger rows for the metrics engine
+    from metrics_engine import SIGNED_CHANGE_TYPES
+    return [{
+        "product_id": row["product_id"],
+        "change_type": row["change_type"],
+        "change_quantity": row["total_quantity"] if row["change_type"] in SIGNED_CHANGE_TYPES
+        else row["total_abs_quantity"],
+        "entry_date": row["day"]
+    } for row in page]
+
+
+def _rollup_pages(supabase: Client, change_types, since):
+    for page in iter_pages(supabase, **_rollup_query(change_types, since)):
+        yield _rollup_rows(page)
+
+
+def _ledger_query(change_types, since, after_id=None):
+    # iter_pages arguments for the raw stock_entries of the window, filtered server-side;
+    # after_id skips rows already snapshotted
+    def where(q):
+        q = q.in_("change_type", list(change_types)).gte("entry_date", since.isoformat())
+        return q.gt("entry_id", after_id) if after_id is not None else q
+
+    return {
+        "table": "stock_entries",
+        "columns": "entry_id, change_quantity, entry_date, product_id, change_type",
+        "key": "entry_id",
+        "where": where,
+    }
+
+
+def _ledger_pages(supabase: Client, change_types, since, after_id=None):
+    return iter_pages(supabase, **_ledger_query(change_types, since, after_id))
+
+
+def _snapshot_frame(state, change_types, since):
+    # The window from the local Parquet snapshot
+    from metrics_engine import to_ledger_frame
+    from snapshots import read_snapshot
+    snapshot = read_snapshot(
+        "stock_entries", columns=["product_id", "change_type", "change_quantity", "entry_date"],
+        since=since, filters=[("change_type", "in", list(change_types))], state=state,
+    )
+    return to_ledger_frame(snapshot.to_pandas(date_as_object=False))
+
+
+def _snapshot_pages(supabase: Client, state, change_types, since):
+    # The window from the snapshot, then the rows it lacks: those added after it
+    # and those that committed late below its highest entry_id
+    from snapshots import is_exported, overlap_start
+    yield _snapshot_frame(state, change_types, since)
+    exported = is_exported(state)
+    for page in _ledger_pages(supabase, change_types, since, after_id=overlap_start(state)):
+        yield [row for row in page if not exported(row["entry_id"])]
+
+
+def _window_pages(supabase: Client, change_types, since):
+    # Prefer a local snapshot (snapshots.py export), then the daily rollup
+    # (O(days x products)), then the raw ledger when supabase_functions.sql
+    # has not been deployed
+    from snapshots import snapshot_state
+    state = snapshot_state("stock_entries", supabase=supabase)
+    if state is not None:
+        return _snapshot_pages(supabase, state, change_types, since)
+    # The rollup is kept current by triggers; reading it is the only request
+    pages = _rollup_pages(supabase, change_types, since)
     try:
-        # Total Suppliers
-        response = supabase.table("suppliers").select("*", count="exact").execute()
-        result["Total Suppliers"] = response.count
-        
-        # Total Products
-        response = supabase.table("products_").select("*", count="exact").execute()
-        result["Total Products"] = response.count
-        
-        # Total Categories
-        response = supabase.table("products_").select("category").execute()
-        categories = set(row['category'] for row in response.data if row['category'])
-        result["Total Categories Dealing"] = len(categories)
-        
-        # Get all products to get prices
-        response = supabase.table("products_").select("product_id, price").execute()
-        products_map = {p["product_id"]: p["price"] for p in response.data}
-        
-        # Get max date from stock_entries table
-        response = supabase.table("stock_entries").select("entry_date").order("entry_date", desc=True).limit(1).execute()
-        if response.data and response.data[0].get("entry_date"):
-            max_date_str = response.data[0]["entry_date"]
-            max_date = datetime.fromisoformat(max_date_str.replace('Z', '+00:00')).date()
-        else:
-            max_date = datetime.now().date()
-        
-        # Calculate date threshold (3 months before max date)
-        three_months_ago = max_date - timedelta(days=90)
-        
-        # Total Sale Value (Last 3 Months)
-        response = supabase.table("stock_entries").select("change_quantity, entry_date, product_id").eq("change_type", "Sale").execute()
-        sale_entries = response.data
-        
-        total_sale_value = 0
-        for entry in sale_entries:
-            entry_date = entry.get("entry_date")
-            if entry_date:
-                if isinstance(entry_date, str):
-                    entry_date = datetime.fromisoformat(entry_date.replace('Z', '+00:00')).date()
-                
-                if entry_date >= three_months_ago:
-                    product_id = entry.get("product_id")
-                    change_qty = abs(entry.get("change_quantity", 0))
-                    price = products_map.get(product_id, 0)
-                    total_sale_value += change_qty * price
-        
-        result["Total Sale Value (Last 3 Months)"] = round(total_sale_value, 2)
-        
-        # Total Restock Value (Last 3 Months)
-        response = supabase.table("stock_entries").select("change_quantity, entry_date, product_id").eq("change_type", "Restock").execute()
-        restock_entries = response.data
-        
-        total_restock_value = 0
-        for entry in restock_entries:
-            entry_date = entry.get("entry_date")
-            if entry_date:
-                if isinstance(entry_date, str):
-                    entry_date = datetime.fromisoformat(entry_date.replace('Z', '+00:00')).date()
-                
-                if entry_date >= three_months_ago:
-                    product_id = entry.get("product_id")
-                    change_qty = abs(entry.get("change_quantity", 0))
-                    price = products_map.get(product_id, 0)
-                    total_restock_value += change_qty * price
-        
-        result["Total Restock Value (Last 3 Months)"] = round(total_restock_value, 2)
-        
-        # Below Reorder & No Pending Reorders
-        response = supabase.table("products_").select("product_id, stock_quantity, reorder_level").execute()
-        products = response.data
-        
-        response = supabase.table("reorders").select("product_id").in_("status", ["Pending", "Ordered"]).execute()
-        pending_product_ids = set(r["product_id"] for r in response.data)
-        
-        below_reorder_no_pending = sum(
-            1 for p in products 
-            if p.get("stock_quantity", 0) < p.get("reorder_level", 0) 
-            and p.get("product_id") not in pending_product_ids
-        )
-        
-        result["Below Reorder & No Pending Reorders"] = below_reorder_no_pending
-        
+        first = next(pages, None)
+    except Exception as e:
+        if not is_missing_table(e):
+            raise
+        return _ledger_pages(supabase, change_types, since)
+    return chain([first] if first is not None else [], pages)
+
+
+def _window_values(supabase: Client, prices, change_types, since):
+    from metrics_engine import ledger_values
+    pages = _window_pages(supabase, change_types, since)
+
+    # Reduced page by page so the window is never held in memory at once
+    totals = {change_type: 0 for change_type in change_types}
+    for page in pages:
+        for change_type, value in ledger_values(page, prices, change_types, since=since).items():
+            totals[change_type] += value
+    return totals
+
+
+def _supplier_count(supabase: Client):
+    response = supabase.table("suppliers").select("supplier_id", count="exact", head=True).execute()
+    return response.count
+
+
+def _max_entry_date_query(supabase: Client):
+    return supabase.table("stock_entries").select("entry_date").order("entry_date", desc=True).limit(1)
+
+
+def _max_entry_date(supabase: Client):
+    return _entry_date_of(_max_entry_date_query(supabase).execute())
+
+
+def _entry_date_of(response):
+    from datetime import datetime
+    if response.data and response.data[0].get("entry_date"):
+        max_date_str = response.data[0]["entry_date"]
+        return datetime.fromisoformat(max_date_str.replace('Z', '+00:00')).date()
+    return datetime.now().date()
+
+
+def _basic_info_client_side(supabase: Client):
+    from datetime import timedelta
+    from metrics_engine import price_index
+
+    # Independent reads run side by side; the value window needs their results
+    reads, errors = fetch_concurrently({
+        "suppliers": lambda: _supplier_count(supabase),
+        "products": lambda: get_replica(supabase, "products_").rows(supabase),
+        "low_stock": lambda: get_tracker(supabase),
+        "max_date": lambda: _max_entry_date(supabase),
+    })
+    if errors:
+        raise next(iter(errors.values()))
+
+    # Calculate date threshold (3 months before max date)
+    three_months_ago = reads["max_date"] - timedelta(days=BASIC_INFO_WINDOW_DAYS)
+    prices = price_index({p["product_id"]: p["price"] for p in reads["products"]})
+    totals = _window_values(supabase, prices, tuple(VALUE_KEYS.values()), three_months_ago)
+    # Below Reorder & No Pending Reorders, maintained from the replicas' deltas
+    return _basic_info_result(reads["suppliers"], reads["products"], totals, reads["low_stock"].count())
+
+
+def _basic_info_result(supplier_count, products, totals, below_reorder):
+    result = {}
+    result["Total Suppliers"] = supplier_count
+
+    # The products rows serve the count and categories
+    result["Total Products"] = len(products)
+    result["Total Categories Dealing"] = len(set(p["category"] for p in products if p["category"]))
+
+    for key, change_type in VALUE_KEYS.items():
+        result[key] = round(totals[change_type], 2)
+
+    result["Below Reorder & No Pending Reorders"] = below_reorder
+    return {key: result[key] for key in BASIC_INFO_KEYS}
+
+
+@query_cache.cached(ttl=BASIC_INFO_TTL, depends_on={
+    "suppliers": None, "products_": None, "reorders": None, "stock_entries": None,
+})
+def _fetch_basic_info(supabase: Client):
+    try:
+        return _basic_info_from_rpc(supabase)
+    except Exception as e:
+        if not is_missing_rpc(e):
+            raise
+    # RPC not deployed yet - compute the cards from a handful of reads
+    return _basic_info_client_side(supabase)
+
+
+def get_basic_info(supabase: Client):
+    try:
+        return _fetch_basic_info(supabase)
     except Exception as e:
         st.error(f"Error fetching basic info: {str(e)}")
-        # Return default values
-        for key in ["Total Suppliers", "Total Products", "Total Categories Dealing", 
-                    "Total Sale Value (Last 3 Months)", "Total Restock Value (Last 3 Months)", 
-                    "Below Reorder & No Pending Reorders"]:
-            if key not in result:
-                result[key] = 0
-    
-    return result
+        # No result yet to fall back on; None renders as a dash, not a misleading 0
+        return {key: None for key in BASIC_INFO_KEYS}
+
+@query_cache.cached(ttl=METRICS_TTL, depends_on={
+    "stock_entries": None,
+    "products_": ("price", "category", "supplier_id"),
+    "suppliers": ("supplier_id", "supplier_name"),
+})
+def _fetch_window_metrics(supabase: Client):
+    # Every window and breakdown from one read of the largest window; the page only
+    # slices this frame, so switching windows or dimensions never rescans
+    from datetime import timedelta
+    from metrics_engine import merge_window_metrics, window_metrics
+    reads, errors = fetch_concurrently({
+        "products": lambda: get_replica(supabase, "products_").rows(supabase),
+        "suppliers": lambda: get_replica(supabase, "suppliers").rows(supabase),
+        "max_date": lambda: _max_entry_date(supabase),
+    })
+    if errors:
+        raise next(iter(errors.values()))
+
+    products = _metrics_products(reads["products"], reads["suppliers"])
+    as_of = reads["max_date"]
+    since = as_of - timedelta(days=max(METRIC_WINDOWS))
+    group_by = tuple(METRIC_DIMENSIONS.values())
+    return merge_window_metrics([
+        window_metrics(page, products, METRIC_WINDOWS, as_of, group_by, METRIC_CHANGE_TYPES)
+        for page in _window_pages(supabase, METRIC_CHANGE_TYPES, since)
+    ], group_by)
+
+
+def _metrics_products(products, suppliers):
+    # Price and the METRIC_DIMENSIONS of every product, for window_metrics
+    import pandas as pd
+    supplier_names = {s["supplier_id"]: s.get("supplier_name") for s in suppliers}
+    return pd.DataFrame({
+        "product_id": [p["product_id"] for p in products],
+        "price": [p.get("price") for p in products],
+        "category": [p.get("category") for p in products],
+        "supplier_name": [supplier_names.get(p.get("supplier_id")) for p in products],
+    })
+
+
+def get_window_metrics(supabase: Client):
+    # Rows of (window, category, supplier_name, change_type, quantity, value)
+    from metrics_engine import merge_window_metrics
+    try:
+        return _fetch_window_metrics(supabase)
+    except Exception as e:
+        st.error(f"Error fetching window metrics: {str(e)}")
+        return merge_window_metrics([], tuple(METRIC_DIMENSIONS.values()))
+
+
+@query_cache.cached(ttl=TABLES_TTL, depends_on={"suppliers": None})
+def _fetch_supplier_contacts(supabase: Client):
+    return _supplier_contacts_table(get_replica(supabase, "suppliers").rows(supabase))
+
+
+def _supplier_contacts_table(suppliers):
+    import pyarrow as pa
+    from table_view import columns_from_rows
+    return pa.table(columns_from_rows(suppliers, ["supplier_name", "contact_name", "email", "phone"]))
+
+
+@query_cache.cached(ttl=TABLES_TTL, depends_on={
+    "products_": ("product_name", "supplier_id", "stock_quantity", "reorder_level"),
+    "suppliers": ("supplier_id", "supplier_name"),
+})
+def _fetch_products_with_supplier(supabase: Client):
+    # Joined locally from the replicas
+    suppliers = get_replica(supabase, "suppliers").rows(supabase)
+    products = get_replica(supabase, "products_").rows(supabase)
+    return _products_with_supplier_table(products, suppliers)
+
+
+def _products_with_supplier_table(products, suppliers):
+    # Joined column by column
+    import pyarrow as pa
+    from table_view import columns_from_rows, lookup
+    columns = columns_from_rows(products, ["product_name", "supplier_id", "stock_quantity", "reorder_level"])
+    supplier_ids = columns.pop("supplier_id")
+    table = pa.table({
+        "product_name": columns["product_name"],
+        "supplier_name": lookup(supplier_ids, [s["supplier_id"] for s in suppliers],
+                                [s.get("supplier_name") for s in suppliers]),
+        "stock_quantity": columns["stock_quantity"],
+        "reorder_level": columns["reorder_level"],
+    })
+    return table.sort_by([("product_name", "ascending")])
+
+
+def _fetch_products_needing_reorder(supabase: Client):
+    # Products where stock_quantity <= reorder_level, straight from the low-stock tracker
+    return _needing_reorder_table(get_tracker(supabase))
+
+
+def _needing_reorder_table(tracker):
+    import pyarrow as pa
+    from table_view import columns_from_rows
+    rows = tracker.rows(tracker.product_ids(include_pending=True))
+    return pa.table(columns_from_rows(rows, ["product_name", "stock_quantity", "reorder_level", "pending_reorder"]))
+
+
+ADDITIONAL_TABLES = {
+    "Suppliers Contact Details": _fetch_supplier_contacts,
+    "Products with Supplier and Stock": _fetch_products_with_supplier,
+    "Products Needing Reorder": _fetch_products_needing_reorder,
+}
+
 
 def get_additional_tables(supabase: Client):
     tables = {}
     
     try:
-        # Suppliers Contact Details
-        response = supabase.table("suppliers").select("supplier_name, contact_name, email, phone").execute()
-        tables["Suppliers Contact Details"] = response.data
-        
-        # Products with Supplier and Stock
-        response = supabase.table("products_").select(
-            "product_name, stock_quantity, reorder_level, suppliers(supplier_name)"
-        ).order("product_name").execute()
-        
-        # Flatten the nested supplier data
-        flattened = []
-        for item in response.data:
-            flattened.append({
-                "product_name": item.get("product_name"),
-                "supplier_name": item.get("suppliers", {}).get("supplier_name") if item.get("suppliers") else None,
-                "stock_quantity": item.get("stock_quantity"),
-                "reorder_level": item.get("reorder_level")
-            })
-        tables["Products with Supplier and Stock"] = flattened
-        
-        # Products Needing Reorder - fetch all and filter in Python
-        response = supabase.table("products_").select(
-            "product_name, stock_quantity, reorder_level"
-        ).execute()
-        # Filter products where stock_quantity <= reorder_level
-        needing_reorder = [
-            product for product in response.data 
-            if product.get('stock_quantity', 0) <= product.get('reorder_level', 0)
-        ]
-        tables["Products Needing Reorder"] = needing_reorder
+        for label, fetch in ADDITIONAL_TABLES.items():
+            tables[label] = fetch(supabase)
         
     except Exception as e:
         st.error(f"Error fetching tables: {str(e)}")
-        tables = {
-            "Suppliers Contact Details": [],
-            "Products with Supplier and Stock": [],
-            "Products Needing Reorder": []
-        }
+        import pyarrow as pa
+        tables = {label: pa.table({}) for label in ADDITIONAL_TABLES}
     
     return tables
 
+
+def get_low_stock(supabase: Client, number=1, page_size=50, include_pending=False):
+    # {"total": low products, "rows": page `number` of them}; by default only those
+    # with no Pending or Ordered reorder, as on the Basic Information card
+    try:
+        rows, total = get_tracker(supabase).page(number, page_size, include_pending)
+        return {"total": total, "rows": rows}
+    except Exception as e:
+        st.error(f"Error fetching low stock products: {str(e)}")
+        return {"total": 0, "rows": []}
+
+
+def get_dashboard_panels(supabase: Client):
+    # Every Basic Information panel fetched concurrently against the shared client;
+    # returns ({panel: data}, {panel: exception}) so failures stay per panel
+    tasks = {
+        "Basic Metrics": lambda: _fetch_basic_info(supabase),
+        "Window Metrics": lambda: _fetch_window_metrics(supabase),
+    }
+    for label, fetch in ADDITIONAL_TABLES.items():
+        tasks[label] = lambda fetch=fetch: fetch(supabase)
+    return fetch_concurrently(tasks)
+
+def get_panel_freshness(supabase: Client):
+    # {panel: {"age", "stale"}} of the cached result each dashboard panel was served,
+    # so the page can mark results kept from before a refresh or a backend outage
+    readers = {"Basic Metrics": _fetch_basic_info, "Window Metrics": _fetch_window_metrics, **ADDITIONAL_TABLES}
+    freshness = {}
+    for label, fetch in readers.items():
+        if hasattr(fetch, "reader"):
+            freshness[label] = query_cache.freshness(fetch, supabase)
+    return freshness
+
+
+def get_backend_status(supabase: Client):
+    # The client's circuit breaker: {"state", "failures", "retry_in", "last_error"};
+    # None for a client connect_to_db did not guard
+    breaker = circuit_breaker.get_breaker(supabase)
+    return breaker.status() if breaker is not None else None
+
+def _add_product_rows(supabase: Client, p_name, p_category, p_price, p_stock, p_reorder, p_supplier):
+    # Row-by-row fallback for projects without the add_new_product_manual_id RPC
+    # Get max product_id
+    response = supabase.table("products_").select("product_id").order("product_id", desc=True).limit(1).execute()
+    new_prod_id = (response.data[0]["product_id"] + 1) if response.data else 1
+    
+    # Insert new product
+    from datetime import date
+    supabase.table("products_").insert({
+        "product_id": new_prod_id,
+        "product_name": p_name,
+        "category": p_category,
+        "price": float(p_price),
+        "stock_quantity": int(p_stock),
+        "reorder_level": int(p_reorder),
+        "supplier_id": int(p_supplier)
+    }).execute()
+    
+    # Get max shipment_id
+    response = supabase.table("shipments").select("shipment_id").order("shipment_id", desc=True).limit(1).execute()
+    new_shipment_id = (response.data[0]["shipment_id"] + 1) if response.data else 1
+    
+    # Insert shipment
+    supabase.table("shipments").insert({
+        "shipment_id": new_shipment_id,
+        "product_id": new_prod_id,
+        "supplier_id": int(p_supplier),
+        "quantity_received": int(p_stock),
+        "shipment_date": date.today().isoformat()
+    }).execute()
+    
+    # Get max entry_id
+    response = supabase.table("stock_entries").select("entry_id").order("entry_id", desc=True).limit(1).execute()
+    new_entry_id = (response.data[0]["entry_id"] + 1) if response.data else 1
+    
+    # Insert stock entry
+    supabase.table("stock_entries").insert({
+        "entry_id": new_entry_id,
+        "product_id": new_prod_id,
+        "change_quantity": int(p_stock),
+        "change_type": "Restock",
+        "entry_date": date.today().isoformat()
+    }).execute()
+
+    return new_prod_id
+
+
+def _new_product_id(data):
+    # The product_id add_new_product_manual_id returned: PostgREST sends a scalar
+    # function result bare, older versions as a one-row list
+    if isinstance(data, list):
+        data = data[0] if data else None
+    if isinstance(data, dict):
+        data = next(iter(data.values()), None)
+    return int(data)
+
+
 def add_new_manual_id(supabase: Client, db, p_name, p_category, p_price, p_stock, p_reorder, p_supplier):
     try:
-        # Get max product_id
-        response = supabase.table("products_").select("product_id").order("product_id", desc=True).limit(1).execute()
-        new_prod_id = (response.data[0]["product_id"] + 1) if response.data else 1
-        
-        # Insert new product
-        from datetime import date
-        supabase.table("products_").insert({
-            "product_id": new_prod_id,
-            "product_name": p_name,
-            "category": p_category,
-            "price": float(p_price),
-            "stock_quantity": int(p_stock),
-            "reorder_level": int(p_reorder),
-            "supplier_id": int(p_supplier)
-        }).execute()
-        
-        # Get max shipment_id
-        response = supabase.table("shipments").select("shipment_id").order("shipment_id", desc=True).limit(1).execute()
-        new_shipment_id = (response.data[0]["shipment_id"] + 1) if response.data else 1
-        
-        # Insert shipment
-        supabase.table("shipments").insert({
-            "shipment_id": new_shipment_id,
-            "product_id": new_prod_id,
-            "supplier_id": int(p_supplier),
-            "quantity_received": int(p_stock),
-            "shipment_date": date.today().isoformat()
-        }).execute()
-        
-        # Get max entry_id
-        response = supabase.table("stock_entries").select("entry_id").order("entry_id", desc=True).limit(1).execute()
-        new_entry_id = (response.data[0]["entry_id"] + 1) if response.data else 1
-        
-        # Insert stock entry
-        supabase.table("stock_entries").insert({
-            "entry_id": new_entry_id,
-            "product_id": new_prod_id,
-            "change_quantity": int(p_stock),
-            "change_type": "Restock",
-            "entry_date": date.today().isoformat()
-        }).execute()
-        
+        # One transactional round trip; IDs come from the table sequences
+        try:
+            response = supabase.rpc("add_new_product_manual_id", {
+                "p_name": p_name,
+                "p_category": p_category,
+                "p_price": float(p_price),
+                "p_stock": int(p_stock),
+                "p_reorder": int(p_reorder),
+                "p_supplier": int(p_supplier)
+            }).execute()
+            return _new_product_id(response.data)
+        except Exception as e:
+            if not is_missing_rpc(e):
+                raise
+
+        return _add_product_rows(supabase, p_name, p_category, p_price, p_stock, p_reorder, p_supplier)
+
     except Exception as e:
         raise Exception(f"Failed to add product: {str(e)}")
+    finally:
+        # A new product row: every products_ reader is stale
+        query_cache.invalidate("products_")
+        query_cache.invalidate("shipments")
+        query_cache.invalidate("stock_entries")
+
+@query_cache.cached(ttl=CATEGORIES_TTL, depends_on={"products_": ("category",)})
+def _fetch_categories(supabase: Client):
+    return _categories_of(get_replica(supabase, "products_").rows(supabase))
+
+def _categories_of(rows):
+    return sorted(set(row['category'] for row in rows if row['category']))
 
 def get_categories(supabase: Client):
     try:
-        response = supabase.table("products_").select("category").execute()
-        categories = sorted(set(row['category'] for row in response.data if row['category']))
-        return categories
+        return _fetch_categories(supabase)
     except Exception as e:
         st.error(f"Error fetching categories: {str(e)}")
         return []
 
+@query_cache.cached(ttl=SUPPLIERS_TTL, depends_on={"suppliers": ("supplier_id", "supplier_name")})
+def _fetch_suppliers(supabase: Client):
+    return _supplier_options(get_replica(supabase, "suppliers").rows(supabase))
+
+def _supplier_options(rows):
+    suppliers = [{"supplier_id": s["supplier_id"], "supplier_name": s["supplier_name"]} for s in rows]
+    return sorted(suppliers, key=lambda s: s["supplier_name"] or "")
+
 def get_suppliers(supabase: Client):
     try:
-        response = supabase.table("suppliers").select("supplier_id, supplier_name").order("supplier_name").execute()
-        return response.data
+        return _fetch_suppliers(supabase)
     except Exception as e:
         st.error(f"Error fetching suppliers: {str(e)}")
         return []
 
+@query_cache.cached(ttl=PRODUCTS_TTL, depends_on={"products_": ("product_id", "product_name")})
+def _fetch_all_products(supabase: Client):
+    return _product_options(get_replica(supabase, "products_").rows(supabase))
+
+def _product_options(rows):
+    products = [{"product_id": p["product_id"], "product_name": p["product_name"]} for p in rows]
+    return sorted(products, key=lambda p: p["product_name"] or "")
+
 def get_all_products(supabase: Client):
     try:
-        response = supabase.table("products_").select("product_id, product_name").order("product_name").execute()
-        return response.data
+        return _fetch_all_products(supabase)
     except Exception as e:
         st.error(f"Error fetching products: {str(e)}")
         return []
 
-def get_product_history(supabase: Client, product_id):
+@query_cache.cached(ttl=PRODUCTS_TTL, depends_on={"products_": ("product_id", "product_name", "category")})
+def _build_product_index(supabase: Client):
+    return SearchIndex(get_replica(supabase, "products_").rows(supabase), "product_id", "product_name", "category")
+
+def get_product_index(supabase: Client):
     try:
-        response = supabase.table("product_inventory_history").select("*").eq(
-            "product_id", product_id
-        ).order("record_date", desc=True).execute()
-        return response.data
+        return _build_product_index(supabase)
+    except Exception as e:
+        st.error(f"Error fetching products: {str(e)}")
+        return SearchIndex([], "product_id", "product_name")
+
+@query_cache.cached(ttl=SUPPLIERS_TTL, depends_on={"suppliers": ("supplier_id", "supplier_name")})
+def _build_supplier_index(supabase: Client):
+    return SearchIndex(get_replica(supabase, "suppliers").rows(supabase), "supplier_id", "supplier_name")
+
+def get_supplier_index(supabase: Client):
+    try:
+        return _build_supplier_index(supabase)
+    except Exception as e:
+        st.error(f"Error fetching suppliers: {str(e)}")
+        return SearchIndex([], "supplier_id", "supplier_name")
+
+def warm_caches(supabase: Client):
+    # Fill the reference-data and metrics caches ahead of the first page that needs them.
+    # Sessions asking for the same data meanwhile join these fetches (query_cache
+    # single-flight) instead of repeating them; a failed fetch just stays cold
+    with startup.timed("warm caches"):
+        tasks = {
+            "dashboard": lambda: get_dashboard_panels(supabase),
+            "categories": lambda: _fetch_categories(supabase),
+            "suppliers": lambda: _fetch_suppliers(supabase),
+            "product index": lambda: _build_product_index(supabase),
+            "supplier index": lambda: _build_supplier_index(supabase),
+        }
+        results, errors = fetch_concurrently(tasks)
+    if "dashboard" in results:
+        errors.update(results["dashboard"][1])
+    for label, error in errors.items():
+        startup.mark(f"warm failed: {label}: {error}")
+
+
+HISTORY_PAGE_SIZE = 50
+
+
+def _history_view_query(supabase: Client, product_id, cursor, page_size, date_from, date_to):
+    # Fallback while get_product_history_page is not deployed: the old view has
+    # no row id, so page by offset over a date-filtered read
+    offset = (cursor or {}).get("offset", 0)
+    query = supabase.table("product_inventory_history").select("*").eq("product_id", product_id)
+    if date_from:
+        query = query.gte("record_date", date_from.isoformat())
+    if date_to:
+        query = query.lte("record_date", date_to.isoformat())
+    return query.order("record_date", desc=True).range(offset, offset + page_size - 1)
+
+
+def _history_view_page(rows, cursor, page_size):
+    offset = (cursor or {}).get("offset", 0)
+    next_cursor = {"offset": offset + len(rows)} if len(rows) == page_size else None
+    return {"rows": rows, "next_cursor": next_cursor}
+
+
+def _history_page_from_view(supabase: Client, product_id, cursor, page_size, date_from, date_to):
+    query = _history_view_query(supabase, product_id, cursor, page_size, date_from, date_to)
+    return _history_view_page(query.execute().data, cursor, page_size)
+
+
+def _history_page_params(product_id, cursor, page_size, date_from, date_to):
+    params = {
+        "p_product_id": int(product_id),
+        "p_limit": int(page_size),
+        "p_date_from": date_from.isoformat() if date_from else None,
+        "p_date_to": date_to.isoformat() if date_to else None,
+    }
+    if cursor and "record_date" in cursor:
+        params.update({
+            "p_before_date": cursor["record_date"],
+            "p_before_type": cursor["record_type"],
+            "p_before_id": cursor["record_id"],
+        })
+    return params
+
+
+def _history_page(rows, page_size):
+    next_cursor = None
+    if len(rows) == page_size:
+        last = rows[-1]
+        next_cursor = {key: last[key] for key in ("record_date", "record_type", "record_id")}
+    return {"rows": rows, "next_cursor": next_cursor}
+
+
+def get_product_history_page(supabase: Client, product_id, cursor=None, page_size=HISTORY_PAGE_SIZE,
+                             date_from=None, date_to=None):
+    # Newest first. Pass the returned next_cursor back in to get the following page;
+    # next_cursor is None on the last page.
+    try:
+        params = _history_page_params(product_id, cursor, page_size, date_from, date_to)
+        try:
+            rows = supabase.rpc("get_product_history_page", params).execute().data
+        except Exception as e:
+            if not is_missing_rpc(e):
+                raise
+            return _history_page_from_view(supabase, product_id, cursor, page_size, date_from, date_to)
+        return _history_page(rows, page_size)
+
     except Exception as e:
         st.error(f"Error fetching product history: {str(e)}")
+        return {"rows": [], "next_cursor": None}
+
+
+def get_product_history_summary(supabase: Client, product_id, date_from=None, date_to=None):
+    # Record count and total quantity per record_type/change_type, computed server-side
+    try:
+        return supabase.rpc("get_product_history_summary",
+                            _history_summary_params(product_id, date_from, date_to)).execute().data
+    except Exception as e:
+        if not is_missing_rpc(e):
+            st.error(f"Error fetching product history summary: {str(e)}")
         return []
 
+def _history_summary_params(product_id, date_from=None, date_to=None):
+    return {
+        "p_product_id": int(product_id),
+        "p_date_from": date_from.isoformat() if date_from else None,
+        "p_date_to": date_to.isoformat() if date_to else None,
+    }
+
 def place_reorder(supabase: Client, db, product_id, reorder_quantity):
     try:
         # Get the max reorder_id
@@ -261,88 +740,140 @@ def place_reorder(supabase: Client, db, product_id, reorder_quantity):
         }).execute()
     except Exception as e:
         raise Exception(f"Failed to place reorder: {str(e)}")
+    finally:
+        query_cache.invalidate("reorders")
 
 
 def get_pending_reorders(supabase: Client):
     try:
-        response = supabase.table("reorders").select(
-            "reorder_id, products_(product_name)"
-        ).in_("status", ["Pending", "Ordered"]).execute()
-        
-        # Flatten the nested product data
-        flattened = []
-        for item in response.data:
-            flattened.append({
-                "reorder_id": item.get("reorder_id"),
-                "product_name": item.get("products_", {}).get("product_name") if item.get("products_") else None
-            })
-        return flattened
+        reorders = get_replica(supabase, "reorders").rows(supabase)
+        products = get_replica(supabase, "products_").rows(supabase)
+        return _pending_reorder_rows(reorders, products)
     except Exception as e:
         st.error(f"Error fetching pending reorders: {str(e)}")
         return []
 
-def mark_reorder_as_received(supabase: Client, db, reorder_id):
-    try:
-        # Get reorder details
-        response = supabase.table("reorders").select("product_id, reorder_quantity").eq("reorder_id", reorder_id).execute()
-        if not response.data:
-            raise Exception("Reorder not found")
-        
-        prod_id = response.data[0]["product_id"]
-        qty = response.data[0]["reorder_quantity"]
-        
-        # Get supplier_id from products
-        response = supabase.table("products_").select("supplier_id").eq("product_id", prod_id).execute()
-        sup_id = response.data[0]["supplier_id"]
-        
-        # Update reorder status
-        from datetime import datetime
-        supabase.table("reorders").update({
-            "status": "Received",
-            "updated_at": datetime.now().isoformat()
-        }).eq("reorder_id", reorder_id).execute()
-        
-        # Update product stock quantity
-        response = supabase.table("products_").select("stock_quantity").eq("product_id", prod_id).execute()
-        current_stock = response.data[0]["stock_quantity"]
-        
+def _pending_reorder_rows(reorders, products):
+    # Join the product names locally
+    product_names = {p["product_id"]: p["product_name"] for p in products}
+    flattened = []
+    for item in sorted(reorders, key=lambda r: r["reorder_id"]):
+        if item.get("status") in ("Pending", "Ordered"):
+            flattened.append({
+                "reorder_id": item.get("reorder_id"),
+                "product_name": product_names.get(item.get("product_id"))
+            })
+    return flattened
+
+# Outcome receive_reorders() reports for a reorder it did not receive
+RECEIVE_FAILED = "Not found or already received"
+
+
+def _receive_reorders_rows(supabase: Client, reorder_ids):
+    # Fallback for projects without the receive RPCs: a few batched requests plus one
+    # stock update per product, however many reorders. Returns the received reorder_ids.
+    from datetime import date, datetime
+    response = supabase.table("reorders").select("reorder_id, product_id, reorder_quantity, status") \
+        .in_("reorder_id", list(reorder_ids)).execute()
+    open_ids = [r["reorder_id"] for r in response.data if r["status"] in OPEN_STATUSES]
+    if not open_ids:
+        return set()
+
+    # Only the rows still open when the update runs are received
+    received = supabase.table("reorders").update({
+        "status": "Received",
+        "updated_at": datetime.now().isoformat()
+    }).in_("reorder_id", open_ids).in_("status", list(OPEN_STATUSES)).execute().data
+    if not received:
+        return set()
+    received.sort(key=lambda r: r["reorder_id"])
+
+    totals = {}
+    for r in received:
+        totals[r["product_id"]] = totals.get(r["product_id"], 0) + r["reorder_quantity"]
+    response = supabase.table("products_").select("product_id, supplier_id, stock_quantity") \
+        .in_("product_id", list(totals)).execute()
+    products = {p["product_id"]: p for p in response.data}
+    for product_id, qty in totals.items():
         supabase.table("products_").update({
-            "stock_quantity": current_stock + qty,
+            "stock_quantity": products[product_id]["stock_quantity"] + qty,
             "updated_at": datetime.now().isoformat()
-        }).eq("product_id", prod_id).execute()
-        
-        # Add shipment record
-        response = supabase.table("shipments").select("shipment_id").order("shipment_id", desc=True).limit(1).execute()
-        new_shipment_id = (response.data[0]["shipment_id"] + 1) if response.data else 1
-        
-        from datetime import date
-        supabase.table("shipments").insert({
-            "shipment_id": new_shipment_id,
-            "product_id": prod_id,
-            "supplier_id": sup_id,
-            "quantity_received": qty,
-            "shipment_date": date.today().isoformat()
-        }).execute()
-        
-        # Add stock entry
-        response = supabase.table("stock_entries").select("entry_id").order("entry_id", desc=True).limit(1).execute()
-        new_entry_id = (response.data[0]["entry_id"] + 1) if response.data else 1
-        
-        supabase.table("stock_entries").insert({
-            "entry_id": new_entry_id,
-            "product_id": prod_id,
-            "change_quantity": qty,
-            "change_type": "Restock",
-            "entry_date": date.today().isoformat()
-        }).execute()
-        
-    except Exception as e:
-        raise Exception(f"Failed to mark reorder as received: {str(e)}")
+        }).eq("product_id", product_id).execute()
+
+    today = date.today().isoformat()
+    response = supabase.table("shipments").select("shipment_id").order("shipment_id", desc=True).limit(1).execute()
+    first_shipment_id = (response.data[0]["shipment_id"] + 1) if response.data else 1
+    supabase.table("shipments").insert([{
+        "shipment_id": first_shipment_id + i,
+        "product_id": r["product_id"],
+        "supplier_id": products[r["product_id"]]["supplier_id"],
+        "quantity_received": r["reorder_quantity"],
+        "shipment_date": today
+    } for i, r in enumerate(received)]).execute()
+
+    response = supabase.table("stock_entries").select("entry_id").order("entry_id", desc=True).limit(1).execute()
+    first_entry_id = (response.data[0]["entry_id"] + 1) if response.data else 1
+    supabase.table("stock_entries").insert([{
+        "entry_id": first_entry_id + i,
+        "product_id": r["product_id"],
+        "change_quantity": r["reorder_quantity"],
+        "change_type": "Restock",
+        "entry_date": today
+    } for i, r in enumerate(received)]).execute()
+
+    return {r["reorder_id"] for r in received}
+
+
+def _receive_reorder_rows(supabase: Client, reorder_id):
+    # Row-by-row fallback for projects without the mark_reorder_as_received RPC
+    if not _receive_reorders_rows(supabase, [int(reorder_id)]):
+        raise Exception(f"Reorder {reorder_id} not found or already received")
 
 
+def mark_reorder_as_received(supabase: Client, db, reorder_id):
+    try:
+        # Status, stock increment, shipment and ledger entry in one transaction
+        try:
+            supabase.rpc("mark_reorder_as_received", {"in_reorder_id": int(reorder_id)}).execute()
+            return
+        except Exception as e:
+            if not is_missing_rpc(e):
+                raise
 
+        _receive_reorder_rows(supabase, reorder_id)
 
+    except Exception as e:
+        raise Exception(f"Failed to mark reorder as received: {str(e)}")
+    finally:
+        # Only stock levels and reorder status change; names and categories stay cached
+        query_cache.invalidate("reorders", ["status"])
+        query_cache.invalidate("products_", ["stock_quantity"])
+        query_cache.invalidate("shipments")
+        query_cache.invalidate("stock_entries")
 
 
+def mark_reorders_as_received(supabase: Client, db, reorder_ids):
+    # Receive many reorders at once; returns {reorder_id: outcome}
+    reorder_ids = [int(r) for r in reorder_ids]
+    if not reorder_ids:
+        return {}
 
+    try:
+        try:
+            response = supabase.rpc("receive_reorders", {"in_reorder_ids": reorder_ids}).execute()
+            return {row["reorder_id"]: row["outcome"] for row in response.data}
+        except Exception as e:
+            if not is_missing_rpc(e):
+                raise
+
+        # receive_reorders not deployed: the batched fallback, with the RPC's outcomes
+        received = _receive_reorders_rows(supabase, reorder_ids)
+        return {r: "Received" if r in received else RECEIVE_FAILED for r in reorder_ids}
 
+    except Exception as e:
+        raise Exception(f"Failed to mark reorders as received: {str(e)}")
+    finally:
+        query_cache.invalidate("reorders", ["status"])
+        query_cache.invalidate("products_", ["stock_quantity"])
+        query_cache.invalidate("shipments")
+        query_cache.invalidate("stock_entries")
@@ -0,0 +1,463 @@
+"""
+In-memory stand-in for the Supabase client, for offline benchmarks.
+Implements the query-builder subset db_functions uses (select with
+count/head and embedded relations, eq/neq/in_/gt/gte/lt/lte, order,
+limit, range, insert, update, rpc) over plain lists of dicts, with
+optional per-request latency and a round-trip counter.
+"""
+
+import operator
+import random
+import threading
+import time
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from postgrest.exceptions import APIError
+
+# Primary key of each table; also the column other tables embed it by
+PRIMARY_KEYS = {
+    "suppliers": "supplier_id",
+    "products_": "product_id",
+    "shipments": "shipment_id",
+    "stock_entries": "entry_id",
+    "reorders": "reorder_id",
+}
+
+# Tables with an updated_at column maintained by a trigger in the real schema
+TOUCHED_TABLES = ("products_", "reorders")
+
+# PostgREST caps every response at max-rows (1000 on Supabase by default)
+DEFAULT_MAX_ROWS = 1000
+
+_FILTERS = {
+    "eq": operator.eq,
+    "neq": operator.ne,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _split_columns(columns):
+    # "a, rel(b, c), d" -> ["a", "rel(b, c)", "d"]
+    parts, depth, current = [], 0, ""
+    for ch in columns:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += ch
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def _history_view(tables, keyed):
+    # Mirrors product_inventory_history(_keyed) in supabase_functions.sql
+    supplier_of = {p["product_id"]: p.get("supplier_id") for p in tables["products_"]}
+    rows = []
+    for s in tables["shipments"]:
+        if s["product_id"] in supplier_of:
+            rows.append({
+                "product_id": s["product_id"], "record_type": "Shipment", "record_id": s["shipment_id"],
+                "record_date": s["shipment_date"], "quantity": s["quantity_received"], "change_type": None,
+                "supplier_id": supplier_of[s["product_id"]],
+            })
+    for e in tables["stock_entries"]:
+        if e["product_id"] in supplier_of:
+            rows.append({
+                "product_id": e["product_id"], "record_type": "Stock Entry", "record_id": e["entry_id"],
+                "record_date": e["entry_date"], "quantity": e["change_quantity"], "change_type": e["change_type"],
+                "supplier_id": supplier_of[e["product_id"]],
+            })
+    if not keyed:
+        for row in rows:
+            del row["record_id"]
+    return rows
+
+
+VIEWS = {
+    "product_inventory_history": lambda tables: _history_view(tables, keyed=False),
+    "product_inventory_history_keyed": lambda tables: _history_view(tables, keyed=True),
+}
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self._client = client
+        self._table = table
+        self._filters = []
+        self._order = []
+        self._offset = 0
+        self._limit = None
+        self._columns = "*"
+        self._count = None
+        self._head = False
+        self._operation = "select"
+        self._payload = None
+
+    def select(self, columns="*", count=None, head=None):
+        self._columns = columns
+        self._count = count
+        self._head = bool(head)
+        return self
+
+    def insert(self, payload):
+        self._operation = "insert"
+        self._payload = payload
+        return self
+
+    def update(self, payload):
+        self._operation = "update"
+        self._payload = payload
+        return self
+
+    def _filter(self, op, column, value):
+        self._filters.append((op, column, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter("eq", column, value)
+
+    def neq(self, column, value):
+        return self._filter("neq", column, value)
+
+    def gt(self, column, value):
+        return self._filter("gt", column, value)
+
+    def gte(self, column, value):
+        return self._filter("gte", column, value)
+
+    def lt(self, column, value):
+        return self._filter("lt", column, value)
+
+    def lte(self, column, value):
+        return self._filter("lte", column, value)
+
+    def in_(self, column, values):
+        return self._filter("in", column, set(values))
+
+    def order(self, column, desc=False):
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size):
+        self._limit = size
+        return self
+
+    def range(self, start, end):
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    def execute(self):
+        return self._client._execute(self)
+
+    # Evaluation, called by the client under its lock
+
+    def _matches(self, row):
+        for op, column, value in self._filters:
+            cell = row.get(column)
+            if op == "in":
+                if cell not in value:
+                    return False
+            elif op == "eq" or op == "neq":
+                if not _FILTERS[op](cell, value):
+                    return False
+            elif cell is None or not _FILTERS[op](cell, value):
+                return False
+        return True
+
+    def _candidates(self, rows):
+        # Keyset pages filter gt(primary key); tables are kept in key order, so bisect
+        key = PRIMARY_KEYS.get(self._table)
+        for op, column, value in self._filters:
+            if op == "gt" and column == key:
+                return rows[bisect_right(rows, value, key=lambda r: r[key]):]
+        return rows
+
+    def _project(self, row):
+        if self._columns.strip() == "*":
+            return dict(row)
+        out = {}
+        for column in _split_columns(self._columns):
+            if "(" in column:
+                relation, inner = column[:-1].split("(", 1)
+                relation = relation.strip()
+                join_key = PRIMARY_KEYS[relation]
+                match = self._client._lookup(relation, row.get(join_key))
+                inner_columns = [c.strip() for c in inner.split(",")]
+                out[relation] = {c: match.get(c) for c in inner_columns} if match else None
+            else:
+                out[column] = row.get(column)
+        return out
+
+    def _run_select(self, rows, max_rows):
+        limit = self._limit
+        if max_rows and (limit is None or limit > max_rows):
+            limit = max_rows
+        end = None if limit is None else self._offset + limit
+
+        matches = (row for row in self._candidates(rows) if self._matches(row))
+        key = PRIMARY_KEYS.get(self._table)
+        if self._count is None and self._order in ([], [(key, False)]):
+            # Already in key order: stop scanning once the page is full
+            selected = list(islice(matches, end))
+        elif self._count is None and self._order == [(key, True)]:
+            selected = list(islice((row for row in reversed(rows) if self._matches(row)), end))
+        else:
+            selected = list(matches)
+            for column, desc in reversed(self._order):
+                # NULLs sort last ascending and first descending, as in Postgres
+                selected.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+        count = len(selected) if self._count else None
+        if self._head:
+            return FakeResponse([], count)
+
+        page = selected[self._offset:end]
+        return FakeResponse([self._project(row) for row in page], count)
+
+
+class FakeRPC:
+    def __init__(self, client, name, params):
+        self._client = client
+        self._name = name
+        self._params = params or {}
+
+    def execute(self):
+        return self._client._call(self._name, self._params)
+
+
+class FakeSupabase:
+    """
+    tables: {table: [row, ...]} as returned by generate_dataset().
+    latency: seconds slept per request, or a zero-argument callable returning it.
+    rpcs: {name: func(client, params) -> data}; any other RPC answers PGRST202,
+    so db_functions takes its client-side fallbacks.
+    events: optional change_feed.LocalEventSource; inserts and updates made through
+    table() are published to it like Supabase realtime would.
+    """
+
+    def __init__(self, tables, latency=0.0, rpcs=None, max_rows=DEFAULT_MAX_ROWS, events=None):
+        # Rows are copied so several clients can share one generated dataset
+        self.tables = {name: [dict(r) for r in rows] for name, rows in tables.items()}
+        for name, key in PRIMARY_KEYS.items():
+            self.tables.setdefault(name, [])
+            self.tables[name].sort(key=lambda r: r[key])
+        self.latency = latency
+        self.rpcs = dict(rpcs or {})
+        self.max_rows = max_rows
+        self.events = events
+
+        self.requests = 0
+        self.rows_returned = 0
+        self._lock = threading.RLock()
+        # Primary-key indexes for embeds and duplicate checks, kept current on insert
+        self._indexes = {
+            name: {r[key]: r for r in self.tables[name]} for name, key in PRIMARY_KEYS.items()
+        }
+        self._views = {}
+        self._version = 0
+        self._next_ids = {
+            name: max((r[key] for r in self.tables[name]), default=0) + 1 for name, key in PRIMARY_KEYS.items()
+        }
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params=None):
+        return FakeRPC(self, name, params)
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = 0
+            self.rows_returned = 0
+
+    def _sleep(self):
+        delay = self.latency() if callable(self.latency) else self.latency
+        if delay:
+            # Outside the lock, so concurrent requests overlap like real HTTP calls
+            time.sleep(delay)
+
+    def _lookup(self, table, key):
+        return self._indexes[table].get(key)
+
+    def _view(self, name):
+        # Views are rebuilt only after a write
+        version, rows = self._views.get(name, (None, None))
+        if version != self._version:
+            rows = VIEWS[name](self.tables)
+            self._views[name] = (self._version, rows)
+        return rows
+
+    def _execute(self, query):
+        self._sleep()
+        with self._lock:
+            self.requests += 1
+            if query._table in VIEWS:
+                rows = self._view(query._table)
+            elif query._table in self.tables:
+                rows = self.tables[query._table]
+            else:
+                raise APIError({
+                    "code": "PGRST205",
+                    "message": f"Could not find the table 'public.{query._table}' in the schema cache",
+                })
+
+            changes = []   # (type, record, old_record)
+            if query._operation == "insert":
+                response = self._insert(query._table, query._payload)
+                changes = [("INSERT", row, None) for row in response.data]
+                self._version += 1
+            elif query._operation == "update":
+                response = self._update(query, rows, changes)
+                self._version += 1
+            else:
+                response = query._run_select(rows, self.max_rows)
+            self.rows_returned += len(response.data)
+
+        # Delivered after the lock is released, as realtime would after the commit
+        if self.events is not None:
+            for type, record, old_record in changes:
+                self.events.publish(query._table, type, record, old_record)
+        return response
+
+    def _insert(self, table, payload):
+        key = PRIMARY_KEYS[table]
+        now = datetime.now().isoformat()
+        inserted = []
+        for row in payload if isinstance(payload, list) else [payload]:
+            row = dict(row)
+            if row.get(key) is None:
+                row[key] = self._next_ids[table]
+            if self._lookup(table, row[key]) is not None:
+                raise APIError({"code": "23505", "message": f'duplicate key value violates unique constraint "{table}_pkey"'})
+            self._next_ids[table] = max(self._next_ids[table], row[key] + 1)
+            if table in TOUCHED_TABLES:
+                row["updated_at"] = now
+            rows = self.tables[table]
+            if rows and rows[-1][key] > row[key]:
+                rows.append(row)
+                rows.sort(key=lambda r: r[key])
+            else:
+                rows.append(row)
+            self._indexes[table][row[key]] = row
+            inserted.append(dict(row))
+        return FakeResponse(inserted)
+
+    def _update(self, query, rows, changes):
+        now = datetime.now().isoformat()
+        updated = []
+        for row in rows:
+            if query._matches(row):
+                old_row = dict(row)
+                row.update(query._payload)
+                if query._table in TOUCHED_TABLES:
+                    row["updated_at"] = now
+                updated.append(dict(row))
+                changes.append(("UPDATE", dict(row), old_row))
+        return FakeResponse(updated)
+
+    def _call(self, name, params):
+        self._sleep()
+        with self._lock:
+            self.requests += 1
+            func = self.rpcs.get(name)
+        if func is None:
+            raise APIError({
+                "code": "PGRST202",
+                "message": f"Could not find the function public.{name} in the schema cache",
+            })
+        data = func(self, params)
+        with self._lock:
+            self.rows_returned += len(data) if isinstance(data, list) else 1
+        return FakeResponse(data)
+
+
+CATEGORIES = ["Electronics", "Grocery", "Clothing", "Home", "Toys", "Sports", "Beauty", "Automotive"]
+CHANGE_TYPES = ["Sale", "Restock", "Adjustment"]
+REORDER_STATUSES = ["Pending", "Ordered", "Received"]
+
+
+def generate_dataset(products=1000, suppliers=None, stock_entries=None, reorders=None,
+                     days=365, seed=0, today=None):
+    # Sizes not given scale with the product count
+    rnd = random.Random(seed)
+    today = today or date.today()
+    suppliers = suppliers if suppliers is not None else max(5, products // 50)
+    stock_entries = stock_entries if stock_entries is not None else products * 20
+    reorders = reorders if reorders is not None else max(10, products // 5)
+    stamp = datetime.combine(today, datetime.min.time()).isoformat()
+
+    def day(offset):
+        return (today - timedelta(days=offset)).isoformat()
+
+    supplier_rows = [{
+        "supplier_id": i,
+        "supplier_name": f"Supplier {i}",
+        "contact_name": f"Contact {i}",
+        "email": f"supplier{i}@example.com",
+        "phone": f"555-{i:04d}",
+    } for i in range(1, suppliers + 1)]
+
+    product_rows = [{
+        "product_id": i,
+        "product_name": f"{rnd.choice(CATEGORIES)} item {i}",
+        "category": rnd.choice(CATEGORIES),
+        "price": round(rnd.uniform(1, 500), 2),
+        "stock_quantity": rnd.randint(0, 200),
+        "reorder_level": rnd.randint(5, 50),
+        "supplier_id": rnd.randint(1, suppliers),
+        "updated_at": stamp,
+    } for i in range(1, products + 1)]
+
+    # One initial shipment per product, as add_new_manual_id writes
+    shipment_rows = [{
+        "shipment_id": p["product_id"],
+        "product_id": p["product_id"],
+        "supplier_id": p["supplier_id"],
+        "quantity_received": p["stock_quantity"],
+        "shipment_date": day(days),
+    } for p in product_rows]
+
+    entry_rows = []
+    for i in range(1, stock_entries + 1):
+        change_type = rnd.choices(CHANGE_TYPES, weights=(6, 3, 1))[0]
+        quantity = rnd.randint(1, 20)
+        entry_rows.append({
+            "entry_id": i,
+            "product_id": rnd.randint(1, products),
+            "change_quantity": -quantity if change_type == "Sale" else quantity,
+            "change_type": change_type,
+            "entry_date": day(rnd.randint(0, days)),
+        })
+
+    reorder_rows = [{
+        "reorder_id": i,
+        "product_id": rnd.randint(1, products),
+        "reorder_quantity": rnd.randint(10, 100),
+        "reorder_date": day(rnd.randint(0, 30)),
+        "status": rnd.choice(REORDER_STATUSES),
+        "updated_at": stamp,
+    } for i in range(1, reorders + 1)]
+
+    return {
+        "suppliers": supplier_rows,
+        "products_": product_rows,
+        "shipments": shipment_rows,
+        "stock_entries": entry_rows,
+        "reorders": reorder_rows,
+    }
@@ -0,0 +1,251 @@
+"""
+Per-query instrumentation of the Supabase client.
+instrument() wraps the client so every executed query is recorded with
+its table, filters, returned rows, payload size and latency, attributed
+to the db_functions function that issued it and to the Streamlit rerun.
+Recording is opt-in per session; a disabled session only counts its
+queries, for the per-interaction counter.
+"""
+
+import json
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+
+try:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+except ImportError:
+    get_script_run_ctx = None
+
+# Records kept in memory, oldest dropped first
+MAX_RECORDS = 5000
+# Modules whose functions a query is attributed to
+CALLER_MODULES = ("db_functions", "bulk_import", "replica")
+# Builder methods that narrow or shape a query; recorded with their arguments
+TRACED_METHODS = {
+    "select", "insert", "update", "upsert", "delete",
+    "eq", "neq", "gt", "gte", "lt", "lte", "in_", "is_", "like", "ilike", "contains",
+    "order", "limit", "range", "single", "maybe_single",
+}
+
+_lock = threading.Lock()
+_records = deque(maxlen=MAX_RECORDS)
+_sessions = {}   # session id -> {"rerun": n, "enabled": bool, "calls": queries so far}
+# callers() of the thread that submitted the running task; set by parallel_fetch
+submitted_by = ContextVar("submitted_by", default=(None, None))
+
+
+def _session_id():
+    ctx = get_script_run_ctx(suppress_warning=True) if get_script_run_ctx else None
+    return ctx.session_id if ctx is not None else None
+
+
+def start_rerun(enabled=True):
+    # Call once at the top of every script run; numbers the reruns of this session
+    session = _session_id()
+    with _lock:
+        state = _sessions.setdefault(session, {"rerun": 0, "enabled": False, "calls": 0})
+        state["rerun"] += 1
+        state["enabled"] = enabled
+        return state["rerun"]
+
+
+def session_calls():
+    # Backend calls made by this session so far, recorded or not; the difference
+    # across a script or fragment run is what that interaction cost
+    state = _sessions.get(_session_id())
+    return state["calls"] if state is not None else 0
+
+
+def _active_rerun():
+    # Counts the call; None when the current session is not recording
+    session = _session_id()
+    state = _sessions.get(session)
+    if state is None:
+        return None
+    with _lock:
+        state["calls"] += 1
+    if not state["enabled"]:
+        return None
+    return session, state["rerun"]
+
+
+def callers():
+    # (outermost, innermost) frames in CALLER_MODULES, e.g. get_dashboard_panels and _max_entry_date.
+    # In a fetch_concurrently worker the outermost comes from the thread that submitted the task.
+    frame, outermost, innermost = sys._getframe(1), None, None
+    while frame is not None:
+        module = frame.f_globals.get("__name__")
+        if module in CALLER_MODULES and not frame.f_code.co_name.startswith("<"):
+            outermost = f"{module}.{frame.f_code.co_name}"
+            innermost = innermost or outermost
+        frame = frame.f_back
+    submitted_outermost, submitted_innermost = submitted_by.get()
+    return submitted_outermost or outermost, innermost or submitted_innermost
+
+
+def _format_call(method, args, kwargs):
+    parts = [repr(a) if not isinstance(a, (list, dict)) else f"<{len(a)} items>" for a in args]
+    parts += [f"{k}={v!r}" for k, v in kwargs.items()]
+    return f"{method}({', '.join(parts)})"
+
+
+def _payload_bytes(data):
+    try:
+        return len(json.dumps(data, default=str))
+    except (TypeError, ValueError):
+        return None
+
+
+class _Trace:
+    def __init__(self, table, operation):
+        self.table = table
+        self.operation = operation
+        self.calls = []
+
+
+class _TracedBuilder:
+    # Proxies a postgrest request builder, noting each call until execute()
+
+    def __init__(self, target, trace):
+        self._target = target
+        self._trace = trace
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return self._wrap(attr)
+
+        def call(*args, **kwargs):
+            if name in TRACED_METHODS:
+                self._trace.calls.append(_format_call(name, args, kwargs))
+                if name in ("insert", "update", "upsert", "delete"):
+                    self._trace.operation = name
+            return self._wrap(attr(*args, **kwargs))
+        return call
+
+    def _wrap(self, value):
+        if hasattr(value, "execute") and not isinstance(value, _TracedBuilder):
+            return _TracedBuilder(value, self._trace)
+        return value
+
+    def execute(self):
+        return _execute(self._target, self._trace)
+
+
+def _execute(target, trace):
+    active = _active_rerun()
+    if active is None:
+        return target.execute()
+
+    function, site = callers()
+    started = time.perf_counter()
+    response, error = None, None
+    try:
+        response = target.execute()
+        return response
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        data = getattr(response, "data", None)
+        record({
+            "time": datetime.now().isoformat(timespec="milliseconds"),
+            "session": active[0],
+            "rerun": active[1],
+            "function": function,
+            "site": site,
+            "table": trace.table,
+            "operation": trace.operation,
+            "calls": list(trace.calls),
+            "rows": len(data) if isinstance(data, list) else int(data is not None),
+            "bytes": _payload_bytes(data) if data is not None else 0,
+            "ms": round(elapsed * 1000, 2),
+            "error": error,
+        })
+
+
+class InstrumentedClient:
+    # Drop-in for supabase.Client; anything other than table() and rpc() passes through
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name):
+        return _TracedBuilder(self._client.table(name), _Trace(name, "select"))
+
+    def from_(self, name):
+        return self.table(name)
+
+    def rpc(self, name, params=None, *args, **kwargs):
+        trace = _Trace(name, "rpc")
+        if params:
+            trace.calls.append(_format_call("params", (), params))
+        return _TracedBuilder(self._client.rpc(name, params or {}, *args, **kwargs), trace)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def instrument(client):
+    return client if isinstance(client, InstrumentedClient) else InstrumentedClient(client)
+
+
+def record(entry):
+    with _lock:
+        _records.append(entry)
+
+
+def records(session=..., rerun=None):
+    # session defaults to the current one; pass None for queries made outside Streamlit
+    session = _session_id() if session is ... else session
+    with _lock:
+        return [r for r in _records if r["session"] == session and (rerun is None or r["rerun"] == rerun)]
+
+
+def clear(session=...):
+    session = _session_id() if session is ... else session
+    with _lock:
+        kept = [r for r in _records if r["session"] != session]
+        _records.clear()
+        _records.extend(kept)
+
+
+def summarize(entries, by="function"):
+    # Totals per `by` value (function, table, rerun, ...), slowest first
+    groups = {}
+    for r in entries:
+        g = groups.setdefault(r[by], {by: r[by], "queries": 0, "rows": 0, "bytes": 0, "total_ms": 0.0,
+                                      "max_ms": 0.0, "errors": 0})
+        g["queries"] += 1
+        g["rows"] += r["rows"]
+        g["bytes"] += r["bytes"] or 0
+        g["total_ms"] += r["ms"]
+        g["max_ms"] = max(g["max_ms"], r["ms"])
+        g["errors"] += r["error"] is not None
+    for g in groups.values():
+        g["total_ms"] = round(g["total_ms"], 2)
+    return sorted(groups.values(), key=lambda g: g["total_ms"], reverse=True)
+
+
+def repeated_queries(entries, min_count=5):
+    # Same function, table and query shape issued many times in one rerun: likely N+1.
+    # The shape ignores argument values, so eq('id', 1) and eq('id', 2) count together.
+    counts = {}
+    for r in entries:
+        shape = tuple(call.split("(", 1)[0] for call in r["calls"])
+        key = (r["rerun"], r["function"], r["table"], r["operation"], shape)
+        counts[key] = counts.get(key, 0) + 1
+    return [
+        {"rerun": k[0], "function": k[1], "table": k[2], "operation": k[3], "shape": ".".join(k[4]), "count": n}
+        for k, n in sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        if n >= min_count
+    ]
+
+
+def to_jsonl(entries):
+    return "".join(json.dumps(r, default=str) + "\n" for r in entries)
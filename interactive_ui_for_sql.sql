@@ -41,7 +41,7 @@ se.entry_date>=
  ;
  
  -- 6 
- select count(*) from products_  as p  where p.stock_quantity<p.reorder_level
+ select count(*) from products_  as p  where p.stock_quantity<=p.reorder_level
  and  product_id NOT IN 
  (
 select distinct product_id from reorders  where status ="Pending"
@@ -59,7 +59,7 @@ order by p.product_name asc;
 
 -- 9 product needing reorder
 select product_id,product_name,stock_quantity,reorder_level
-from products_ where stock_quantity<reorder_level;
+from products_ where stock_quantity<=reorder_level;
 
 -- 10 Add new product to the database
 delimiter $$
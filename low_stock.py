@@ -0,0 +1,118 @@
+"""
+Incrementally maintained set of products at or below their reorder level.
+The tracker listens to the products_ and reorders replicas and updates
+only the products in each pulled delta, so a place_reorder or a receipt
+costs a few set operations instead of a rescan of both tables.
+A product is low when stock_quantity <= reorder_level, everywhere.
+"""
+
+import threading
+
+from replica import get_replica
+
+OPEN_STATUSES = ("Pending", "Ordered")
+
+
+def is_low(product):
+    return (product.get("stock_quantity") or 0) <= (product.get("reorder_level") or 0)
+
+
+class LowStockTracker:
+    def __init__(self, products_replica=None, reorders_replica=None):
+        self.replicas = (products_replica, reorders_replica)
+        self._products = {}       # product_id -> row
+        self._low = set()         # product ids at or below their reorder level
+        self._open = {}           # open reorder_id -> product_id
+        self._open_counts = {}    # product_id -> open reorders
+        self._lock = threading.Lock()
+        if products_replica is not None:
+            products_replica.subscribe(self._on_products)
+            reorders_replica.subscribe(self._on_reorders)
+
+    @classmethod
+    def from_rows(cls, products, reorders):
+        # A one-off tracker over rows already read (async_db); follows no replica
+        tracker = cls()
+        tracker._on_products(products, True)
+        tracker._on_reorders(reorders, True)
+        return tracker
+
+    def close(self):
+        # Stop following the replicas, e.g. once replica.clear() has replaced them
+        if self.replicas[0] is not None:
+            self.replicas[0].unsubscribe(self._on_products)
+            self.replicas[1].unsubscribe(self._on_reorders)
+
+    def _on_products(self, rows, full):
+        with self._lock:
+            if full:
+                self._products, self._low = {}, set()
+            for row in rows:
+                product_id = row["product_id"]
+                self._products[product_id] = row
+                if is_low(row):
+                    self._low.add(product_id)
+                else:
+                    self._low.discard(product_id)
+
+    def _on_reorders(self, rows, full):
+        with self._lock:
+            if full:
+                self._open, self._open_counts = {}, {}
+            for row in rows:
+                reorder_id, product_id = row["reorder_id"], row["product_id"]
+                previous = self._open.pop(reorder_id, None)
+                if previous is not None:
+                    self._open_counts[previous] -= 1
+                    if not self._open_counts[previous]:
+                        del self._open_counts[previous]
+                if row.get("status") in OPEN_STATUSES:
+                    self._open[reorder_id] = product_id
+                    self._open_counts[product_id] = self._open_counts.get(product_id, 0) + 1
+
+    def sync(self, supabase):
+        # Pull the replicas' deltas; the listeners apply them. Never call under self._lock:
+        # the replicas notify while holding their own lock.
+        for replica in self.replicas:
+            if replica is not None:
+                replica.sync(supabase)
+
+    def product_ids(self, include_pending=False):
+        # Low product ids; without include_pending, only those with no open reorder
+        with self._lock:
+            ids = self._low if include_pending else [p for p in self._low if p not in self._open_counts]
+            return sorted(ids)
+
+    def count(self, include_pending=False):
+        with self._lock:
+            if include_pending:
+                return len(self._low)
+            return sum(1 for p in self._low if p not in self._open_counts)
+
+    def rows(self, product_ids):
+        with self._lock:
+            return [dict(self._products[p], pending_reorder=p in self._open_counts) for p in product_ids]
+
+    def page(self, number=1, page_size=50, include_pending=False):
+        # (product rows of page `number`, total low products), ordered by product_id
+        ids = self.product_ids(include_pending)
+        offset = (max(number, 1) - 1) * page_size
+        return self.rows(ids[offset:offset + page_size]), len(ids)
+
+
+_lock = threading.Lock()
+_trackers = {}   # id(client) -> LowStockTracker
+
+
+def get_tracker(supabase):
+    # Synced tracker for this client, rebuilt if its replicas were replaced (replica.clear());
+    # the old one is detached so the replaced replicas no longer feed it
+    replicas = (get_replica(supabase, "products_"), get_replica(supabase, "reorders"))
+    with _lock:
+        tracker = _trackers.get(id(supabase))
+        if tracker is None or tracker.replicas != replicas:
+            if tracker is not None:
+                tracker.close()
+            tracker = _trackers[id(supabase)] = LowStockTracker(*replicas)
+    tracker.sync(supabase)
+    return tracker
@@ -0,0 +1,161 @@
+"""
+Columnar aggregations over the stock_entries ledger.
+Rows are parsed once into a DataFrame and reduced with NumPy instead of
+walking the ledger one dict at a time.
+"""
+
+import numpy as np
+import pandas as pd
+
+LEDGER_COLUMNS = ["product_id", "change_type", "change_quantity", "entry_date"]
+# Sales are stored negative and restocks positive, and both count by magnitude;
+# an adjustment's sign is its direction, so it is kept
+SIGNED_CHANGE_TYPES = ("Adjustment",)
+
+
+def _parse_dates(values):
+    if isinstance(values, np.ndarray) and np.issubdtype(values.dtype, np.datetime64):
+        # Already typed, e.g. a date column read from a Parquet snapshot
+        return values.astype("datetime64[ns]")
+    # Parse each distinct date once; ledgers repeat a few hundred dates across millions of rows
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    # Keep only the date part of ISO strings (same result as fromisoformat(...).date())
+    text = pd.Series(uniques, dtype=object).astype(str).str.slice(0, 10)
+    parsed = pd.to_datetime(text, format="%Y-%m-%d", errors="coerce").to_numpy()
+    # code -1 (missing) picks the trailing NaT
+    return np.append(parsed, np.datetime64("NaT"))[codes]
+
+
+def _numeric(values):
+    try:
+        return np.asarray(values, dtype="float64")
+    except (TypeError, ValueError):
+        # None or string quantities: take the slower, forgiving path
+        return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").fillna(0).to_numpy(dtype="float64")
+
+
+def to_ledger_frame(entries):
+    # Accepts the list of dicts returned by PostgREST or an existing DataFrame
+    if isinstance(entries, pd.DataFrame):
+        columns = {name: entries[name].to_numpy() if name in entries else [None] * len(entries)
+                   for name in LEDGER_COLUMNS}
+    else:
+        entries = list(entries)
+        try:
+            columns = {name: [row[name] for row in entries] for name in LEDGER_COLUMNS}
+        except KeyError:
+            columns = {name: [row.get(name) for row in entries] for name in LEDGER_COLUMNS}
+
+    change_type = np.asarray(columns["change_type"], dtype=object)
+    quantity = np.nan_to_num(_numeric(columns["change_quantity"]))
+    signed = pd.Series(change_type, dtype=object).isin(SIGNED_CHANGE_TYPES).to_numpy()
+    return pd.DataFrame({
+        "product_id": np.asarray(columns["product_id"]),
+        "change_type": change_type,
+        "change_quantity": np.where(signed, quantity, np.abs(quantity)),
+        "entry_date": _parse_dates(columns["entry_date"]),
+    })
+
+
+def price_index(products):
+    # product_id -> price, as a Series so lookups become one vectorized join
+    if isinstance(products, dict):
+        return pd.Series(products, dtype="float64")
+    frame = products if isinstance(products, pd.DataFrame) else pd.DataFrame(list(products))
+    if frame.empty:
+        return pd.Series(dtype="float64")
+    return pd.Series(
+        pd.to_numeric(frame["price"], errors="coerce").fillna(0).to_numpy(dtype="float64"),
+        index=frame["product_id"].to_numpy(),
+    )
+
+
+def ledger_values(ledger, prices, change_types=("Sale", "Restock"), since=None):
+    # Sum of change_quantity * price per change_type, for entries on or after `since`; abs
+    # quantities except SIGNED_CHANGE_TYPES. Anything but a frame from to_ledger_frame is converted first
+    if (not isinstance(ledger, pd.DataFrame) or "entry_date" not in ledger
+            or not pd.api.types.is_datetime64_any_dtype(ledger["entry_date"])):
+        ledger = to_ledger_frame(ledger)
+    if not isinstance(prices, pd.Series):
+        prices = price_index(prices)
+
+    mask = ledger["entry_date"].notna().to_numpy().copy()
+    if since is not None:
+        mask &= (ledger["entry_date"] >= pd.Timestamp(since)).to_numpy()
+
+    type_codes, type_names = pd.factorize(ledger["change_type"])
+    wanted = {name: i for i, name in enumerate(change_types)}
+    remap = np.array([wanted.get(name, -1) for name in type_names] + [-1], dtype=np.int64)
+    codes = remap[type_codes]
+    mask &= codes >= 0
+
+    # Unknown products price at 0, like products_map.get(product_id, 0)
+    positions = prices.index.get_indexer(ledger["product_id"])
+    unit_prices = np.where(positions >= 0, prices.to_numpy()[positions], 0.0)
+
+    values = ledger["change_quantity"].to_numpy(dtype="float64") * unit_prices
+    totals = np.bincount(codes[mask], weights=values[mask], minlength=len(change_types))
+    return {change_type: float(total) for change_type, total in zip(change_types, totals)}
+
+
+def window_metrics(ledger, products, windows, as_of, group_by=(), change_types=("Sale", "Restock", "Adjustment")):
+    # Quantity and value per (window, *group_by, change_type) in one grouped pass.
+    # Each entry lands in the smallest window that contains it; the per-bucket sums
+    # are then accumulated, so every window costs one small sum over the groups.
+    # products: rows or a DataFrame with product_id, price and the group_by columns.
+    if not isinstance(ledger, pd.DataFrame) or not pd.api.types.is_datetime64_any_dtype(
+            ledger.get("entry_date", pd.Series(dtype=object))):
+        ledger = to_ledger_frame(ledger)
+    products = products if isinstance(products, pd.DataFrame) else pd.DataFrame(list(products))
+    windows = sorted(set(int(w) for w in windows))
+    group_by = list(group_by)
+    keys = ["window", *group_by, "change_type"]
+
+    dates = ledger["entry_date"].to_numpy().astype("datetime64[D]")
+    age = (np.datetime64(pd.Timestamp(as_of).date(), "D") - dates).astype("int64")
+    bucket = np.searchsorted(np.asarray(windows), age, side="left")
+    known = ledger["change_type"].isin(change_types).to_numpy()
+    mask = ~np.isnat(dates) & (bucket < len(windows)) & known
+
+    if products.empty:
+        positions = np.full(len(ledger), -1)
+        unit_prices = np.zeros(len(ledger))
+    else:
+        positions = pd.Index(products["product_id"]).get_indexer(ledger["product_id"])
+        prices = pd.to_numeric(products["price"], errors="coerce").fillna(0).to_numpy(dtype="float64")
+        unit_prices = np.where(positions >= 0, prices[positions], 0.0)
+
+    quantity = ledger["change_quantity"].to_numpy(dtype="float64")
+    frame = pd.DataFrame({
+        "bucket": bucket[mask],
+        "change_type": ledger["change_type"].to_numpy()[mask],
+        "quantity": quantity[mask],
+        "value": (quantity * unit_prices)[mask],
+    })
+    for column in group_by:
+        # Entries of unknown products group under None
+        values = products[column].to_numpy(dtype=object) if column in products else np.full(len(products), None)
+        frame[column] = np.where(positions >= 0, np.append(values, None)[positions], None)[mask]
+
+    per_bucket = frame.groupby(["bucket", *group_by, "change_type"], dropna=False, sort=False)[
+        ["quantity", "value"]].sum().reset_index()
+    results = []
+    for i, window in enumerate(windows):
+        inside = per_bucket[per_bucket["bucket"] <= i]
+        totals = inside.groupby([*group_by, "change_type"], dropna=False, sort=False)[["quantity", "value"]].sum()
+        results.append(totals.reset_index().assign(window=window))
+    if not results or all(r.empty for r in results):
+        return pd.DataFrame(columns=[*keys, "quantity", "value"])
+    return pd.concat(results, ignore_index=True)[[*keys, "quantity", "value"]]
+
+
+def merge_window_metrics(frames, group_by=()):
+    # Sums window_metrics results computed page by page
+    keys = ["window", *group_by, "change_type"]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=[*keys, "quantity", "value"])
+    if len(frames) == 1:
+        return frames[0]
+    merged = pd.concat(frames, ignore_index=True)
+    return merged.groupby(keys, dropna=False, sort=False)[["quantity", "value"]].sum().reset_index()
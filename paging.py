@@ -0,0 +1,71 @@
+"""
+Keyset-paginated readers for PostgREST tables.
+"""
+
+# Rows per request. The project's PostgREST max-rows (1000 on Supabase by
+# default) caps it silently, so a short page is not taken as the last one:
+# reading stops at the first empty page.
+DEFAULT_PAGE_SIZE = 1000
+
+
+def _with_key(columns, key):
+    # (columns to select, whether `key` was added and must be dropped from the rows)
+    selected = [c.strip() for c in columns.split(",")]
+    add_key = columns.strip() != "*" and key not in selected
+    return (f"{columns}, {key}" if add_key else columns), add_key
+
+
+def _page_query(supabase, table, columns, key, page_size, where, last_key):
+    query = supabase.table(table).select(columns)
+    if where is not None:
+        query = where(query)
+    if last_key is not None:
+        query = query.gt(key, last_key)
+    return query.order(key).limit(page_size)
+
+
+def _drop_key(rows, key):
+    for row in rows:
+        row.pop(key, None)
+
+
+def iter_pages(supabase, table, columns, key="id", page_size=None, where=None):
+    # Keyset pagination on `key`: each page asks for rows after the last key seen,
+    # so deep pages cost the same as the first and nothing is silently capped.
+    # `where` receives the query builder and returns it with extra filters applied.
+    page_size = page_size or DEFAULT_PAGE_SIZE
+    columns, add_key = _with_key(columns, key)
+
+    last_key = None
+    while True:
+        rows = _page_query(supabase, table, columns, key, page_size, where, last_key).execute().data
+        if not rows:
+            return
+
+        last_key = rows[-1][key]
+        if add_key:
+            _drop_key(rows, key)
+        yield rows
+
+
+async def aiter_pages(supabase, table, columns, key="id", page_size=None, where=None):
+    # iter_pages for an async client (supabase.AsyncClient): each page is awaited
+    page_size = page_size or DEFAULT_PAGE_SIZE
+    columns, add_key = _with_key(columns, key)
+
+    last_key = None
+    while True:
+        rows = (await _page_query(supabase, table, columns, key, page_size, where, last_key).execute()).data
+        if not rows:
+            return
+
+        last_key = rows[-1][key]
+        if add_key:
+            _drop_key(rows, key)
+        yield rows
+
+
+def iter_rows(supabase, table, columns, key="id", page_size=None, where=None):
+    # Same as iter_pages but one row at a time; only one page is held in memory
+    for page in iter_pages(supabase, table, columns, key, page_size, where):
+        yield from page
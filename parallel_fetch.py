@@ -0,0 +1,49 @@
+"""
+Run independent dashboard queries on a bounded thread pool.
+Results and errors are collected per task, so one failing panel does not
+blank the others.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+import instrumentation
+
+DEFAULT_MAX_WORKERS = 6
+
+try:
+    # Lets tasks that touch st.* from a worker thread render into the calling session
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:
+    add_script_run_ctx = get_script_run_ctx = None
+
+
+def _with_context(task, ctx, submitted_by):
+    # Each task runs in its own copy of the submitting thread's context, where
+    # instrumentation finds the functions that submitted it
+    context = copy_context()
+    context.run(instrumentation.submitted_by.set, submitted_by)
+
+    def run():
+        if ctx is not None:
+            add_script_run_ctx(ctx=ctx)
+        return task()
+    return lambda: context.run(run)
+
+
+def fetch_concurrently(tasks, max_workers=DEFAULT_MAX_WORKERS):
+    # tasks: {name: zero-argument callable}; returns ({name: result}, {name: exception})
+    if not tasks:
+        return {}, {}
+
+    ctx = get_script_run_ctx(suppress_warning=True) if get_script_run_ctx else None
+    submitted_by = instrumentation.callers()
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks)), thread_name_prefix="fetch") as pool:
+        futures = {name: pool.submit(_with_context(task, ctx, submitted_by)) for name, task in tasks.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                errors[name] = e
+    return results, errors
@@ -0,0 +1,106 @@
+"""
+In-memory search index for the product and supplier pickers.
+Lookups by ID are a dict hit, name prefixes a bisect over the sorted
+names, and substrings a walk over the shortest trigram (or category)
+posting list that stops at the limit. Nothing is built per query, so a
+first query costs the same as a repeated one.
+"""
+
+from bisect import bisect_left
+
+DEFAULT_LIMIT = 20
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    def __init__(self, rows, id_field, name_field, category_field=None):
+        self.id_field = id_field
+        self.name_field = name_field
+
+        # Position in name order doubles as the rank inside a match tier
+        ordered = sorted(rows, key=lambda r: ((r.get(name_field) or "").lower(), r[id_field]))
+        self._rows = ordered
+        self._names = [(r.get(name_field) or "").lower() for r in ordered]
+        self._by_id = {r[id_field]: r for r in ordered}
+        self._position = {r[id_field]: position for position, r in enumerate(ordered)}
+
+        # Postings are built in position order, so each list is already sorted
+        self._trigrams = {}
+        self._categories = {}
+        for position, name in enumerate(self._names):
+            for gram in _trigrams(name):
+                self._trigrams.setdefault(gram, []).append(position)
+            if category_field:
+                self._categories.setdefault(ordered[position].get(category_field), []).append(position)
+        # Category of each position, so filtering a candidate is a list lookup
+        self._category_at = [r.get(category_field) for r in ordered] if category_field else None
+
+        # Duplicate names get their ID appended so the picker can tell them apart
+        counts = {}
+        for name in self._names:
+            counts[name] = counts.get(name, 0) + 1
+        self._labels = {
+            r[id_field]: (f"{r.get(name_field)} (#{r[id_field]})" if counts[name] > 1 else r.get(name_field))
+            for r, name in zip(ordered, self._names)
+        }
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get(self, row_id):
+        return self._by_id.get(row_id)
+
+    def label(self, row_id):
+        return self._labels.get(row_id, str(row_id))
+
+    def categories(self):
+        return sorted(c for c in self._categories if c)
+
+    def search(self, query="", limit=DEFAULT_LIMIT, category=None):
+        # Ranked: exact ID, then name prefix, then substring; name order within each tier
+        query = (query or "").strip().lower()
+        if category is not None and self._category_at is None:
+            return []
+
+        results, seen = [], set()
+
+        def take(position):
+            if position not in seen and (category is None or self._category_at[position] == category):
+                seen.add(position)
+                results.append(self._rows[position])
+            return len(results) >= limit
+
+        if query.isdigit() and int(query) in self._position:
+            take(self._position[int(query)])
+
+        if not query:
+            positions = self._categories.get(category, []) if category is not None else range(len(self._rows))
+            for position in positions:
+                if take(position):
+                    break
+            return results
+
+        # Prefix matches are a contiguous run in the sorted names
+        position = bisect_left(self._names, query)
+        while position < len(self._names) and self._names[position].startswith(query):
+            if take(position):
+                return results
+            position += 1
+
+        if len(query) < 3:
+            return results
+
+        # Substring matches: walk the rarest trigram's postings, or the category's if
+        # shorter, in name order and check each name; no per-query sets are built,
+        # and the walk stops at `limit`
+        driver = min((self._trigrams.get(g, ()) for g in _trigrams(query)), key=len)
+        if category is not None:
+            driver = min(driver, self._categories.get(category, ()), key=len)
+        names = self._names
+        for position in driver:
+            if query in names[position] and take(position):
+                break
+        return results
@@ -0,0 +1,249 @@
+"""
+Process-wide TTL cache for db_functions readers.
+Each cached reader declares the tables (and optionally the columns) it
+reads, so a write can drop exactly the entries it made stale.
+Concurrent misses on the same key are single-flighted: the first caller
+fetches, the others wait for and share its result, so backend load
+follows distinct queries rather than the number of viewers.
+
+The last good result of every query is kept as a fallback. Past its TTL
+it is served at once while a background refresh runs
+(stale-while-revalidate); after an invalidation callers wait up to
+WAIT_TIMEOUT for the refresh. When the refresh is slow or fails, or the
+client's circuit breaker is open, the fallback is served instead;
+freshness() tells the page how old it is.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import circuit_breaker
+
+# Seconds past the TTL an entry is still served at once while it refreshes in the background
+STALE_WHILE_REVALIDATE = 300
+# Seconds a caller with a fallback waits for a refresh before being served the fallback
+WAIT_TIMEOUT = 2.0
+
+_lock = threading.RLock()
+_readers = {}        # qualified name -> _Reader
+_dependencies = {}   # table -> {qualified name: columns or None}
+_listeners = []      # callables notified as listener(table, columns) on invalidate
+_live = set()        # tables a change feed is currently delivering every change of
+_version = 0         # bumped by every invalidation
+
+
+class _Reader:
+    def __init__(self, func, ttl, max_entries, tables):
+        self.func = func
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.tables = frozenset(tables)
+        self.entries = OrderedDict()   # key -> _Entry, the last good result
+        # Bumped on every invalidation, so a fetch that raced one is not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.flights = {}   # key -> _Flight being fetched
+        self.coalesced = 0  # calls that shared another caller's fetch
+        self.stale = 0      # calls served a fallback instead of a fresh result
+
+
+class _Entry:
+    def __init__(self, stored_at, value):
+        self.stored_at = stored_at
+        self.value = value
+        # Cleared by invalidate(); the value stays as the fallback
+        self.valid = True
+
+
+class _Flight:
+    def __init__(self, generation):
+        self.generation = generation
+        self.started = time.monotonic()
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def _key(args, kwargs):
+    # The first argument is the client; keep results of different clients apart
+    client, rest = (args[0], args[1:]) if args else (None, ())
+    return (id(client), rest, tuple(sorted(kwargs.items())))
+
+
+def _fresh(reader, entry, now):
+    # With every dependency on a live change feed, entries live until invalidated
+    return entry.valid and (now - entry.stored_at < reader.ttl or bool(reader.tables and reader.tables <= _live))
+
+
+def _revalidating(reader, entry, now):
+    # Served at once, without waiting for the refresh
+    return entry.valid and now - entry.stored_at < reader.ttl + STALE_WHILE_REVALIDATE
+
+
+def _fetch(reader, key, flight, args, kwargs):
+    # Runs the reader for `flight`; an error stays on the flight for everyone waiting on it.
+    # The client's circuit breaker records the outcome of each request, not this
+    try:
+        flight.value = reader.func(*args, **kwargs)
+    except Exception as e:
+        flight.error = e
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _lock:
+            if reader.flights.get(key) is flight:
+                del reader.flights[key]
+            # Not stored if an invalidation raced the fetch
+            if flight.error is None and reader.generation == flight.generation:
+                reader.entries[key] = _Entry(flight.started, flight.value)
+                reader.entries.move_to_end(key)
+                while len(reader.entries) > reader.max_entries:
+                    reader.entries.popitem(last=False)
+        flight.done.set()
+
+
+def cached(ttl, depends_on, max_entries=32):
+    # depends_on: {table: None | (column, ...)}; None means any change to the table
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+        reader = _Reader(func, ttl, max_entries, depends_on)
+
+        with _lock:
+            _readers[name] = reader
+            for table, columns in depends_on.items():
+                _dependencies.setdefault(table, {})[name] = set(columns) if columns else None
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = _key(args, kwargs)
+            breaker = circuit_breaker.get_breaker(args[0] if args else None)
+            now = time.monotonic()
+            with _lock:
+                entry = reader.entries.get(key)
+                if entry is not None and _fresh(reader, entry, now):
+                    reader.entries.move_to_end(key)
+                    reader.hits += 1
+                    return entry.value
+                flight = reader.flights.get(key)
+                started = False
+                if flight is not None:
+                    # Another session is fetching the same thing
+                    reader.coalesced += 1
+                elif breaker is None or not breaker.is_open():
+                    flight = reader.flights[key] = _Flight(reader.generation)
+                    reader.misses += 1
+                    started = True
+
+            if entry is None:
+                # Nothing to fall back on: wait for the fetch, whatever it takes
+                if flight is None:
+                    raise circuit_breaker.BackendUnavailable(breaker.describe())
+                if started:
+                    _fetch(reader, key, flight, args, kwargs)
+                flight.done.wait()
+                if flight.error is not None:
+                    raise flight.error
+                return flight.value
+
+            if started:
+                threading.Thread(target=_fetch, args=(reader, key, flight, args, kwargs),
+                                 name="revalidate", daemon=True).start()
+            if (flight is not None and not _revalidating(reader, entry, now)
+                    and flight.done.wait(WAIT_TIMEOUT) and flight.error is None):
+                return flight.value
+            with _lock:
+                reader.stale += 1
+            return entry.value
+
+        wrapper.cache_name = name
+        wrapper.reader = reader
+        return wrapper
+
+    return decorator
+
+
+def invalidate(table, columns=None):
+    # Drop cached results of every reader that depends on the changed table/columns
+    global _version
+    changed = set(columns) if columns else None
+    with _lock:
+        _version += 1
+        for name, read_columns in _dependencies.get(table, {}).items():
+            if changed is None or read_columns is None or changed & read_columns:
+                for entry in _readers[name].entries.values():
+                    entry.valid = False
+                # Later callers must not join a fetch that started before the change
+                _readers[name].flights.clear()
+                _readers[name].generation += 1
+        listeners = list(_listeners)
+
+    for listener in listeners:
+        listener(table, columns)
+
+
+def freshness(cached_func, *args, **kwargs):
+    # {"age": seconds since the result a call would serve was fetched, "stale": past its
+    # TTL or invalidated}; None before the first successful fetch
+    reader = cached_func.reader
+    with _lock:
+        entry = reader.entries.get(_key(args, kwargs))
+        if entry is None:
+            return None
+        now = time.monotonic()
+        return {"age": now - entry.stored_at, "stale": not _fresh(reader, entry, now)}
+
+
+def version():
+    # Changes whenever any cached data may have; lets callers keep derived results until then
+    return _version
+
+
+def subscribe(listener):
+    # Other in-memory state (e.g. replicas) can follow the same invalidations
+    with _lock:
+        if listener not in _listeners:
+            _listeners.append(listener)
+
+
+def set_live(tables, live):
+    # Called by change_feed as its source connects and drops
+    with _lock:
+        if live:
+            _live.update(tables)
+        else:
+            _live.difference_update(tables)
+
+
+def is_live(table):
+    return table in _live
+
+
+def clear():
+    with _lock:
+        for reader in _readers.values():
+            reader.entries.clear()
+            reader.flights.clear()
+            reader.generation += 1
+
+
+def stats():
+    with _lock:
+        return {
+            name: {"entries": len(r.entries), "hits": r.hits, "misses": r.misses,
+                   "coalesced": r.coalesced, "stale": r.stale, "ttl": r.ttl}
+            for name, r in _readers.items()
+        }
+
+
+def saved_calls():
+    # Totals over every reader: backend fetches made and the calls served without one
+    with _lock:
+        hits = sum(r.hits for r in _readers.values())
+        coalesced = sum(r.coalesced for r in _readers.values())
+        stale = sum(r.stale for r in _readers.values())
+        fetches = sum(r.misses for r in _readers.values())
+    return {"fetches": fetches, "hits": hits, "coalesced": coalesced, "stale": stale, "saved": hits + coalesced}
@@ -0,0 +1,250 @@
+"""
+Process-wide in-memory replicas of the small, frequently read tables.
+A replica loads its table once and afterwards only pulls rows whose
+updated_at moved past the last sync, so most reads never hit the network.
+Those deltas cannot see deletes: unless the change feed is live and
+delivers them as events, a deleted row stays in the replica until the
+next full reload, every FULL_RELOAD_INTERVAL (600 s).
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+import circuit_breaker
+import query_cache
+from paging import iter_rows
+
+# Seconds a replica is trusted without asking the backend for changes
+MIN_SYNC_INTERVAL = 5
+# updated_at deltas cannot see deletes; reload the whole table this often
+FULL_RELOAD_INTERVAL = 600
+# Re-read rows this close to the watermark to catch late-committing transactions
+WATERMARK_OVERLAP = timedelta(seconds=60)
+
+TABLES = {
+    "products_": {
+        "key": "product_id",
+        "columns": "product_id, product_name, category, price, stock_quantity, reorder_level, supplier_id, updated_at",
+        "updated_column": "updated_at",
+    },
+    "reorders": {
+        "key": "reorder_id",
+        "columns": "reorder_id, product_id, reorder_quantity, reorder_date, status, updated_at",
+        "updated_column": "updated_at",
+    },
+    # No updated_at on suppliers; it is small enough to reload when stale
+    "suppliers": {
+        "key": "supplier_id",
+        "columns": "supplier_id, supplier_name, contact_name, email, phone",
+        "updated_column": None,
+    },
+}
+
+
+class TableReplica:
+    def __init__(self, table, key, columns, updated_column="updated_at",
+                 min_sync_interval=MIN_SYNC_INTERVAL, full_reload_interval=FULL_RELOAD_INTERVAL):
+        self.table = table
+        self.key = key
+        self.columns = columns
+        self.updated_column = updated_column
+        self.min_sync_interval = min_sync_interval
+        self.full_reload_interval = full_reload_interval
+
+        self._rows = {}
+        self._watermark = None
+        self._loaded_at = None
+        self._synced_at = None
+        self._stale_marks = 0     # mark_stale() calls, so a read that raced one is not trusted
+        self._syncing = None      # threading.Event of the read in progress
+        self._changes = None      # key -> row, or None if deleted, by events during that read
+        self._listeners = []
+        self._column_names = [c.strip() for c in columns.split(",")]
+        self._lock = threading.RLock()
+
+    def mark_stale(self):
+        # The next read asks for changes even inside min_sync_interval
+        with self._lock:
+            self._synced_at = None
+            self._stale_marks += 1
+
+    def sync(self, supabase):
+        # The network read runs outside the lock: other readers keep the loaded rows and
+        # change-feed events keep applying meanwhile (recorded in _changes, replayed after)
+        with self._lock:
+            now = time.monotonic()
+            if self._synced_at is not None and now - self._synced_at < self.min_sync_interval:
+                return
+            # A live change feed patches the rows as they change; only the periodic
+            # full reload, or a write by this process (mark_stale), still reads
+            if (self._synced_at is not None and query_cache.is_live(self.table)
+                    and now - self._loaded_at < self.full_reload_interval):
+                return
+            # Backend failing: keep serving the loaded rows until the breaker's backoff has passed
+            breaker = circuit_breaker.get_breaker(supabase)
+            if self._loaded_at is not None and breaker is not None and breaker.is_open():
+                return
+            syncing = self._syncing
+            if syncing is not None and self._loaded_at is not None:
+                # Another thread is reading; the loaded rows will do meanwhile
+                return
+            if syncing is None:
+                full = (self._loaded_at is None or self.updated_column is None
+                        or now - self._loaded_at >= self.full_reload_interval)
+                since = None if full else self._since()
+                marks = self._stale_marks
+                self._syncing = threading.Event()
+                self._changes = {}
+
+        if syncing is not None:
+            # The first load is in progress elsewhere: wait for it, then retry if it failed
+            syncing.wait()
+            return self.sync(supabase)
+
+        try:
+            rows = list(iter_rows(
+                supabase, self.table, self.columns, key=self.key,
+                where=(lambda q: q.gte(self.updated_column, since)) if since else None,
+            ))
+        except Exception:
+            self._end_sync()
+            raise
+
+        with self._lock:
+            if full:
+                self._rows = {row[self.key]: row for row in rows}
+                self._watermark = None
+                self._loaded_at = now
+            else:
+                self._rows.update((row[self.key], row) for row in rows)
+            # Events delivered during the read are at least as new as what it returned
+            for key, row in self._changes.items():
+                if row is None:
+                    self._rows.pop(key, None)
+                else:
+                    self._rows[key] = row
+            latest = self._max_updated(rows)
+            if latest and (self._watermark is None or latest > self._watermark):
+                self._watermark = latest
+            if full or self._changes:
+                self._notify(list(self._rows.values()), True)
+            elif rows:
+                self._notify(rows, False)
+            if self._stale_marks == marks:
+                self._synced_at = now
+            self._end_sync()
+
+    def _end_sync(self):
+        with self._lock:
+            syncing, self._syncing, self._changes = self._syncing, None, None
+        syncing.set()
+
+    def _since(self):
+        if self._watermark is None:
+            return None
+        return (datetime.fromisoformat(self._watermark) - WATERMARK_OVERLAP).isoformat()
+
+    def subscribe(self, listener):
+        # listener(rows, full) after every sync that returned rows: full=True with the whole
+        # table after a (re)load, else only the changed rows. Called once right away with the
+        # current contents if already loaded, under the same lock, so no change is missed.
+        with self._lock:
+            self._listeners.append(listener)
+            if self._loaded_at is not None:
+                listener(list(self._rows.values()), True)
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _notify(self, rows, full):
+        for listener in self._listeners:
+            listener(rows, full)
+
+    def rows(self, supabase):
+        self.sync(supabase)
+        with self._lock:
+            return list(self._rows.values())
+
+    def get(self, supabase, key):
+        self.sync(supabase)
+        with self._lock:
+            return self._rows.get(key)
+
+    def apply_change(self, type, record, old_record):
+        # One change-feed event; before the first load only kept for the load in progress
+        with self._lock:
+            if type == "DELETE":
+                key, row = old_record.get(self.key), None
+            else:
+                row = {name: record.get(name) for name in self._column_names}
+                key = row[self.key]
+            if self._changes is not None:
+                self._changes[key] = row
+            if self._loaded_at is None:
+                return
+            if row is None:
+                if self._rows.pop(key, None) is not None:
+                    self._notify(list(self._rows.values()), True)
+                return
+            self._rows[key] = row
+            latest = self._max_updated([row])
+            if latest and (self._watermark is None or latest > self._watermark):
+                self._watermark = latest
+            self._notify([row], False)
+
+    def _max_updated(self, rows):
+        if self.updated_column is None:
+            return None
+        stamps = [row[self.updated_column] for row in rows if row.get(self.updated_column)]
+        return max(stamps) if stamps else None
+
+
+_lock = threading.Lock()
+_replicas = {}   # (id(client), table) -> TableReplica
+
+
+def get_replica(supabase, table):
+    key = (id(supabase), table)
+    with _lock:
+        replica = _replicas.get(key)
+        if replica is None:
+            replica = _replicas[key] = TableReplica(table, **TABLES[table])
+        return replica
+
+
+def _on_invalidate(table, columns):
+    # Writes through db_functions make the next read pull the delta immediately
+    if getattr(_applying, "table", None) == table:
+        return
+    with _lock:
+        replicas = [r for (_, name), r in _replicas.items() if name == table]
+    for replica in replicas:
+        replica.mark_stale()
+
+
+_applying = threading.local()
+
+
+def apply_change(table, type, record, old_record, columns=None):
+    # Patch every replica of `table` with a change-feed event, then drop the cached results
+    # that read it; the replicas themselves are current, so they are not marked stale
+    with _lock:
+        replicas = [r for (_, name), r in _replicas.items() if name == table]
+    for replica in replicas:
+        replica.apply_change(type, record, old_record)
+    _applying.table = table
+    try:
+        query_cache.invalidate(table, columns)
+    finally:
+        _applying.table = None
+
+
+def clear():
+    with _lock:
+        _replicas.clear()
+
+
+query_cache.subscribe(_on_invalidate)
@@ -0,0 +1,280 @@
+"""
+Date-partitioned Parquet snapshots of the stock_entries ledger, which the
+window metrics read instead of paging the whole ledger from the backend.
+The export job appends new rows as zstd Parquet parts under
+<dir>/<table>/month=YYYY-MM/. _state.json lists the parts of the export,
+so parts a failed run wrote before updating it are never read; the next
+run deletes them. Sequence values are taken at insert and rows can commit
+after rows with higher keys, so every export (and the dashboard's read of
+the rows added since) re-reads OVERLAP_KEYS keys below the highest one
+exported and keeps those the snapshot lacks. The state also records which
+backend the rows came from, so readers never combine them with another
+backend's. Readers prune partitions by date and memory-map the files.
+
+    python snapshots.py export --dir snapshots
+"""
+
+import argparse
+import json
+import os
+import shutil
+from datetime import date, datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from paging import iter_pages
+
+DEFAULT_DIR = os.environ.get("INVENTORY_SNAPSHOT_DIR", "snapshots")
+# Rows buffered before parts are written; one part per month touched
+BATCH_ROWS = 200_000
+COMPRESSION = "zstd"
+STATE_FILE = "_state.json"
+
+# Keys below the highest exported one that are read again, for rows that
+# committed late; a row committing later than this many newer rows is missed
+OVERLAP_KEYS = 1000
+
+TABLES = {
+    "stock_entries": {
+        "key": "entry_id",
+        "date_column": "entry_date",
+        "schema": pa.schema([
+            ("entry_id", pa.int64()),
+            ("product_id", pa.int64()),
+            ("change_quantity", pa.int64()),
+            ("change_type", pa.string()),
+            ("entry_date", pa.date32()),
+        ]),
+    },
+}
+
+
+def _table_dir(table, base_dir):
+    return os.path.join(base_dir or DEFAULT_DIR, table)
+
+
+def _read_state(directory):
+    path = os.path.join(directory, STATE_FILE)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def backend_id(supabase):
+    # Where rows come from: the SQLite file or the Supabase project URL; None if unknown
+    path = getattr(supabase, "path", None)
+    if isinstance(path, str):
+        return f"sqlite:{os.path.abspath(path)}"
+    url = getattr(supabase, "supabase_url", None)
+    return f"supabase:{url}" if url else None
+
+
+def snapshot_state(table, base_dir=None, supabase=None):
+    # {"last_key", "missing", "parts", "rows", "exported_at", "source"} of the latest export,
+    # or None if there is none; with `supabase`, also None unless the export came from that backend
+    state = _read_state(_table_dir(table, base_dir))
+    if state is not None and "parts" not in state:
+        # Written before parts were listed; the next export starts over
+        return None
+    if state is not None and supabase is not None:
+        source = backend_id(supabase)
+        if source is None or state.get("source") != source:
+            return None
+    return state
+
+
+def _write_state(directory, state):
+    tmp = os.path.join(directory, STATE_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, os.path.join(directory, STATE_FILE))
+
+
+def _to_arrow(rows, spec):
+    schema = spec["schema"]
+    arrays = []
+    for field in schema:
+        values = [row.get(field.name) for row in rows]
+        if pa.types.is_date32(field.type):
+            # PostgREST returns ISO strings; keep the date part
+            arrays.append(pa.array([v[:10] if isinstance(v, str) else v for v in values]).cast(pa.date32()))
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def overlap_start(state):
+    # Read rows with keys above this to catch up with an export
+    return max(state["last_key"] - OVERLAP_KEYS, 0)
+
+
+def is_exported(state):
+    # Predicate on keys: is the row with this key already in the snapshot?
+    last_key, missing = state["last_key"], set(state["missing"])
+    return lambda key: key <= last_key and key not in missing
+
+
+def _advance(state, keys):
+    # Record keys (ascending) as exported: raise last_key and remember the keys
+    # skipped below it that are still within the overlap
+    last_key = state["last_key"]
+    new_last_key = max(last_key, keys[-1])
+    floor = new_last_key - OVERLAP_KEYS
+    seen = set(keys)
+    missing = [k for k in state["missing"] if k not in seen and k > floor]
+    missing += [k for k in range(max(last_key, floor) + 1, new_last_key + 1) if k not in seen]
+    state["last_key"], state["missing"] = new_last_key, missing
+
+
+def _parts(directory):
+    # (month, relative path) of every part on disk, in partition and key order
+    for entry in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+        if not entry.startswith("month="):
+            continue
+        for name in sorted(os.listdir(os.path.join(directory, entry))):
+            if name.startswith("part-") and name.endswith(".parquet"):
+                yield entry[len("month="):], f"{entry}/{name}"
+
+
+def _drop_unlisted_parts(directory, parts):
+    # Parts a failed run wrote before it could list them in the state
+    listed = set(parts)
+    for _, part in list(_parts(directory)):
+        if part not in listed:
+            os.remove(os.path.join(directory, part))
+
+
+def _write_parts(rows, spec, directory):
+    # One part per month present in `rows`; written under a temp name, then renamed.
+    # Returns the parts' paths relative to `directory`
+    table = _to_arrow(rows, spec)
+    months = {}
+    for i, day in enumerate(table.column(spec["date_column"]).to_pylist()):
+        months.setdefault(day.strftime("%Y-%m") if day else "unknown", []).append(i)
+
+    key = spec["key"]
+    written = []
+    for month, positions in months.items():
+        part = table.take(positions)
+        keys = part.column(key).to_pylist()
+        partition = os.path.join(directory, f"month={month}")
+        os.makedirs(partition, exist_ok=True)
+        name = f"part-{min(keys):012d}-{max(keys):012d}.parquet"
+        tmp = os.path.join(partition, f".{name}.tmp")
+        pq.write_table(part, tmp, compression=COMPRESSION)
+        os.replace(tmp, os.path.join(partition, name))
+        written.append(f"month={month}/{name}")
+    return written
+
+
+def _export_table(supabase, table, spec, directory, batch_rows):
+    source = backend_id(supabase)
+    state = _read_state(directory)
+    if state is not None and (state.get("source") != source or "parts" not in state):
+        # Exported from another backend, or before parts were listed: start over
+        shutil.rmtree(directory)
+        state = None
+    os.makedirs(directory, exist_ok=True)
+    state = state or {"last_key": 0, "missing": [], "parts": [], "rows": 0, "source": source}
+    _drop_unlisted_parts(directory, state["parts"])
+    key, start, exported = spec["key"], overlap_start(state), is_exported(state)
+    columns = ", ".join(spec["schema"].names)
+
+    written, buffer = 0, []
+
+    def flush():
+        nonlocal written
+        parts = _write_parts(buffer, spec, directory)
+        # Advance the state only after the parts are on disk, so a failed run just repeats
+        _advance(state, [row[key] for row in buffer])
+        state["parts"] += parts
+        state["rows"] += len(buffer)
+        state["exported_at"] = datetime.now().isoformat()
+        _write_state(directory, state)
+        written += len(buffer)
+        buffer.clear()
+
+    for page in iter_pages(supabase, table, columns, key=key, where=lambda q: q.gt(key, start)):
+        buffer.extend(row for row in page if not exported(row[key]))
+        if len(buffer) >= batch_rows:
+            flush()
+    if buffer:
+        flush()
+    return written
+
+
+def export_snapshots(supabase, tables=None, base_dir=None, batch_rows=BATCH_ROWS):
+    # Returns {table: rows written by this run}
+    return {
+        table: _export_table(supabase, table, TABLES[table], _table_dir(table, base_dir), batch_rows)
+        for table in tables or TABLES
+    }
+
+
+def _month(value):
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return value.strftime("%Y-%m")
+
+
+def read_snapshot(table, columns=None, since=None, until=None, filters=None, base_dir=None, state=None):
+    # Rows with since <= date <= until as a pyarrow Table; partitions outside the range are
+    # never opened, and files are memory-mapped rather than read into buffers. Only the
+    # parts listed in `state` (default: the table's current state) are read
+    spec = TABLES[table]
+    date_column = spec["date_column"]
+    directory = _table_dir(table, base_dir)
+    state = state if state is not None else _read_state(directory)
+
+    predicates = list(filters or [])
+    if since is not None:
+        predicates.append((date_column, ">=", date.fromisoformat(str(since)[:10])))
+    if until is not None:
+        predicates.append((date_column, "<=", date.fromisoformat(str(until)[:10])))
+
+    low = _month(since) if since is not None else None
+    high = _month(until) if until is not None else None
+    parts = []
+    for part in state.get("parts", []) if state is not None else []:
+        month = part.split("/", 1)[0][len("month="):]
+        if month != "unknown" and ((low and month < low) or (high and month > high)):
+            continue
+        parts.append(pq.read_table(
+            os.path.join(directory, part), columns=columns, filters=predicates or None, memory_map=True,
+        ))
+
+    if not parts:
+        schema = spec["schema"]
+        return schema.empty_table() if columns is None else pa.schema([schema.field(c) for c in columns]).empty_table()
+    return pa.concat_tables(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export Parquet snapshots of the stock_entries ledger")
+    parser.add_argument("command", choices=["export", "status"])
+    parser.add_argument("--dir", default=DEFAULT_DIR)
+    parser.add_argument("--tables", nargs="*", choices=list(TABLES), help="default: all")
+    parser.add_argument("--sqlite", help="export from this SQLite database instead of Supabase")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        for table in args.tables or TABLES:
+            print(table, snapshot_state(table, args.dir))
+        return
+
+    if args.sqlite:
+        from sqlite_backend import SQLiteClient
+        supabase = SQLiteClient(args.sqlite)
+    else:
+        from supabase import create_client
+        supabase = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
+
+    for table, rows in export_snapshots(supabase, args.tables, args.dir).items():
+        print(f"{table}: {rows} rows exported")
+
+
+if __name__ == "__main__":
+    main()
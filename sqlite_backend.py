@@ -0,0 +1,464 @@
+"""
+Embedded SQLite backend.
+SQLiteClient answers the same query-builder and rpc() calls as the
+Supabase client, translating them to SQL on a local database, and runs
+the supabase_functions.sql RPCs as plain SQL. db_functions works against
+it unchanged; select it with DATABASE_BACKEND = "sqlite" in the secrets.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from postgrest import APIResponse
+from postgrest.exceptions import APIError
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sqlite_schema.sql")
+
+PRIMARY_KEYS = {
+    "suppliers": "supplier_id",
+    "products_": "product_id",
+    "shipments": "shipment_id",
+    "stock_entries": "entry_id",
+    "reorders": "reorder_id",
+}
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_OPERATORS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+def _quote(name):
+    # Identifiers come from code, never from users, but are still checked before quoting
+    name = name.strip()
+    if not _IDENTIFIER.match(name):
+        raise APIError({"code": "PGRST100", "message": f"Invalid identifier: {name!r}"})
+    return f'"{name}"'
+
+
+def _split_columns(columns):
+    parts, depth, current = [], 0, ""
+    for ch in columns:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += ch
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def _api_error(error):
+    if isinstance(error, sqlite3.IntegrityError):
+        code = "23505" if "UNIQUE" in str(error) else "23514"
+    elif "no such table" in str(error):
+        code = "PGRST205"
+    else:
+        code = "XX000"
+    return APIError({"code": code, "message": str(error)})
+
+
+class SQLiteQuery:
+    def __init__(self, client, table):
+        self._client = client
+        self._table = table
+        self._where = []
+        self._params = []
+        self._order = []
+        self._offset = None
+        self._limit = None
+        self._columns = "*"
+        self._count = None
+        self._head = False
+        self._operation = "select"
+        self._payload = None
+
+    def select(self, columns="*", count=None, head=None):
+        self._columns = columns
+        self._count = count
+        self._head = bool(head)
+        return self
+
+    def insert(self, payload):
+        self._operation = "insert"
+        self._payload = payload
+        return self
+
+    def update(self, payload):
+        self._operation = "update"
+        self._payload = payload
+        return self
+
+    def _compare(self, op, column, value):
+        self._where.append(f"{_quote(column)} {_OPERATORS[op]} ?")
+        self._params.append(value)
+        return self
+
+    def eq(self, column, value):
+        return self._compare("eq", column, value)
+
+    def neq(self, column, value):
+        return self._compare("neq", column, value)
+
+    def gt(self, column, value):
+        return self._compare("gt", column, value)
+
+    def gte(self, column, value):
+        return self._compare("gte", column, value)
+
+    def lt(self, column, value):
+        return self._compare("lt", column, value)
+
+    def lte(self, column, value):
+        return self._compare("lte", column, value)
+
+    def in_(self, column, values):
+        values = list(values)
+        if not values:
+            self._where.append("0")
+        else:
+            self._where.append(f"{_quote(column)} IN ({', '.join('?' * len(values))})")
+            self._params.extend(values)
+        return self
+
+    def order(self, column, desc=False):
+        # Postgres puts NULLs last ascending and first descending
+        self._order.append(f"{_quote(column)} {'DESC NULLS FIRST' if desc else 'ASC NULLS LAST'}")
+        return self
+
+    def limit(self, size):
+        self._limit = int(size)
+        return self
+
+    def range(self, start, end):
+        self._offset = int(start)
+        self._limit = int(end) - int(start) + 1
+        return self
+
+    def execute(self):
+        return self._client._execute(self)
+
+    def _where_sql(self):
+        return f" WHERE {' AND '.join(self._where)}" if self._where else ""
+
+    def _select_list(self):
+        # Embedded relations, e.g. suppliers(supplier_name), become correlated JSON subqueries
+        if self._columns.strip() == "*":
+            return "t.*", []
+        parts, embedded = [], []
+        for column in _split_columns(self._columns):
+            if "(" not in column:
+                parts.append(f"t.{_quote(column)}")
+                continue
+            relation, inner = column[:-1].split("(", 1)
+            relation = relation.strip()
+            key = _quote(PRIMARY_KEYS[relation])
+            fields = ", ".join(f"'{c.strip()}', r.{_quote(c)}" for c in inner.split(","))
+            parts.append(
+                f"(SELECT json_object({fields}) FROM {_quote(relation)} AS r WHERE r.{key} = t.{key}) "
+                f"AS {_quote(relation)}"
+            )
+            embedded.append(relation)
+        return ", ".join(parts), embedded
+
+    def _run_select(self, conn):
+        table = _quote(self._table)
+        count = None
+        if self._count:
+            count = conn.execute(f"SELECT COUNT(*) FROM {table} AS t{self._where_sql()}", self._params).fetchone()[0]
+        if self._head:
+            return APIResponse.model_construct(data=[], count=count)
+
+        columns, embedded = self._select_list()
+        sql = f"SELECT {columns} FROM {table} AS t{self._where_sql()}"
+        if self._order:
+            sql += f" ORDER BY {', '.join(self._order)}"
+        if self._limit is not None or self._offset is not None:
+            sql += f" LIMIT {self._limit if self._limit is not None else -1} OFFSET {self._offset or 0}"
+
+        rows = [dict(row) for row in conn.execute(sql, self._params)]
+        for row in rows:
+            for relation in embedded:
+                if row[relation] is not None:
+                    row[relation] = json.loads(row[relation])
+        return APIResponse.model_construct(data=rows, count=count)
+
+    def _run_insert(self, conn):
+        table = _quote(self._table)
+        inserted = []
+        for row in self._payload if isinstance(self._payload, list) else [self._payload]:
+            columns = ", ".join(_quote(c) for c in row)
+            marks = ", ".join("?" * len(row))
+            cursor = conn.execute(f"INSERT INTO {table} ({columns}) VALUES ({marks}) RETURNING *", list(row.values()))
+            inserted.append(dict(cursor.fetchone()))
+        return APIResponse.model_construct(data=inserted, count=None)
+
+    def _run_update(self, conn):
+        assignments = ", ".join(f"{_quote(c)} = ?" for c in self._payload)
+        sql = f"UPDATE {_quote(self._table)} AS t SET {assignments}{self._where_sql()} RETURNING *"
+        rows = [dict(row) for row in conn.execute(sql, list(self._payload.values()) + self._params)]
+        return APIResponse.model_construct(data=rows, count=None)
+
+
+class SQLiteRPC:
+    def __init__(self, client, name, params):
+        self._client = client
+        self._name = name
+        self._params = params or {}
+
+    def execute(self):
+        return self._client._call(self._name, self._params)
+
+
+class SQLiteClient:
+    """
+    path: database file, created with sqlite_schema.sql if new; ":memory:" for a
+    throwaway database (benchmarks, tests).
+    """
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        # One connection shared by the dashboard's worker threads, serialized by a lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self.requests = 0
+        with open(SCHEMA_FILE) as f:
+            self._conn.executescript(f.read())
+        self.rpcs = {
+            "get_all_basic_info": _get_all_basic_info,
+            "add_new_product_manual_id": _add_new_product_manual_id,
+            "mark_reorder_as_received": _mark_reorder_as_received,
+            "receive_reorders": _receive_reorders,
+            "import_products": _import_products,
+            "get_product_history_page": _get_product_history_page,
+            "get_product_history_summary": _get_product_history_summary,
+        }
+
+    def table(self, name):
+        return SQLiteQuery(self, name)
+
+    def rpc(self, name, params=None):
+        return SQLiteRPC(self, name, params)
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = 0
+
+    def load_tables(self, tables):
+        # Bulk load {table: [row, ...]}, e.g. from fake_supabase.generate_dataset()
+        with self._lock, self._conn:
+            for table in ("suppliers", "products_", "shipments", "stock_entries", "reorders"):
+                rows = tables.get(table) or []
+                if not rows:
+                    continue
+                columns = list(rows[0])
+                self._conn.executemany(
+                    f"INSERT INTO {_quote(table)} ({', '.join(_quote(c) for c in columns)}) "
+                    f"VALUES ({', '.join('?' * len(columns))})",
+                    [[row.get(c) for c in columns] for row in rows],
+                )
+
+    def _execute(self, query):
+        with self._lock:
+            self.requests += 1
+            try:
+                with self._conn:
+                    if query._operation == "insert":
+                        return query._run_insert(self._conn)
+                    if query._operation == "update":
+                        return query._run_update(self._conn)
+                    return query._run_select(self._conn)
+            except sqlite3.Error as e:
+                raise _api_error(e) from e
+
+    def _call(self, name, params):
+        func = self.rpcs.get(name)
+        if func is None:
+            with self._lock:
+                self.requests += 1
+            raise APIError({
+                "code": "PGRST202",
+                "message": f"Could not find the function public.{name} in the schema cache",
+            })
+        with self._lock:
+            self.requests += 1
+            try:
+                # Each RPC is one transaction, as a plpgsql function call is
+                with self._conn:
+                    return APIResponse.model_construct(data=func(self._conn, params), count=None)
+            except sqlite3.Error as e:
+                raise _api_error(e) from e
+
+
+# supabase_functions.sql, translated. SQLite reads the ledger directly; the
+# daily rollup only pays off across a network round trip.
+
+def _get_all_basic_info(conn, params):
+    rows = conn.execute("""
+        WITH since AS (SELECT date(MAX(entry_date), '-90 days') AS day FROM stock_entries),
+        window_values AS (
+            SELECT se.change_type, ROUND(SUM(ABS(se.change_quantity) * p.price), 2) AS value
+            FROM stock_entries AS se
+            JOIN products_ AS p ON p.product_id = se.product_id
+            WHERE se.change_type IN ('Sale', 'Restock')
+            AND se.entry_date >= (SELECT day FROM since)
+            GROUP BY se.change_type
+        )
+        SELECT 'Total Suppliers' AS metric_name, COUNT(*) AS metric_value FROM suppliers
+        UNION ALL
+        SELECT 'Total Products', COUNT(*) FROM products_
+        UNION ALL
+        SELECT 'Total Categories Dealing', COUNT(DISTINCT category) FROM products_
+        UNION ALL
+        SELECT 'Total Sale Value (Last 3 Months)',
+               COALESCE((SELECT value FROM window_values WHERE change_type = 'Sale'), 0)
+        UNION ALL
+        SELECT 'Total Restock Value (Last 3 Months)',
+               COALESCE((SELECT value FROM window_values WHERE change_type = 'Restock'), 0)
+        UNION ALL
+        SELECT 'Below Reorder & No Pending Reorders', COUNT(*)
+        FROM products_ AS p
+        WHERE p.stock_quantity <= p.reorder_level
+        AND p.product_id NOT IN (
+            SELECT DISTINCT product_id FROM reorders WHERE status IN ('Pending', 'Ordered')
+        )
+    """)
+    return [dict(row) for row in rows]
+
+
+def _add_new_product_manual_id(conn, params):
+    product_id = conn.execute(
+        "INSERT INTO products_(product_name, category, price, stock_quantity, reorder_level, supplier_id) "
+        "VALUES (?, ?, ?, ?, ?, ?) RETURNING product_id",
+        (params["p_name"], params["p_category"], params["p_price"], params["p_stock"],
+         params["p_reorder"], params["p_supplier"]),
+    ).fetchone()[0]
+    conn.execute(
+        "INSERT INTO shipments(product_id, supplier_id, quantity_received, shipment_date) "
+        "VALUES (?, ?, ?, date('now'))",
+        (product_id, params["p_supplier"], params["p_stock"]),
+    )
+    conn.execute(
+        "INSERT INTO stock_entries(product_id, change_quantity, change_type, entry_date) "
+        "VALUES (?, ?, 'Restock', date('now'))",
+        (product_id, params["p_stock"]),
+    )
+    return product_id
+
+
+def _receive(conn, reorder_ids):
+    # Shared by both receive RPCs; returns the reorder_ids that were received
+    marks = ", ".join("?" * len(reorder_ids))
+    received = conn.execute(f"""
+        SELECT r.reorder_id, r.product_id, r.reorder_quantity, p.supplier_id
+        FROM reorders AS r
+        JOIN products_ AS p ON p.product_id = r.product_id
+        WHERE r.reorder_id IN ({marks}) AND r.status IN ('Pending', 'Ordered')
+        ORDER BY r.reorder_id
+    """, reorder_ids).fetchall()
+    if not received:
+        return set()
+
+    conn.executemany("UPDATE reorders SET status = 'Received' WHERE reorder_id = ?",
+                     [(r["reorder_id"],) for r in received])
+    totals = {}
+    for r in received:
+        totals[r["product_id"]] = totals.get(r["product_id"], 0) + r["reorder_quantity"]
+    conn.executemany("UPDATE products_ SET stock_quantity = stock_quantity + ? WHERE product_id = ?",
+                     [(qty, product_id) for product_id, qty in totals.items()])
+    conn.executemany(
+        "INSERT INTO shipments(product_id, supplier_id, quantity_received, shipment_date) "
+        "VALUES (?, ?, ?, date('now'))",
+        [(r["product_id"], r["supplier_id"], r["reorder_quantity"]) for r in received],
+    )
+    conn.executemany(
+        "INSERT INTO stock_entries(product_id, change_quantity, change_type, entry_date) "
+        "VALUES (?, ?, 'Restock', date('now'))",
+        [(r["product_id"], r["reorder_quantity"]) for r in received],
+    )
+    return {r["reorder_id"] for r in received}
+
+
+def _mark_reorder_as_received(conn, params):
+    reorder_id = params["in_reorder_id"]
+    if not _receive(conn, [reorder_id]):
+        raise APIError({"code": "P0001", "message": f"Reorder {reorder_id} not found or already received"})
+    return None
+
+
+def _receive_reorders(conn, params):
+    reorder_ids = list(params["in_reorder_ids"])
+    received = _receive(conn, reorder_ids) if reorder_ids else set()
+    return [
+        {"reorder_id": r, "outcome": "Received" if r in received else "Not found or already received"}
+        for r in reorder_ids
+    ]
+
+
+def _import_products(conn, params):
+    imported = [
+        conn.execute(
+            "INSERT INTO products_(product_name, category, price, stock_quantity, reorder_level, supplier_id) "
+            "VALUES (?, ?, ?, ?, ?, ?) RETURNING product_id, product_name, supplier_id, stock_quantity",
+            (p["product_name"], p["category"], p["price"], p["stock_quantity"],
+             p["reorder_level"], p["supplier_id"]),
+        ).fetchone()
+        for p in params["in_products"]
+    ]
+    conn.executemany(
+        "INSERT INTO shipments(product_id, supplier_id, quantity_received, shipment_date) "
+        "VALUES (?, ?, ?, date('now'))",
+        [(p["product_id"], p["supplier_id"], p["stock_quantity"]) for p in imported],
+    )
+    conn.executemany(
+        "INSERT INTO stock_entries(product_id, change_quantity, change_type, entry_date) "
+        "VALUES (?, ?, 'Restock', date('now'))",
+        [(p["product_id"], p["stock_quantity"]) for p in imported],
+    )
+    return [{"product_id": p["product_id"], "product_name": p["product_name"]} for p in imported]
+
+
+def _history_filters(params):
+    where = ["product_id = :p_product_id",
+             "(:p_date_from IS NULL OR record_date >= :p_date_from)",
+             "(:p_date_to IS NULL OR record_date <= :p_date_to)"]
+    values = {
+        "p_product_id": params["p_product_id"],
+        "p_date_from": params.get("p_date_from"),
+        "p_date_to": params.get("p_date_to"),
+    }
+    return where, values
+
+
+def _get_product_history_page(conn, params):
+    where, values = _history_filters(params)
+    if params.get("p_before_date") is not None:
+        where.append("(record_date, record_type, record_id) < (:p_before_date, :p_before_type, :p_before_id)")
+        values.update({key: params[key] for key in ("p_before_date", "p_before_type", "p_before_id")})
+    values["p_limit"] = params.get("p_limit", 50)
+    rows = conn.execute(f"""
+        SELECT * FROM product_inventory_history_keyed
+        WHERE {' AND '.join(where)}
+        ORDER BY record_date DESC, record_type DESC, record_id DESC
+        LIMIT :p_limit
+    """, values)
+    return [dict(row) for row in rows]
+
+
+def _get_product_history_summary(conn, params):
+    where, values = _history_filters(params)
+    rows = conn.execute(f"""
+        SELECT record_type, change_type, COUNT(*) AS record_count, SUM(quantity) AS total_quantity
+        FROM product_inventory_history_keyed
+        WHERE {' AND '.join(where)}
+        GROUP BY record_type, change_type
+        ORDER BY record_type, change_type
+    """, values)
+    return [dict(row) for row in rows]
@@ -0,0 +1,177 @@
+-- SQLite schema for the embedded backend (sqlite_backend.py)
+-- Same tables, columns and views as supabase_migration/1_schema_creation.sql
+-- and supabase_functions.sql, so db_functions runs unchanged against it.
+-- Safe to run on every connect.
+
+PRAGMA foreign_keys = ON;
+
+CREATE TABLE IF NOT EXISTS suppliers (
+    supplier_id INTEGER PRIMARY KEY,
+    supplier_name TEXT NOT NULL,
+    contact_name TEXT,
+    email TEXT,
+    phone TEXT,
+    address TEXT,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS products_ (
+    product_id INTEGER PRIMARY KEY,
+    product_name TEXT NOT NULL,
+    category TEXT,
+    price REAL NOT NULL,
+    stock_quantity INTEGER NOT NULL DEFAULT 0,
+    reorder_level INTEGER NOT NULL DEFAULT 0,
+    supplier_id INTEGER REFERENCES suppliers(supplier_id),
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS shipments (
+    shipment_id INTEGER PRIMARY KEY,
+    product_id INTEGER REFERENCES products_(product_id),
+    supplier_id INTEGER REFERENCES suppliers(supplier_id),
+    quantity_received INTEGER NOT NULL,
+    shipment_date TEXT NOT NULL DEFAULT (date('now')),
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS stock_entries (
+    entry_id INTEGER PRIMARY KEY,
+    product_id INTEGER REFERENCES products_(product_id),
+    change_quantity INTEGER NOT NULL,
+    change_type TEXT NOT NULL CHECK (change_type IN ('Sale', 'Restock', 'Adjustment')),
+    entry_date TEXT NOT NULL DEFAULT (date('now')),
+    notes TEXT,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS reorders (
+    reorder_id INTEGER PRIMARY KEY,
+    product_id INTEGER REFERENCES products_(product_id),
+    reorder_quantity INTEGER NOT NULL,
+    reorder_date TEXT NOT NULL DEFAULT (date('now')),
+    status TEXT NOT NULL DEFAULT 'Pending' CHECK (status IN ('Pending', 'Ordered', 'Received', 'Cancelled')),
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+
+-- Daily (product_id, change_type, day) sums of the ledger, as in supabase_functions.sql;
+-- db_functions reads the metric windows from here instead of the raw ledger
+CREATE TABLE IF NOT EXISTS stock_entries_daily (
+    rollup_id INTEGER PRIMARY KEY,
+    product_id INTEGER NOT NULL,
+    change_type TEXT NOT NULL,
+    day TEXT NOT NULL,
+    entry_count INTEGER NOT NULL DEFAULT 0,
+    total_quantity INTEGER NOT NULL DEFAULT 0,
+    total_abs_quantity INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (product_id, change_type, day)
+);
+
+CREATE INDEX IF NOT EXISTS idx_products_supplier ON products_(supplier_id);
+CREATE INDEX IF NOT EXISTS idx_products_category ON products_(category);
+CREATE INDEX IF NOT EXISTS idx_products_updated ON products_(updated_at);
+-- Covers the value metrics: window scan without touching the table
+CREATE INDEX IF NOT EXISTS idx_stock_entries_window ON stock_entries(change_type, entry_date, product_id, change_quantity);
+CREATE INDEX IF NOT EXISTS idx_stock_entries_date ON stock_entries(entry_date);
+CREATE INDEX IF NOT EXISTS idx_stock_entries_product_date ON stock_entries(product_id, entry_date DESC, entry_id DESC);
+CREATE INDEX IF NOT EXISTS idx_shipments_product_date ON shipments(product_id, shipment_date DESC, shipment_id DESC);
+CREATE INDEX IF NOT EXISTS idx_reorders_product ON reorders(product_id);
+CREATE INDEX IF NOT EXISTS idx_reorders_status ON reorders(status);
+CREATE INDEX IF NOT EXISTS idx_reorders_updated ON reorders(updated_at);
+
+-- The replicas pull rows by updated_at; keep it current like the Postgres trigger
+CREATE TRIGGER IF NOT EXISTS products_touch AFTER UPDATE ON products_
+BEGIN
+    UPDATE products_ SET updated_at = strftime('%Y-%m-%dT%H:%M:%f', 'now')
+    WHERE product_id = NEW.product_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS reorders_touch AFTER UPDATE ON reorders
+BEGIN
+    UPDATE reorders SET updated_at = strftime('%Y-%m-%dT%H:%M:%f', 'now')
+    WHERE reorder_id = NEW.reorder_id;
+END;
+
+-- SQLite has no statement triggers; each ledger row is folded into the rollup as it is
+-- written, in the writing transaction, like the Postgres fold_stock_entries_daily()
+CREATE TRIGGER IF NOT EXISTS stock_entries_daily_insert AFTER INSERT ON stock_entries
+BEGIN
+    INSERT INTO stock_entries_daily (product_id, change_type, day, entry_count, total_quantity, total_abs_quantity)
+    VALUES (COALESCE(NEW.product_id, 0), NEW.change_type, date(NEW.entry_date), 1,
+            NEW.change_quantity, ABS(NEW.change_quantity))
+    ON CONFLICT (product_id, change_type, day) DO UPDATE
+    SET entry_count = entry_count + 1,
+        total_quantity = total_quantity + excluded.total_quantity,
+        total_abs_quantity = total_abs_quantity + excluded.total_abs_quantity;
+END;
+
+CREATE TRIGGER IF NOT EXISTS stock_entries_daily_update AFTER UPDATE ON stock_entries
+BEGIN
+    UPDATE stock_entries_daily
+    SET entry_count = entry_count - 1,
+        total_quantity = total_quantity - OLD.change_quantity,
+        total_abs_quantity = total_abs_quantity - ABS(OLD.change_quantity)
+    WHERE product_id = COALESCE(OLD.product_id, 0) AND change_type = OLD.change_type
+    AND day = date(OLD.entry_date);
+    INSERT INTO stock_entries_daily (product_id, change_type, day, entry_count, total_quantity, total_abs_quantity)
+    VALUES (COALESCE(NEW.product_id, 0), NEW.change_type, date(NEW.entry_date), 1,
+            NEW.change_quantity, ABS(NEW.change_quantity))
+    ON CONFLICT (product_id, change_type, day) DO UPDATE
+    SET entry_count = entry_count + 1,
+        total_quantity = total_quantity + excluded.total_quantity,
+        total_abs_quantity = total_abs_quantity + excluded.total_abs_quantity;
+    -- Days left without ledger rows
+    DELETE FROM stock_entries_daily WHERE entry_count = 0
+    AND product_id = COALESCE(OLD.product_id, 0) AND change_type = OLD.change_type
+    AND day = date(OLD.entry_date);
+END;
+
+CREATE TRIGGER IF NOT EXISTS stock_entries_daily_delete AFTER DELETE ON stock_entries
+BEGIN
+    UPDATE stock_entries_daily
+    SET entry_count = entry_count - 1,
+        total_quantity = total_quantity - OLD.change_quantity,
+        total_abs_quantity = total_abs_quantity - ABS(OLD.change_quantity)
+    WHERE product_id = COALESCE(OLD.product_id, 0) AND change_type = OLD.change_type
+    AND day = date(OLD.entry_date);
+    DELETE FROM stock_entries_daily WHERE entry_count = 0
+    AND product_id = COALESCE(OLD.product_id, 0) AND change_type = OLD.change_type
+    AND day = date(OLD.entry_date);
+END;
+
+-- Backfill databases whose ledger was written before the rollup existed
+INSERT INTO stock_entries_daily (product_id, change_type, day, entry_count, total_quantity, total_abs_quantity)
+SELECT COALESCE(product_id, 0), change_type, date(entry_date),
+       COUNT(*), SUM(change_quantity), SUM(ABS(change_quantity))
+FROM stock_entries
+WHERE NOT EXISTS (SELECT 1 FROM stock_entries_daily)
+GROUP BY COALESCE(product_id, 0), change_type, date(entry_date);
+
+CREATE VIEW IF NOT EXISTS product_inventory_history_keyed AS
+SELECT
+    s.product_id,
+    'Shipment' AS record_type,
+    s.shipment_id AS record_id,
+    s.shipment_date AS record_date,
+    s.quantity_received AS quantity,
+    NULL AS change_type,
+    pr.supplier_id
+FROM shipments AS s
+JOIN products_ AS pr ON pr.product_id = s.product_id
+UNION ALL
+SELECT
+    se.product_id,
+    'Stock Entry' AS record_type,
+    se.entry_id AS record_id,
+    se.entry_date AS record_date,
+    se.change_quantity AS quantity,
+    se.change_type,
+    pr.supplier_id
+FROM stock_entries AS se
+JOIN products_ AS pr ON pr.product_id = se.product_id;
+
+CREATE VIEW IF NOT EXISTS product_inventory_history AS
+SELECT product_id, record_type, record_date, quantity, change_type, supplier_id
+FROM product_inventory_history_keyed;
@@ -0,0 +1,63 @@
+"""
+Cold-start timing for the dashboard process.
+Times are milliseconds since this module was imported, which app.py does
+before anything else. mark() records a point once per process (later
+reruns do not move it); timed() records how long a step took. When the
+first script run completes, first_render() logs the report once to
+stdout. The query diagnostics panel shows the same report.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+BOOT = time.perf_counter()
+
+_lock = threading.Lock()
+_events = {}       # event -> {"event", "at_ms", "ms"}
+_reported = False
+
+
+def _elapsed_ms(since=BOOT):
+    return round((time.perf_counter() - since) * 1000, 1)
+
+
+def mark(event):
+    # First occurrence only
+    with _lock:
+        _events.setdefault(event, {"event": event, "at_ms": _elapsed_ms(), "ms": None})
+
+
+@contextmanager
+def timed(event):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _lock:
+            _events.setdefault(event, {"event": event, "at_ms": _elapsed_ms(), "ms": _elapsed_ms(started)})
+
+
+def report():
+    # Recorded events in the order they finished
+    with _lock:
+        return sorted((dict(e) for e in _events.values()), key=lambda e: e["at_ms"])
+
+
+def format_report(events=None):
+    lines = []
+    for e in events if events is not None else report():
+        took = f" ({e['ms']} ms)" if e["ms"] is not None else ""
+        lines.append(f"  {e['at_ms']:>9.1f} ms  {e['event']}{took}")
+    return "startup timing:\n" + "\n".join(lines)
+
+
+def first_render():
+    # Call at the end of the script: marks time-to-first-render and logs the report, once
+    global _reported
+    mark("first render")
+    with _lock:
+        if _reported:
+            return
+        _reported = True
+    print(format_report(), flush=True)
@@ -1,18 +1,132 @@
 -- PostgreSQL Functions for Supabase
 -- These functions calculate the metrics for the dashboard
 
+-- ========================================
+-- DAILY ROLLUP OF STOCK_ENTRIES
+-- ========================================
+-- One row per (product_id, change_type, day). The value metrics read this
+-- instead of rescanning the ledger; values are priced at read time with
+-- the current products_.price, the same as the raw-ledger queries.
+
+CREATE TABLE IF NOT EXISTS stock_entries_daily (
+    rollup_id BIGSERIAL PRIMARY KEY,
+    product_id INTEGER NOT NULL,
+    change_type VARCHAR(50) NOT NULL,
+    day DATE NOT NULL,
+    entry_count INTEGER NOT NULL DEFAULT 0,
+    total_quantity BIGINT NOT NULL DEFAULT 0,
+    total_abs_quantity BIGINT NOT NULL DEFAULT 0,
+    UNIQUE (product_id, change_type, day)
+);
+
+CREATE INDEX IF NOT EXISTS idx_stock_entries_daily_day ON stock_entries_daily(day, change_type);
+
+-- Kept current by triggers on stock_entries: every writing statement folds
+-- its own rows in, inside its own transaction, so the rollup does not depend
+-- on the order transactions commit in and reads never refresh it. Writers of
+-- the same product, change type and day queue on that rollup row until commit.
+CREATE OR REPLACE FUNCTION fold_stock_entries_daily()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO stock_entries_daily AS d
+            (product_id, change_type, day, entry_count, total_quantity, total_abs_quantity)
+        SELECT COALESCE(product_id, 0), change_type, entry_date,
+               -COUNT(*), -SUM(change_quantity), -SUM(ABS(change_quantity))
+        FROM old_entries
+        GROUP BY COALESCE(product_id, 0), change_type, entry_date
+        ON CONFLICT (product_id, change_type, day) DO UPDATE
+        SET entry_count = d.entry_count + EXCLUDED.entry_count,
+            total_quantity = d.total_quantity + EXCLUDED.total_quantity,
+            total_abs_quantity = d.total_abs_quantity + EXCLUDED.total_abs_quantity;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO stock_entries_daily AS d
+            (product_id, change_type, day, entry_count, total_quantity, total_abs_quantity)
+        SELECT COALESCE(product_id, 0), change_type, entry_date,
+               COUNT(*), SUM(change_quantity), SUM(ABS(change_quantity))
+        FROM new_entries
+        GROUP BY COALESCE(product_id, 0), change_type, entry_date
+        ON CONFLICT (product_id, change_type, day) DO UPDATE
+        SET entry_count = d.entry_count + EXCLUDED.entry_count,
+            total_quantity = d.total_quantity + EXCLUDED.total_quantity,
+            total_abs_quantity = d.total_abs_quantity + EXCLUDED.total_abs_quantity;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        -- Days left without ledger rows
+        DELETE FROM stock_entries_daily AS d
+        USING old_entries AS o
+        WHERE d.product_id = COALESCE(o.product_id, 0)
+        AND d.change_type = o.change_type
+        AND d.day = o.entry_date
+        AND d.entry_count = 0;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS stock_entries_daily_insert ON stock_entries;
+CREATE TRIGGER stock_entries_daily_insert
+AFTER INSERT ON stock_entries
+REFERENCING NEW TABLE AS new_entries
+FOR EACH STATEMENT EXECUTE FUNCTION fold_stock_entries_daily();
+
+DROP TRIGGER IF EXISTS stock_entries_daily_update ON stock_entries;
+CREATE TRIGGER stock_entries_daily_update
+AFTER UPDATE ON stock_entries
+REFERENCING OLD TABLE AS old_entries NEW TABLE AS new_entries
+FOR EACH STATEMENT EXECUTE FUNCTION fold_stock_entries_daily();
+
+DROP TRIGGER IF EXISTS stock_entries_daily_delete ON stock_entries;
+CREATE TRIGGER stock_entries_daily_delete
+AFTER DELETE ON stock_entries
+REFERENCING OLD TABLE AS old_entries
+FOR EACH STATEMENT EXECUTE FUNCTION fold_stock_entries_daily();
+
+-- Replaced by the triggers above
+DROP FUNCTION IF EXISTS refresh_stock_entries_daily();
+DROP TABLE IF EXISTS rollup_state;
+
+-- Rebuild from the whole ledger. Writers wait until it commits, so no row is
+-- folded twice or missed. Returns the number of ledger rows folded in.
+CREATE OR REPLACE FUNCTION rebuild_stock_entries_daily()
+RETURNS INTEGER AS $$
+DECLARE
+    folded INTEGER;
+BEGIN
+    LOCK TABLE stock_entries IN SHARE MODE;
+    TRUNCATE stock_entries_daily;
+
+    INSERT INTO stock_entries_daily
+        (product_id, change_type, day, entry_count, total_quantity, total_abs_quantity)
+    SELECT COALESCE(product_id, 0), change_type, entry_date,
+           COUNT(*), SUM(change_quantity), SUM(ABS(change_quantity))
+    FROM stock_entries
+    GROUP BY COALESCE(product_id, 0), change_type, entry_date;
+
+    SELECT COALESCE(SUM(entry_count), 0) INTO folded FROM stock_entries_daily;
+    RETURN folded;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill the rows written before the triggers existed
+SELECT rebuild_stock_entries_daily();
+
 -- Function 1: Get Total Sale Value (Last 3 Months)
 CREATE OR REPLACE FUNCTION get_total_sale_value_3months()
 RETURNS DECIMAL AS $$
 BEGIN
   RETURN (
-    SELECT ROUND(CAST(SUM(ABS(se.change_quantity) * p.price) AS NUMERIC), 2)
-    FROM stock_entries AS se
-    JOIN products_ AS p ON p.product_id = se.product_id
-    WHERE se.change_type = 'Sale'
-    AND se.entry_date >= (
-      SELECT MAX(entry_date) - INTERVAL '3 months'
-      FROM stock_entries
+    SELECT ROUND(CAST(SUM(d.total_abs_quantity * p.price) AS NUMERIC), 2)
+    FROM stock_entries_daily AS d
+    JOIN products_ AS p ON p.product_id = d.product_id
+    WHERE d.change_type = 'Sale'
+    AND d.day >= (
+      SELECT MAX(day) - INTERVAL '90 days'
+      FROM stock_entries_daily
     )
   );
 END;
@@ -23,13 +137,13 @@ CREATE OR REPLACE FUNCTION get_total_restock_value_3months()
 RETURNS DECIMAL AS $$
 BEGIN
   RETURN (
-    SELECT ROUND(CAST(SUM(ABS(se.change_quantity) * p.price) AS NUMERIC), 2)
-    FROM stock_entries AS se
-    JOIN products_ AS p ON p.product_id = se.product_id
-    WHERE se.change_type = 'Restock'
-    AND se.entry_date >= (
-      SELECT MAX(entry_date) - INTERVAL '3 months'
-      FROM stock_entries
+    SELECT ROUND(CAST(SUM(d.total_abs_quantity * p.price) AS NUMERIC), 2)
+    FROM stock_entries_daily AS d
+    JOIN products_ AS p ON p.product_id = d.product_id
+    WHERE d.change_type = 'Restock'
+    AND d.day >= (
+      SELECT MAX(day) - INTERVAL '90 days'
+      FROM stock_entries_daily
     )
   );
 END;
@@ -42,7 +156,7 @@ BEGIN
   RETURN (
     SELECT COUNT(*)
     FROM products_ AS p
-    WHERE p.stock_quantity < p.reorder_level
+    WHERE p.stock_quantity <= p.reorder_level
     AND p.product_id NOT IN (
       SELECT DISTINCT product_id
       FROM reorders
@@ -53,6 +167,9 @@ END;
 $$ LANGUAGE plpgsql;
 
 -- Function 4: Get All Basic Info (Combined)
+-- Called by db_functions.get_basic_info as a single RPC round trip.
+-- The 90 day window matches the client-side fallback in db_functions.py.
+-- The value functions read the daily rollup, not the ledger.
 CREATE OR REPLACE FUNCTION get_all_basic_info()
 RETURNS TABLE (
   metric_name VARCHAR,
@@ -80,8 +197,321 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- ========================================
+-- WRITE FUNCTIONS
+-- ========================================
+-- These replace the versions in supabase_migration/1_schema_creation.sql.
+-- IDs come from the SERIAL sequences instead of MAX(id) + 1, and stock is
+-- incremented in place, so concurrent operators cannot collide or lose updates.
+
+-- Rows inserted with explicit IDs do not advance the sequences; catch them up
+SELECT setval(pg_get_serial_sequence('products_', 'product_id'), COALESCE(MAX(product_id), 1)) FROM products_;
+SELECT setval(pg_get_serial_sequence('shipments', 'shipment_id'), COALESCE(MAX(shipment_id), 1)) FROM shipments;
+SELECT setval(pg_get_serial_sequence('stock_entries', 'entry_id'), COALESCE(MAX(entry_id), 1)) FROM stock_entries;
+SELECT setval(pg_get_serial_sequence('reorders', 'reorder_id'), COALESCE(MAX(reorder_id), 1)) FROM reorders;
+
+-- Function 5: Add a product with its initial shipment and Restock entry
+CREATE OR REPLACE FUNCTION add_new_product_manual_id(
+    p_name VARCHAR,
+    p_category VARCHAR,
+    p_price NUMERIC,
+    p_stock INTEGER,
+    p_reorder INTEGER,
+    p_supplier INTEGER
+) RETURNS INTEGER AS $$
+DECLARE
+    new_prod_id INTEGER;
+BEGIN
+    INSERT INTO products_(product_name, category, price, stock_quantity, reorder_level, supplier_id)
+    VALUES (p_name, p_category, p_price, p_stock, p_reorder, p_supplier)
+    RETURNING product_id INTO new_prod_id;
+
+    INSERT INTO shipments(product_id, supplier_id, quantity_received, shipment_date)
+    VALUES (new_prod_id, p_supplier, p_stock, CURRENT_DATE);
+
+    INSERT INTO stock_entries(product_id, change_quantity, change_type, entry_date)
+    VALUES (new_prod_id, p_stock, 'Restock', CURRENT_DATE);
+
+    RETURN new_prod_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function 6: Receive a reorder in one transaction
+CREATE OR REPLACE FUNCTION mark_reorder_as_received(
+    in_reorder_id INTEGER
+) RETURNS VOID AS $$
+DECLARE
+    prod_id INTEGER;
+    qty INTEGER;
+    sup_id INTEGER;
+BEGIN
+    -- Lock the reorder so two operators cannot receive it twice
+    SELECT product_id, reorder_quantity
+    INTO prod_id, qty
+    FROM reorders
+    WHERE reorder_id = in_reorder_id
+    AND status IN ('Pending', 'Ordered')
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Reorder % not found or already received', in_reorder_id;
+    END IF;
+
+    UPDATE reorders
+    SET status = 'Received'
+    WHERE reorder_id = in_reorder_id;
+
+    -- Atomic increment; updated_at is set by the trigger
+    UPDATE products_
+    SET stock_quantity = stock_quantity + qty
+    WHERE product_id = prod_id
+    RETURNING supplier_id INTO sup_id;
+
+    INSERT INTO shipments(product_id, supplier_id, quantity_received, shipment_date)
+    VALUES (prod_id, sup_id, qty, CURRENT_DATE);
+
+    INSERT INTO stock_entries(product_id, change_quantity, change_type, entry_date)
+    VALUES (prod_id, qty, 'Restock', CURRENT_DATE);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function 7: Receive many reorders in one transaction
+-- Status updates, one stock increment per product and multi-row shipment
+-- and ledger inserts; returns an outcome for every requested reorder_id.
+CREATE OR REPLACE FUNCTION receive_reorders(
+    in_reorder_ids INTEGER[]
+) RETURNS TABLE (
+    reorder_id INTEGER,
+    outcome VARCHAR
+) AS $$
+#variable_conflict use_column
+BEGIN
+    -- Lock the open reorders, then their products, each in key order: concurrent
+    -- batches then queue on their first common row instead of deadlocking
+    PERFORM 1
+    FROM (
+        SELECT r.reorder_id
+        FROM reorders AS r
+        WHERE r.reorder_id = ANY(in_reorder_ids)
+        AND r.status IN ('Pending', 'Ordered')
+        ORDER BY r.reorder_id
+        FOR UPDATE
+    ) AS locked_reorders;
+
+    -- Rows received by a batch this one waited for no longer qualify
+    DROP TABLE IF EXISTS received;
+    CREATE TEMP TABLE received ON COMMIT DROP AS
+    SELECT r.reorder_id, r.product_id, r.reorder_quantity, p.supplier_id
+    FROM reorders AS r
+    JOIN products_ AS p ON p.product_id = r.product_id
+    WHERE r.reorder_id = ANY(in_reorder_ids)
+    AND r.status IN ('Pending', 'Ordered')
+    ORDER BY r.reorder_id;
+
+    PERFORM 1
+    FROM (
+        SELECT p.product_id
+        FROM products_ AS p
+        WHERE p.product_id IN (SELECT received.product_id FROM received)
+        ORDER BY p.product_id
+        FOR UPDATE
+    ) AS locked_products;
+
+    UPDATE reorders AS r
+    SET status = 'Received'
+    FROM received
+    WHERE r.reorder_id = received.reorder_id;
+
+    UPDATE products_ AS p
+    SET stock_quantity = p.stock_quantity + totals.qty
+    FROM (
+        SELECT received.product_id, SUM(received.reorder_quantity) AS qty
+        FROM received
+        GROUP BY received.product_id
+    ) AS totals
+    WHERE p.product_id = totals.product_id;
+
+    INSERT INTO shipments(product_id, supplier_id, quantity_received, shipment_date)
+    SELECT received.product_id, received.supplier_id, received.reorder_quantity, CURRENT_DATE
+    FROM received
+    ORDER BY received.reorder_id;
+
+    INSERT INTO stock_entries(product_id, change_quantity, change_type, entry_date)
+    SELECT received.product_id, received.reorder_quantity, 'Restock', CURRENT_DATE
+    FROM received
+    ORDER BY received.reorder_id;
+
+    RETURN QUERY
+    SELECT ids.id,
+           CASE WHEN received.reorder_id IS NULL
+                THEN 'Not found or already received'
+                ELSE 'Received'
+           END::VARCHAR
+    FROM unnest(in_reorder_ids) AS ids(id)
+    LEFT JOIN received ON received.reorder_id = ids.id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function 8: Import a batch of products in one transaction
+-- Used by bulk_import.py: the products, their initial shipments and Restock
+-- entries are committed together or not at all. Returns the new product_id
+-- of every product_name in the batch.
+CREATE OR REPLACE FUNCTION import_products(
+    in_products JSONB
+) RETURNS TABLE (
+    product_id INTEGER,
+    product_name VARCHAR
+) AS $$
+#variable_conflict use_column
+BEGIN
+    DROP TABLE IF EXISTS imported;
+    CREATE TEMP TABLE imported (
+        product_id INTEGER,
+        product_name VARCHAR,
+        supplier_id INTEGER,
+        stock_quantity INTEGER
+    ) ON COMMIT DROP;
+
+    WITH inserted AS (
+        INSERT INTO products_(product_name, category, price, stock_quantity, reorder_level, supplier_id)
+        SELECT src.product_name, src.category, src.price, src.stock_quantity, src.reorder_level, src.supplier_id
+        FROM ROWS FROM (jsonb_to_recordset(in_products) AS (
+            product_name VARCHAR,
+            category VARCHAR,
+            price NUMERIC,
+            stock_quantity INTEGER,
+            reorder_level INTEGER,
+            supplier_id INTEGER
+        )) WITH ORDINALITY AS src(product_name, category, price, stock_quantity, reorder_level, supplier_id, ord)
+        ORDER BY src.ord
+        RETURNING products_.product_id, products_.product_name, products_.supplier_id, products_.stock_quantity
+    )
+    INSERT INTO imported
+    SELECT inserted.product_id, inserted.product_name, inserted.supplier_id, inserted.stock_quantity
+    FROM inserted;
+
+    INSERT INTO shipments(product_id, supplier_id, quantity_received, shipment_date)
+    SELECT imported.product_id, imported.supplier_id, imported.stock_quantity, CURRENT_DATE
+    FROM imported
+    ORDER BY imported.product_id;
+
+    INSERT INTO stock_entries(product_id, change_quantity, change_type, entry_date)
+    SELECT imported.product_id, imported.stock_quantity, 'Restock', CURRENT_DATE
+    FROM imported
+    ORDER BY imported.product_id;
+
+    RETURN QUERY
+    SELECT imported.product_id, imported.product_name
+    FROM imported
+    ORDER BY imported.product_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ========================================
+-- PAGED PRODUCT HISTORY
+-- ========================================
+-- product_inventory_history has no row id and sorts inside the view, so it
+-- can only be read whole. These functions page it with a keyset on
+-- (record_date, record_type, record_id), newest first.
+
+CREATE INDEX IF NOT EXISTS idx_shipments_product_date ON shipments(product_id, shipment_date DESC, shipment_id DESC);
+CREATE INDEX IF NOT EXISTS idx_stock_entries_product_date ON stock_entries(product_id, entry_date DESC, entry_id DESC);
+
+CREATE OR REPLACE VIEW product_inventory_history_keyed AS
+SELECT
+    s.product_id,
+    'Shipment'::VARCHAR AS record_type,
+    s.shipment_id AS record_id,
+    s.shipment_date AS record_date,
+    s.quantity_received AS quantity,
+    NULL::VARCHAR AS change_type,
+    pr.supplier_id
+FROM shipments AS s
+JOIN products_ AS pr ON pr.product_id = s.product_id
+UNION ALL
+SELECT
+    se.product_id,
+    'Stock Entry'::VARCHAR AS record_type,
+    se.entry_id AS record_id,
+    se.entry_date AS record_date,
+    se.change_quantity AS quantity,
+    se.change_type,
+    pr.supplier_id
+FROM stock_entries AS se
+JOIN products_ AS pr ON pr.product_id = se.product_id;
+
+-- Function 9: One page of a product's history, rows older than the cursor
+CREATE OR REPLACE FUNCTION get_product_history_page(
+    p_product_id INTEGER,
+    p_limit INTEGER DEFAULT 50,
+    p_before_date DATE DEFAULT NULL,
+    p_before_type VARCHAR DEFAULT NULL,
+    p_before_id INTEGER DEFAULT NULL,
+    p_date_from DATE DEFAULT NULL,
+    p_date_to DATE DEFAULT NULL
+) RETURNS SETOF product_inventory_history_keyed AS $$
+BEGIN
+  RETURN QUERY
+  SELECT h.*
+  FROM product_inventory_history_keyed AS h
+  WHERE h.product_id = p_product_id
+  AND (p_date_from IS NULL OR h.record_date >= p_date_from)
+  AND (p_date_to IS NULL OR h.record_date <= p_date_to)
+  AND (p_before_date IS NULL
+       OR (h.record_date, h.record_type, h.record_id) < (p_before_date, p_before_type, p_before_id))
+  ORDER BY h.record_date DESC, h.record_type DESC, h.record_id DESC
+  LIMIT p_limit;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Function 10: Totals per record type for the same product and date range
+CREATE OR REPLACE FUNCTION get_product_history_summary(
+    p_product_id INTEGER,
+    p_date_from DATE DEFAULT NULL,
+    p_date_to DATE DEFAULT NULL
+) RETURNS TABLE (
+    record_type VARCHAR,
+    change_type VARCHAR,
+    record_count BIGINT,
+    total_quantity BIGINT
+) AS $$
+BEGIN
+  RETURN QUERY
+  SELECT h.record_type, h.change_type, COUNT(*), SUM(h.quantity)::BIGINT
+  FROM product_inventory_history_keyed AS h
+  WHERE h.product_id = p_product_id
+  AND (p_date_from IS NULL OR h.record_date >= p_date_from)
+  AND (p_date_to IS NULL OR h.record_date <= p_date_to)
+  GROUP BY h.record_type, h.change_type
+  ORDER BY h.record_type, h.change_type;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- ========================================
+-- CHANGE FEED
+-- ========================================
+-- Streams row changes to the dashboard (change_feed.py, CHANGE_FEED = true
+-- in secrets.toml). REPLICA IDENTITY FULL puts the previous row in UPDATE
+-- events, so only caches that read the changed columns are dropped.
+DO $$
+DECLARE
+  t TEXT;
+BEGIN
+  FOREACH t IN ARRAY ARRAY['products_', 'reorders', 'stock_entries', 'shipments', 'suppliers'] LOOP
+    EXECUTE format('ALTER TABLE %I REPLICA IDENTITY FULL', t);
+    IF NOT EXISTS (
+      SELECT 1 FROM pg_publication_tables
+      WHERE pubname = 'supabase_realtime' AND schemaname = 'public' AND tablename = t
+    ) THEN
+      EXECUTE format('ALTER PUBLICATION supabase_realtime ADD TABLE %I', t);
+    END IF;
+  END LOOP;
+END;
+$$;
+
 -- Test the functions (optional)
 -- SELECT * FROM get_all_basic_info();
+-- SELECT rebuild_stock_entries_daily();
 -- SELECT get_total_sale_value_3months();
 -- SELECT get_total_restock_value_3months();
 -- SELECT get_below_reorder_no_pending();
@@ -0,0 +1,54 @@
+"""
+Paged views over column-oriented dashboard tables.
+The data layer builds each table once as a pyarrow Table; the page sorts,
+filters and slices it in the Streamlit process, so only the rows on
+screen are serialized to the browser on a rerun.
+"""
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+DEFAULT_PAGE_SIZE = 50
+
+
+def columns_from_rows(rows, columns):
+    # {column: [values]} from a list of dicts, one pass per column
+    return {name: [row.get(name) for row in rows] for name in columns}
+
+
+def lookup(keys, mapping_keys, mapping_values):
+    # Vectorized dict lookup: mapping_values[position of key in mapping_keys], null when absent
+    positions = pc.index_in(pa.array(keys), value_set=pa.array(mapping_keys))
+    return pa.array(mapping_values).take(positions)
+
+
+def _matches(table, search):
+    mask = None
+    for name in table.column_names:
+        column = table.column(name)
+        if not pa.types.is_string(column.type):
+            column = pc.cast(column, pa.string())
+        hit = pc.fill_null(pc.match_substring(column, search, ignore_case=True), False)
+        mask = hit if mask is None else pc.or_(mask, hit)
+    return mask
+
+
+def filter_rows(table, search):
+    # Rows where any column contains `search`, case-insensitively
+    if not search or table.num_rows == 0:
+        return table
+    return table.filter(_matches(table, search))
+
+
+def page(table, sort_by=None, descending=False, number=1, page_size=DEFAULT_PAGE_SIZE):
+    # Rows of page `number` (from 1); nulls sort last. Only the row indices are sorted, not the table
+    offset = (max(number, 1) - 1) * page_size
+    if sort_by:
+        order = "descending" if descending else "ascending"
+        indices = pc.sort_indices(table, sort_keys=[(sort_by, order)])
+        return table.take(indices[offset:offset + page_size])
+    return table.slice(offset, page_size)
+
+
+def page_count(total, page_size=DEFAULT_PAGE_SIZE):
+    return max((total + page_size - 1) // page_size, 1)
@@ -8,7 +8,7 @@ get_additional_tables,
 get_suppliers,
 get_categories,add_new_manual_id,
 get_all_products,
-get_product_history,
+get_product_history_page,
 place_reorder,
 get_pending_reorders,
 mark_reorder_as_received
@@ -113,7 +113,7 @@ elif option == "Operational Task":
 
         if selected_product_name:
             selected_product_id = product_ids[product_names.index(selected_product_name)]
-            history_data = get_product_history(cursor, selected_product_id)
+            history_data = get_product_history_page(cursor, selected_product_id)["rows"]
 
             if history_data:
                 df = pd.DataFrame(history_data)
@@ -0,0 +1,123 @@
+"""
+async_db against an awaitable FakeSupabase: the same results as db_functions,
+with the independent requests of a call in flight together.
+"""
+
+import asyncio
+from collections import Counter
+
+import pytest
+
+import async_db
+import db_functions
+import query_cache
+from fake_supabase import FakeSupabase, generate_dataset
+
+
+class AsyncFake:
+    # FakeSupabase behind AsyncClient's interface: builders are synchronous, execute() is awaited
+    def __init__(self, fake, latency=0.005):
+        self.fake = fake
+        self.latency = latency
+        self.tables = Counter()
+        self.in_flight = 0
+        self.peak = 0
+
+    def table(self, name):
+        self.tables[name] += 1
+        return _Builder(self, self.fake.table(name))
+
+    def rpc(self, name, params=None):
+        return _Builder(self, self.fake.rpc(name, params))
+
+    async def _execute(self, builder):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            return builder.execute()
+        finally:
+            self.in_flight -= 1
+
+
+class _Builder:
+    def __init__(self, client, builder):
+        self._client = client
+        self._builder = builder
+
+    def __getattr__(self, name):
+        method = getattr(self._builder, name)
+
+        def call(*args, **kwargs):
+            result = method(*args, **kwargs)
+            return _Builder(self._client, result) if result is self._builder else result
+        return call
+
+    async def execute(self):
+        return await self._client._execute(self._builder)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    query_cache.clear()
+    yield
+    query_cache.clear()
+
+
+@pytest.fixture
+def dataset():
+    return generate_dataset(products=300, seed=6)
+
+
+def test_panels_match_the_synchronous_readers(dataset):
+    client = AsyncFake(FakeSupabase(dataset))
+    sync = FakeSupabase(dataset)
+
+    results, errors = asyncio.run(async_db.get_dashboard_panels(client))
+
+    assert errors == {}
+    assert results["Basic Metrics"] == db_functions._fetch_basic_info(sync)
+    assert results["Window Metrics"].equals(db_functions._fetch_window_metrics(sync))
+    for label, fetch in db_functions.ADDITIONAL_TABLES.items():
+        assert results[label].equals(fetch(sync))
+
+
+def test_panels_share_their_reads_and_overlap_them(dataset):
+    client = AsyncFake(FakeSupabase(dataset))
+
+    asyncio.run(async_db.get_dashboard_panels(client))
+
+    # products_ fits one page; one request for it and the empty page after it,
+    # however many panels use it
+    assert client.tables["products_"] == 2
+    assert client.tables["suppliers"] == 3  # the count, then its page and the empty one
+    assert client.peak > 1
+
+
+def test_reads_of_one_call_are_gathered(dataset):
+    client = AsyncFake(FakeSupabase(dataset))
+
+    pending = asyncio.run(async_db.get_pending_reorders(client))
+
+    assert pending == db_functions._pending_reorder_rows(dataset["reorders"], dataset["products_"])
+    assert client.peak == 2
+
+
+def test_history_page_falls_back_to_the_view(dataset):
+    client = AsyncFake(FakeSupabase(dataset))
+    product_id = dataset["products_"][0]["product_id"]
+
+    page = asyncio.run(async_db.get_product_history_page(client, product_id, page_size=2))
+
+    assert len(page["rows"]) == 2 and page["next_cursor"] == {"offset": 2}
+
+
+def test_place_reorder_writes_the_next_id(dataset):
+    fake = FakeSupabase(dataset)
+    product_id = dataset["products_"][0]["product_id"]
+    last = max(r["reorder_id"] for r in dataset["reorders"])
+
+    asyncio.run(async_db.place_reorder(AsyncFake(fake), None, product_id, 12))
+
+    assert fake.tables["reorders"][-1]["reorder_id"] == last + 1
+    assert fake.tables["reorders"][-1]["status"] == "Ordered"
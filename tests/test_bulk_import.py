@@ -0,0 +1,140 @@
+"""
+Batch atomicity and row reporting of bulk_import.
+"""
+
+import pandas as pd
+import pytest
+
+import query_cache
+import replica
+from bulk_import import import_products
+from fake_supabase import FakeSupabase, generate_dataset
+from sqlite_backend import SQLiteClient
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    query_cache.clear()
+    replica.clear()
+    yield
+    query_cache.clear()
+    replica.clear()
+
+
+def product_file(supplier_id):
+    # Line 3 of the file is invalid; lines 2 and 4 are imported
+    return pd.DataFrame([
+        {"product_name": "Widget A", "category": "Tools", "price": 2.5, "stock_quantity": 10,
+         "reorder_level": 3, "supplier_id": supplier_id},
+        {"product_name": "", "category": "Tools", "price": 1.0, "stock_quantity": 1,
+         "reorder_level": 1, "supplier_id": supplier_id},
+        {"product_name": "Widget B", "category": "Tools", "price": 4.0, "stock_quantity": 7,
+         "reorder_level": 2, "supplier_id": supplier_id},
+    ])
+
+
+def count(client, table):
+    return len(client.table(table).select("*").execute().data)
+
+
+@pytest.fixture
+def sqlite_client():
+    client = SQLiteClient()
+    client.load_tables(generate_dataset(products=20, seed=1))
+    return client
+
+
+def test_rpc_imports_products_with_shipments_and_ledger(sqlite_client):
+    supplier_id = sqlite_client.table("suppliers").select("supplier_id").execute().data[0]["supplier_id"]
+    before = {t: count(sqlite_client, t) for t in ("products_", "shipments", "stock_entries")}
+
+    outcome = import_products(sqlite_client, product_file(supplier_id))
+
+    assert outcome["inserted"] == 2
+    assert [r["row"] for r in outcome["rejected"]] == [3]
+    assert outcome["incomplete"] == []
+    for table in before:
+        assert count(sqlite_client, table) == before[table] + 2
+    names = {p["product_id"]: p["product_name"] for p in sqlite_client.table("products_").select("*").execute().data}
+    assert [names[i] for i in outcome["product_ids"]] == ["Widget A", "Widget B"]
+
+
+def test_failed_batch_stores_nothing_and_keeps_line_numbers(sqlite_client):
+    supplier_id = sqlite_client.table("suppliers").select("supplier_id").execute().data[0]["supplier_id"]
+    sqlite_client._conn.execute(
+        "CREATE TRIGGER no_shipments BEFORE INSERT ON shipments "
+        "BEGIN SELECT RAISE(ABORT, 'shipments unavailable'); END"
+    )
+    products = count(sqlite_client, "products_")
+
+    outcome = import_products(sqlite_client, product_file(supplier_id))
+
+    assert outcome["inserted"] == 0
+    assert sorted(r["row"] for r in outcome["rejected"]) == [2, 3, 4]
+    assert count(sqlite_client, "products_") == products
+
+
+def test_fallback_reports_products_stored_without_their_ledger_rows():
+    fake = FakeSupabase(generate_dataset(products=20, seed=1))
+    supplier_id = fake.tables["suppliers"][0]["supplier_id"]
+    table = fake.table
+
+    def failing_table(name):
+        query = table(name)
+        if name == "shipments":
+            query.insert = lambda payload: (_ for _ in ()).throw(ConnectionError("connection reset"))
+        return query
+
+    fake.table = failing_table
+    products = len(fake.tables["products_"])
+
+    outcome = import_products(fake, product_file(supplier_id))
+
+    assert outcome["inserted"] == 2
+    assert len(fake.tables["products_"]) == products + 2
+    assert [(r["row"], r["product_id"]) for r in outcome["incomplete"]] == list(zip([2, 4], outcome["product_ids"]))
+
+
+def test_line_numbers_follow_file_positions_whatever_the_index(sqlite_client):
+    supplier_id = sqlite_client.table("suppliers").select("supplier_id").execute().data[0]["supplier_id"]
+    frame = product_file(supplier_id)
+    frame.index = [10, 5, 7]
+
+    outcome = import_products(sqlite_client, frame)
+
+    assert [r["row"] for r in outcome["rejected"]] == [3]
+    assert outcome["inserted"] == 2
+
+
+def test_failed_supplier_read_fails_the_import():
+    fake = FakeSupabase(generate_dataset(products=20, seed=1))
+    supplier_id = fake.tables["suppliers"][0]["supplier_id"]
+    table = fake.table
+
+    def failing_table(name):
+        if name == "suppliers":
+            raise ConnectionError("connection reset")
+        return table(name)
+
+    fake.table = failing_table
+
+    with pytest.raises(ConnectionError):
+        import_products(fake, product_file(supplier_id))
+
+
+def test_fallback_assigns_ids_past_the_highest_like_the_other_writes():
+    fake = FakeSupabase(generate_dataset(products=20, seed=1))
+    supplier_id = fake.tables["suppliers"][0]["supplier_id"]
+    # Rows written with explicit ids leave the table sequences behind
+    fake._next_ids = dict.fromkeys(fake._next_ids, 1)
+    highest = {t: fake.tables[t][-1][k] for t, k in
+               (("products_", "product_id"), ("shipments", "shipment_id"), ("stock_entries", "entry_id"))}
+
+    outcome = import_products(fake, product_file(supplier_id))
+
+    assert outcome["incomplete"] == [] and outcome["rejected"][0]["row"] == 3
+    assert outcome["product_ids"] == [highest["products_"] + 1, highest["products_"] + 2]
+    assert [r["shipment_id"] for r in fake.tables["shipments"][-2:]] == \
+        [highest["shipments"] + 1, highest["shipments"] + 2]
+    assert [r["entry_id"] for r in fake.tables["stock_entries"][-2:]] == \
+        [highest["stock_entries"] + 1, highest["stock_entries"] + 2]
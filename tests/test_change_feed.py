@@ -0,0 +1,105 @@
+"""
+ChangeFeed over LocalEventSource: events patch the replicas and drop only the
+cached results that read the changed columns; the source's connects and drops
+switch the caches between trusting the feed and their TTLs.
+"""
+
+import pytest
+
+import query_cache
+import replica
+from change_feed import ChangeFeed, LocalEventSource
+from fake_supabase import FakeSupabase, generate_dataset
+
+
+class Reads:
+    # Cached readers of products_ that count their backend calls
+    def __init__(self):
+        self.calls = {"price": 0, "category": 0}
+        self.price = query_cache.cached(ttl=600, depends_on={"products_": ("price",)})(self._read("price"))
+        self.category = query_cache.cached(ttl=600, depends_on={"products_": ("category",)})(self._read("category"))
+
+    def _read(self, column):
+        def read(client):
+            self.calls[column] += 1
+            return [p[column] for p in replica.get_replica(client, "products_").rows(client)]
+        read.__qualname__ = f"read_{column}_{id(self)}"
+        return read
+
+
+@pytest.fixture
+def source():
+    return LocalEventSource()
+
+
+@pytest.fixture
+def client(source):
+    replica.clear()
+    query_cache.clear()
+    yield FakeSupabase(generate_dataset(products=50, seed=8), events=source)
+    replica.clear()
+    query_cache.clear()
+    query_cache.set_live(("products_", "reorders", "stock_entries", "shipments", "suppliers"), False)
+
+
+@pytest.fixture
+def feed(source, client):
+    feed = ChangeFeed(source).start()
+    yield feed
+    feed.stop()
+
+
+def set_price(client, product_id, price):
+    client.table("products_").update({"price": price}).eq("product_id", product_id).execute()
+
+
+def test_event_patches_the_replica_and_drops_only_dependent_results(client, feed):
+    reads = Reads()
+    reads.price(client), reads.category(client)
+    product_id = client.tables["products_"][0]["product_id"]
+    client.reset_counters()
+
+    set_price(client, product_id, 123.45)
+
+    # The replica was patched from the event, not re-read
+    assert replica.get_replica(client, "products_").get(client, product_id)["price"] == 123.45
+    assert 123.45 in reads.price(client)
+    reads.category(client)
+    assert reads.calls == {"price": 2, "category": 1}
+    assert client.requests == 1   # the update itself
+    assert feed.status()["events"] == 1
+
+
+def test_connect_and_drop_switch_the_caches_to_and_from_live(source, client):
+    reads = Reads()
+    reads.price(client)
+
+    feed = ChangeFeed(source).start()
+    # Connecting refreshes once: events may have been missed before it
+    assert feed.live and query_cache.is_live("products_")
+    reads.price(client)
+    assert reads.calls["price"] == 2
+
+    source.stop()
+    assert not feed.live and not query_cache.is_live("products_")
+
+    # A stopped feed ignores whatever the source still delivers
+    feed.stop()
+    feed.set_live(True)
+    assert not query_cache.is_live("products_")
+
+
+def test_reconnect_catches_up_on_changes_made_while_dropped(source, client, feed):
+    product_id = client.tables["products_"][0]["product_id"]
+    products = replica.get_replica(client, "products_")
+    products.rows(client)
+
+    source.stop()
+    set_price(client, product_id, 9.99)
+    # Dropped: no event arrived and the replica is inside its sync interval
+    assert products.get(client, product_id)["price"] != 9.99
+
+    source.start(feed.handle, feed.set_live)
+
+    assert feed.live
+    assert products.get(client, product_id)["price"] == 9.99
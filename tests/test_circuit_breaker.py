@@ -0,0 +1,174 @@
+"""
+Circuit breaker and the stale fallbacks of query_cache, on the fake client.
+"""
+
+import time
+
+import pytest
+from postgrest.exceptions import APIError
+
+import circuit_breaker
+import query_cache
+import replica
+from circuit_breaker import BackendUnavailable, CircuitBreaker, GuardedClient
+from fake_supabase import FakeSupabase, generate_dataset
+
+
+class Backend:
+    # latency callable for FakeSupabase: raises while down, like a refused connection
+    def __init__(self):
+        self.down = False
+
+    def __call__(self):
+        if self.down:
+            raise ConnectionError("connection refused")
+        return 0.0
+
+
+@pytest.fixture
+def backend():
+    query_cache.clear()
+    replica.clear()
+    yield Backend()
+    query_cache.clear()
+    replica.clear()
+
+
+def guarded(backend, **breaker_options):
+    fake = FakeSupabase(generate_dataset(50), latency=backend)
+    client = GuardedClient(fake, CircuitBreaker(**breaker_options))
+    # The replica asks the backend on every read
+    replica.get_replica(client, "suppliers").min_sync_interval = 0
+    return fake, client
+
+
+@query_cache.cached(ttl=0.2, depends_on={"suppliers": None})
+def supplier_names(supabase):
+    # Reads only through the replica, like the dashboard's supplier tables
+    return sorted(s["supplier_name"] for s in replica.get_replica(supabase, "suppliers").rows(supabase))
+
+
+@query_cache.cached(ttl=60, depends_on={"products_": None})
+def product_count(supabase):
+    return len(supabase.table("products_").select("product_id").execute().data)
+
+
+@query_cache.cached(ttl=0.2, depends_on={"products_": None})
+def product_names(supabase):
+    return [p["product_name"] for p in supabase.table("products_").select("product_name").execute().data]
+
+
+@query_cache.cached(ttl=60, depends_on={"products_": None})
+def broken_reader(supabase):
+    supabase.table("products_").select("product_id").limit(1).execute()
+    raise KeyError("price")
+
+
+def wait_for_trial(breaker):
+    while breaker.is_open():
+        time.sleep(0.01)
+
+
+def test_trips_after_threshold_requests(backend):
+    _, client = guarded(backend)
+    backend.down = True
+    for _ in range(circuit_breaker.FAILURE_THRESHOLD - 1):
+        with pytest.raises(ConnectionError):
+            client.table("products_").select("*").execute()
+        assert client.circuit_breaker.status()["state"] == "closed"
+    with pytest.raises(ConnectionError):
+        client.table("products_").select("*").execute()
+    assert client.circuit_breaker.status()["state"] == "open"
+    with pytest.raises(BackendUnavailable):
+        client.table("products_").select("*").execute()
+
+
+def test_failing_trial_backs_off_further(backend):
+    # A reader served by the replica must not close the circuit without a round trip
+    fake, client = guarded(backend, base_backoff=0.02, max_backoff=10)
+    breaker = client.circuit_breaker
+    supplier_names(client)
+    backend.down = True
+    time.sleep(0.25)
+
+    # One failure per request: the threshold trips the circuit, then every failed
+    # trial reopens it for twice as long
+    for _ in range(circuit_breaker.FAILURE_THRESHOLD + 3):
+        supplier_names(client)
+        wait_for_trial(breaker)
+    assert breaker.status()["state"] != "closed"
+    assert breaker.failures == circuit_breaker.FAILURE_THRESHOLD + 3
+    assert breaker.trips == 4
+
+
+def test_trial_closes_only_after_backend_answers(backend):
+    fake, client = guarded(backend, base_backoff=0.02)
+    breaker = client.circuit_breaker
+    supplier_names(client)
+    backend.down = True
+    time.sleep(0.25)
+    while breaker.status()["state"] == "closed":
+        supplier_names(client)
+        time.sleep(0.01)
+
+    backend.down = False
+    wait_for_trial(breaker)
+    before = fake.requests
+    supplier_names(client)
+    for _ in range(100):
+        if breaker.status()["state"] == "closed":
+            break
+        time.sleep(0.01)
+    assert breaker.status()["state"] == "closed"
+    assert fake.requests > before
+
+
+def test_reader_errors_do_not_trip(backend):
+    _, client = guarded(backend)
+    for _ in range(circuit_breaker.FAILURE_THRESHOLD + 1):
+        with pytest.raises(KeyError):
+            broken_reader(client)
+    assert client.circuit_breaker.status() == {
+        "state": "closed", "failures": 0, "retry_in": None, "last_error": None}
+
+
+def test_rejected_query_is_an_answer():
+    assert not circuit_breaker.is_backend_failure(APIError({"code": "PGRST202", "message": "missing"}))
+    assert not circuit_breaker.is_backend_failure(APIError({"code": "23505", "message": "duplicate"}))
+    assert circuit_breaker.is_backend_failure(APIError({"code": 503, "message": "unavailable"}))
+    assert circuit_breaker.is_backend_failure(APIError({"code": "57014", "message": "statement timeout"}))
+    assert circuit_breaker.is_backend_failure(ConnectionError("refused"))
+
+
+def test_serves_last_good_result_while_down(backend):
+    fake, client = guarded(backend)
+    count = product_count(client)
+    backend.down = True
+    query_cache.invalidate("products_")
+
+    started = time.monotonic()
+    assert product_count(client) == count
+    assert time.monotonic() - started < query_cache.WAIT_TIMEOUT + 0.5
+    assert query_cache.freshness(product_count, client)["stale"]
+
+
+def test_cold_reader_fails_fast_while_open(backend):
+    _, client = guarded(backend)
+    backend.down = True
+    for _ in range(circuit_breaker.FAILURE_THRESHOLD):
+        with pytest.raises(ConnectionError):
+            product_count(client)
+    with pytest.raises(BackendUnavailable):
+        product_count(client)
+
+
+def test_expired_entry_served_while_refreshing(backend):
+    fake, client = guarded(backend)
+    names = product_names(client)
+    fake.latency = 0.5
+    time.sleep(0.25)
+
+    started = time.monotonic()
+    assert product_names(client) == names
+    assert time.monotonic() - started < 0.1
+    assert query_cache.freshness(product_names, client)["stale"]
@@ -0,0 +1,44 @@
+"""
+Attribution of queries issued from fetch_concurrently workers.
+"""
+
+import pytest
+
+import instrumentation
+from fake_supabase import FakeSupabase, generate_dataset
+from parallel_fetch import fetch_concurrently
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(instrumentation, "CALLER_MODULES", (__name__,))
+    instrumentation.start_rerun(enabled=True)
+    yield instrumentation.instrument(FakeSupabase(generate_dataset(products=20, seed=5)))
+    instrumentation.clear(session=None)
+    instrumentation._sessions.pop(None, None)
+
+
+def count_suppliers(client):
+    return len(client.table("suppliers").select("supplier_id").execute().data)
+
+
+def dashboard(client):
+    return fetch_concurrently({"suppliers": lambda: count_suppliers(client)})
+
+
+def test_worker_queries_are_attributed_to_the_submitting_function(client):
+    results, errors = dashboard(client)
+
+    assert errors == {} and results["suppliers"] > 0
+    [entry] = instrumentation.records(session=None)
+    # The outermost caller is this test, in the thread that submitted the task
+    assert entry["function"] == f"{__name__}.test_worker_queries_are_attributed_to_the_submitting_function"
+    assert entry["site"] == f"{__name__}.count_suppliers"
+
+
+def test_direct_queries_are_attributed_to_their_callers(client):
+    count_suppliers(client)
+
+    [entry] = instrumentation.records(session=None)
+    assert entry["function"] == f"{__name__}.test_direct_queries_are_attributed_to_their_callers"
+    assert entry["site"] == f"{__name__}.count_suppliers"
@@ -0,0 +1,104 @@
+"""
+LowStockTracker: the reorder-level boundary, incremental and full replica
+notifications, and trackers of replaced replicas.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import low_stock
+import query_cache
+import replica
+from fake_supabase import FakeSupabase, generate_dataset
+from low_stock import LowStockTracker
+from replica import TableReplica
+
+
+@pytest.fixture(autouse=True)
+def clear_state():
+    query_cache.clear()
+    replica.clear()
+    yield
+    query_cache.clear()
+    replica.clear()
+
+
+def product(product_id, stock, reorder_level):
+    return {"product_id": product_id, "stock_quantity": stock, "reorder_level": reorder_level}
+
+
+def test_stock_at_the_reorder_level_is_low():
+    tracker = LowStockTracker.from_rows(
+        [product(1, 4, 5), product(2, 5, 5), product(3, 6, 5), product(4, None, None)],
+        [{"reorder_id": 1, "product_id": 2, "status": "Ordered"},
+         {"reorder_id": 2, "product_id": 1, "status": "Received"}],
+    )
+
+    assert tracker.product_ids(include_pending=True) == [1, 2, 4]
+    # Product 2 has an open reorder
+    assert tracker.product_ids() == [1, 4]
+    assert tracker.count() == 2
+
+
+@pytest.fixture
+def client():
+    client = FakeSupabase(generate_dataset(products=50, seed=10))
+    # Last touched an hour apart, so a delta's watermark overlap re-reads at most one of them
+    for hours, row in enumerate(client.tables["products_"], start=1):
+        row["updated_at"] = (datetime(2026, 1, 1) - timedelta(hours=hours)).isoformat()
+    return client
+
+
+def set_stock(client, product_id, stock):
+    client.table("products_").update({"stock_quantity": stock}).eq("product_id", product_id).execute()
+
+
+def tracked(client, **options):
+    products = TableReplica("products_", **replica.TABLES["products_"], min_sync_interval=0, **options)
+    reorders = TableReplica("reorders", **replica.TABLES["reorders"], min_sync_interval=0)
+    tracker = LowStockTracker(products, reorders)
+    tracker.sync(client)
+    return tracker, products
+
+
+def test_delta_updates_only_the_changed_products(client):
+    tracker, products = tracked(client)
+    notified = []
+    products.subscribe(lambda rows, full: notified.append((len(rows), full)))
+    low = set(tracker.product_ids(include_pending=True))
+    low_id = next(iter(low))
+    high_id = next(p["product_id"] for p in client.tables["products_"] if p["product_id"] not in low)
+
+    set_stock(client, high_id, 0)
+    set_stock(client, low_id, 10 ** 6)
+    tracker.sync(client)
+
+    # The subscribe call itself, then one delta: the two changed rows and the overlap
+    [(loaded, full), (changed, incremental)] = notified
+    assert (loaded, full) == (50, True)
+    assert changed <= 3 and not incremental
+    assert set(tracker.product_ids(include_pending=True)) == low - {low_id} | {high_id}
+
+
+def test_full_reload_drops_deleted_products(client):
+    tracker, products = tracked(client, full_reload_interval=0)
+    low_id = tracker.product_ids(include_pending=True)[0]
+
+    # Deletes are invisible to deltas; the full reload replaces everything
+    client.tables["products_"] = [p for p in client.tables["products_"] if p["product_id"] != low_id]
+    tracker.sync(client)
+
+    assert low_id not in tracker.product_ids(include_pending=True)
+
+
+def test_replaced_replicas_no_longer_feed_the_old_tracker(client):
+    old = low_stock.get_tracker(client)
+    old_products = old.replicas[0]
+
+    replica.clear()
+    new = low_stock.get_tracker(client)
+
+    assert new is not old and new.replicas[0] is not old_products
+    assert old._on_products not in old_products._listeners
+    assert new._on_products in new.replicas[0]._listeners
@@ -0,0 +1,176 @@
+"""
+ledger_values against the per-row loop it replaced in _basic_info_client_side,
+and window_metrics' window boundaries, groups, page merges and signs.
+"""
+
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from metrics_engine import ledger_values, merge_window_metrics, price_index, to_ledger_frame, window_metrics
+
+
+def loop_value(entries, products_map, change_type, three_months_ago):
+    # The original loop, verbatim apart from taking change_type
+    total = 0
+    for entry in entries:
+        if entry.get("change_type") != change_type:
+            continue
+        entry_date = entry.get("entry_date")
+        if entry_date:
+            if isinstance(entry_date, str):
+                entry_date = datetime.fromisoformat(entry_date.replace('Z', '+00:00')).date()
+
+            if entry_date >= three_months_ago:
+                product_id = entry.get("product_id")
+                change_qty = abs(entry.get("change_quantity", 0))
+                price = products_map.get(product_id, 0)
+                total += change_qty * price
+    return total
+
+
+def generate_ledger(seed, rows=2000, products=50):
+    rng = random.Random(seed)
+    prices = {p: round(rng.uniform(1, 500), 2) for p in range(1, products + 1)}
+    start = date(2025, 1, 1)
+    entries = []
+    for _ in range(rows):
+        day = start + timedelta(days=rng.randrange(400))
+        style = rng.random()
+        if style < 0.05:
+            entry_date = None
+        elif style < 0.25:
+            entry_date = f"{day.isoformat()}T{rng.randrange(24):02d}:{rng.randrange(60):02d}:00Z"
+        elif style < 0.45:
+            entry_date = f"{day.isoformat()}T{rng.randrange(24):02d}:15:00-05:00"
+        elif style < 0.55:
+            entry_date = f"{day.isoformat()}T08:00:00+05:30"
+        else:
+            entry_date = day.isoformat()
+        entries.append({
+            # A few entries refer to products that are not in the price map
+            "product_id": rng.randrange(1, products + 10),
+            "change_type": rng.choice(["Sale", "Restock", "Adjustment"]),
+            "change_quantity": rng.randint(-100, 100),
+            "entry_date": entry_date,
+        })
+    return entries, prices
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_ledger_values_matches_loop(seed):
+    entries, prices = generate_ledger(seed)
+    since = date(2025, 10, 1)
+    values = ledger_values(entries, prices, change_types=("Sale", "Restock"), since=since)
+    for change_type in ("Sale", "Restock"):
+        assert values[change_type] == pytest.approx(loop_value(entries, prices, change_type, since))
+
+
+def test_ledger_values_accepts_frame_and_price_index():
+    entries, prices = generate_ledger(7)
+    since = date(2025, 6, 1)
+    values = ledger_values(to_ledger_frame(entries), price_index(prices), since=since)
+    assert values["Sale"] == pytest.approx(loop_value(entries, prices, "Sale", since))
+    assert values["Restock"] == pytest.approx(loop_value(entries, prices, "Restock", since))
+
+
+def test_ledger_values_paged_sum_matches_loop():
+    # db_functions reduces the window page by page
+    entries, prices = generate_ledger(11)
+    since = date(2025, 3, 1)
+    totals = {"Sale": 0.0, "Restock": 0.0}
+    for offset in range(0, len(entries), 300):
+        for change_type, value in ledger_values(entries[offset:offset + 300], prices, since=since).items():
+            totals[change_type] += value
+    assert totals["Sale"] == pytest.approx(loop_value(entries, prices, "Sale", since))
+
+
+def test_ledger_values_edge_rows():
+    prices = {1: 10.0}
+    entries = [
+        {"product_id": 1, "change_type": "Sale", "change_quantity": -3, "entry_date": "2025-05-01T23:59:00-05:00"},
+        {"product_id": 1, "change_type": "Sale", "change_quantity": 2, "entry_date": None},
+        {"product_id": 99, "change_type": "Sale", "change_quantity": 5, "entry_date": "2025-05-02"},
+        {"product_id": 1, "change_type": "Restock", "change_quantity": 4, "entry_date": "2025-04-30T00:00:00Z"},
+    ]
+    since = date(2025, 5, 1)
+    assert ledger_values(entries, prices, since=since) == {"Sale": 30.0, "Restock": 0.0}
+    assert ledger_values([], prices, since=since) == {"Sale": 0.0, "Restock": 0.0}
+
+
+def test_adjustments_keep_their_sign():
+    products = [{"product_id": 1, "price": 10.0}]
+    entries = [
+        {"product_id": 1, "change_type": "Adjustment", "change_quantity": -5, "entry_date": "2025-05-01"},
+        {"product_id": 1, "change_type": "Adjustment", "change_quantity": 2, "entry_date": "2025-05-02"},
+        {"product_id": 1, "change_type": "Sale", "change_quantity": -3, "entry_date": "2025-05-02"},
+    ]
+    metrics = window_metrics(entries, products, [30], as_of=date(2025, 5, 10)).set_index("change_type")
+    assert metrics.loc["Adjustment", "quantity"] == -3
+    assert metrics.loc["Adjustment", "value"] == -30.0
+    assert metrics.loc["Sale", "quantity"] == 3
+    assert ledger_values(entries, products, change_types=("Adjustment",)) == {"Adjustment": -30.0}
+
+
+def test_window_includes_entries_exactly_its_length_old():
+    as_of = date(2025, 5, 31)
+    # Sales of 1, 2, 4, 8 and 16 units, 0, 7, 8, 30 and 31 days before as_of
+    entries = [
+        {"product_id": 1, "change_type": "Sale", "change_quantity": -(2 ** i),
+         "entry_date": (as_of - timedelta(days=age)).isoformat()}
+        for i, age in enumerate([0, 7, 8, 30, 31])
+    ]
+    metrics = window_metrics(entries, [{"product_id": 1, "price": 1.0}], [30, 7], as_of)
+
+    assert dict(zip(metrics["window"], metrics["quantity"])) == {7: 3, 30: 15}
+
+
+def window_loop(entries, products, windows, as_of, group_by):
+    # Every entry added to every window that contains it, one row at a time
+    by_id = {p["product_id"]: p for p in products}
+    totals = {}
+    for entry in entries:
+        if entry["entry_date"] is None:
+            continue
+        age = (as_of - datetime.fromisoformat(entry["entry_date"].replace('Z', '+00:00')).date()).days
+        product = by_id.get(entry["product_id"], {})
+        quantity = entry["change_quantity"] if entry["change_type"] == "Adjustment" else abs(entry["change_quantity"])
+        for window in windows:
+            if age <= window:
+                key = (window, *(product.get(g) for g in group_by), entry["change_type"])
+                total = totals.setdefault(key, [0, 0.0])
+                total[0] += quantity
+                total[1] += quantity * product.get("price", 0)
+    return totals
+
+
+def as_totals(metrics, group_by):
+    keys = ["window", *group_by, "change_type"]
+    return {
+        tuple(None if v != v else v for v in row[:-2]): [row[-2], row[-1]]
+        for row in metrics[[*keys, "quantity", "value"]].itertuples(index=False)
+    }
+
+
+@pytest.mark.parametrize("seed", [3, 9])
+def test_groups_and_page_merge_match_loop(seed):
+    entries, prices = generate_ledger(seed)
+    rng = random.Random(seed)
+    products = [{"product_id": p, "price": price, "category": rng.choice(["Tools", "Toys", None]),
+                 "supplier_name": rng.choice(["Acme", "Globex"])} for p, price in prices.items()]
+    windows, as_of, group_by = (7, 30, 90, 365), date(2026, 1, 15), ("category", "supplier_name")
+    expected = window_loop(entries, products, windows, as_of, group_by)
+
+    whole = window_metrics(entries, products, windows, as_of, group_by)
+    pages = merge_window_metrics([
+        window_metrics(entries[start:start + 300], products, windows, as_of, group_by)
+        for start in range(0, len(entries), 300)
+    ], group_by)
+
+    for metrics in (whole, pages):
+        totals = as_totals(metrics, group_by)
+        assert totals.keys() == expected.keys()
+        for key, (quantity, value) in expected.items():
+            assert totals[key][0] == quantity
+            assert totals[key][1] == pytest.approx(value)
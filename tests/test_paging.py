@@ -0,0 +1,26 @@
+"""
+Keyset paging against a project whose max-rows is below the page size.
+"""
+
+from fake_supabase import FakeSupabase, generate_dataset
+from paging import iter_pages, iter_rows
+
+
+def test_max_rows_below_page_size_reads_every_row():
+    fake = FakeSupabase(generate_dataset(products=2000, seed=2), max_rows=500)
+
+    pages = list(iter_pages(fake, "products_", "product_name", key="product_id", page_size=1000))
+
+    assert [len(p) for p in pages] == [500, 500, 500, 500]
+    assert sum(len(p) for p in pages) == len(fake.tables["products_"])
+    assert all("product_id" not in row for page in pages for row in page)
+
+
+def test_short_final_page_then_empty_page():
+    fake = FakeSupabase(generate_dataset(products=1200, seed=2))
+
+    rows = list(iter_rows(fake, "products_", "*", key="product_id", page_size=1000))
+
+    assert [r["product_id"] for r in rows] == [r["product_id"] for r in fake.tables["products_"]]
+    # 1000, 200, then the empty page that ends the scan
+    assert fake.requests == 3
@@ -0,0 +1,61 @@
+"""
+SearchIndex ranking, category filter and limits.
+"""
+
+from product_search import SearchIndex
+
+
+def index(names):
+    # (product_id, name, category) tuples
+    return SearchIndex(
+        [{"product_id": i, "product_name": n, "category": c} for i, n, c in names],
+        "product_id", "product_name", "category",
+    )
+
+
+CATALOG = index([
+    (1, "Cable tie", "Tools"),
+    (2, "Drill 12", "Tools"),
+    (3, "Bracket", "Hardware"),
+    (4, "Tiered rack", "Hardware"),
+    (5, "Hex tie 12", "Hardware"),
+    (12, "Zip tie", "Tools"),
+    (7, "Tie wrap", "Tools"),
+])
+
+
+def ids(rows):
+    return [r["product_id"] for r in rows]
+
+
+def test_id_then_prefix_then_substring_in_name_order():
+    assert ids(CATALOG.search("tie")) == [7, 4, 1, 5, 12]
+    # "12" is an ID and also in two names; two characters only match prefixes
+    assert ids(CATALOG.search("12")) == [12]
+    assert ids(CATALOG.search("rack")) == [3, 4]
+
+
+def test_category_filters_every_tier():
+    assert ids(CATALOG.search("tie", category="Hardware")) == [4, 5]
+    assert ids(CATALOG.search("12", category="Hardware")) == []
+    assert ids(CATALOG.search("", category="Tools")) == [1, 2, 7, 12]
+    assert ids(CATALOG.search("tie", category="Garden")) == []
+
+
+def test_limit_stops_each_tier():
+    assert ids(CATALOG.search("tie", limit=1)) == [7]
+    assert ids(CATALOG.search("tie", limit=3)) == [7, 4, 1]
+    assert ids(CATALOG.search("", limit=2)) == [3, 1]
+
+
+def test_index_without_categories_matches_none_by_category():
+    suppliers = SearchIndex([{"supplier_id": 1, "supplier_name": "Acme"}], "supplier_id", "supplier_name")
+
+    assert ids(suppliers.search("acm", category="Tools")) == []
+    assert [s["supplier_id"] for s in suppliers.search("acm")] == [1]
+
+
+def test_duplicate_names_are_labelled_with_their_id():
+    duplicates = index([(1, "Bolt", "Tools"), (2, "Bolt", "Tools"), (3, "Nut", "Tools")])
+
+    assert [duplicates.label(i) for i in (1, 2, 3)] == ["Bolt (#1)", "Bolt (#2)", "Nut"]
@@ -0,0 +1,148 @@
+"""
+Single-flight fetches and invalidation in query_cache.
+"""
+
+import threading
+import time
+
+import pytest
+
+import query_cache
+
+
+class Source:
+    # A reader body that counts its calls and can be held open until released
+    def __init__(self):
+        self.calls = 0
+        self.value = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.error = None
+
+    def __call__(self, client):
+        self.calls += 1
+        started = self.value
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return started
+
+
+@pytest.fixture
+def source():
+    query_cache.clear()
+    yield Source()
+    query_cache.clear()
+
+
+def reader(source, ttl=60, depends_on=None):
+    # A fresh cached reader per test, registered under a unique name
+    def fetch(client):
+        return source(client)
+    fetch.__qualname__ = f"fetch_{id(source)}_{ttl}"
+    return query_cache.cached(ttl=ttl, depends_on=depends_on or {"products_": ("price",)})(fetch)
+
+
+def run_concurrently(func, count):
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(func())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_concurrent_misses_share_one_fetch(source):
+    cached = reader(source)
+    client = object()
+    source.release.clear()
+    threads, results, _ = run_concurrently(lambda: cached(client), 10)
+    time.sleep(0.1)
+    source.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert source.calls == 1
+    assert results == [0] * 10
+    assert query_cache.stats()[cached.cache_name]["coalesced"] == 9
+
+
+def test_flight_error_reaches_every_waiter(source):
+    cached = reader(source)
+    client = object()
+    source.error = RuntimeError("backend down")
+    source.release.clear()
+    threads, results, errors = run_concurrently(lambda: cached(client), 5)
+    time.sleep(0.1)
+    source.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert source.calls == 1
+    assert results == []
+    assert len(errors) == 5 and all(str(e) == "backend down" for e in errors)
+    # Failures are not cached
+    source.error = None
+    assert cached(client) == 0
+    assert source.calls == 2
+
+
+def test_fetch_racing_an_invalidation_is_not_stored(source):
+    cached = reader(source)
+    client = object()
+    source.release.clear()
+    first = threading.Thread(target=cached, args=(client,))
+    first.start()
+    time.sleep(0.05)
+
+    # The data changes while the first fetch is in flight
+    source.value = 1
+    query_cache.invalidate("products_")
+    source.release.set()
+    first.join()
+
+    # Neither the stale result was stored nor did this call join the old flight
+    assert cached(client) == 1
+    assert source.calls == 2
+    assert cached(client) == 1
+    assert source.calls == 2
+
+
+def test_invalidation_by_column(source):
+    cached = reader(source)
+    client = object()
+    cached(client)
+    query_cache.invalidate("products_", ["stock_quantity"])
+    query_cache.invalidate("reorders")
+    cached(client)
+    assert source.calls == 1
+
+    source.value = 1
+    query_cache.invalidate("products_", ["price", "stock_quantity"])
+    assert cached(client) == 1
+    assert source.calls == 2
+
+
+def test_version_moves_on_every_invalidation(source):
+    before = query_cache.version()
+    query_cache.invalidate("suppliers")
+    assert query_cache.version() == before + 1
+
+
+def test_live_tables_do_not_expire(source):
+    cached = reader(source, ttl=0.05)
+    client = object()
+    query_cache.set_live(["products_"], True)
+    try:
+        cached(client)
+        time.sleep(0.1)
+        cached(client)
+        assert source.calls == 1
+    finally:
+        query_cache.set_live(["products_"], False)
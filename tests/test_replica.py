@@ -0,0 +1,162 @@
+"""
+TableReplica syncs on the fake client: the watermark overlap, change-feed
+events during a read, mark_stale racing a read, first-load waiters, retries
+and the circuit breaker.
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import circuit_breaker
+import query_cache
+import replica
+from circuit_breaker import CircuitBreaker, GuardedClient
+from fake_supabase import FakeSupabase, generate_dataset
+from replica import TableReplica
+
+
+class Backend:
+    # latency callable for FakeSupabase: runs `during` once inside the next request,
+    # holds requests while `hold` is clear, and fails the next `failures` requests
+    # or all of them while down
+    def __init__(self):
+        self.during = None
+        self.hold = threading.Event()
+        self.hold.set()
+        self.entered = threading.Event()
+        self.failures = 0
+        self.down = False
+
+    def __call__(self):
+        self.entered.set()
+        self.hold.wait(5)
+        during, self.during = self.during, None
+        if during is not None:
+            during()
+        if self.down or self.failures:
+            self.failures = max(self.failures - 1, 0)
+            raise ConnectionError("connection refused")
+        return 0.0
+
+
+@pytest.fixture
+def backend():
+    query_cache.clear()
+    replica.clear()
+    yield Backend()
+    query_cache.clear()
+    replica.clear()
+
+
+@pytest.fixture
+def client(backend):
+    return FakeSupabase(generate_dataset(products=50, seed=9), latency=backend)
+
+
+def products(**options):
+    return TableReplica("products_", **replica.TABLES["products_"], **options)
+
+
+def by_id(rows):
+    return {row["product_id"]: row for row in rows}
+
+
+def test_delta_reads_rows_committed_late_below_the_watermark(client):
+    table = products(min_sync_interval=0)
+    table.rows(client)
+    late = client.tables["products_"][0]
+    older = client.tables["products_"][1]
+    watermark = datetime.fromisoformat(table._watermark)
+
+    # Committed after the load with an updated_at inside the overlap, and outside it
+    late.update(price=1.5, updated_at=(watermark - timedelta(seconds=30)).isoformat())
+    older.update(price=2.5, updated_at=(watermark - timedelta(seconds=120)).isoformat())
+    rows = by_id(table.rows(client))
+
+    assert rows[late["product_id"]]["price"] == 1.5
+    assert rows[older["product_id"]]["price"] != 2.5
+
+
+def test_events_during_a_read_are_replayed_over_its_result(client, backend):
+    table = products()
+    changed, deleted = client.tables["products_"][:2]
+    event = dict(changed, price=99.0)
+    # Delivered while the first load is in flight; the read returns the older rows
+    backend.during = lambda: (table.apply_change("UPDATE", event, {}),
+                              table.apply_change("DELETE", {}, {"product_id": deleted["product_id"]}))
+
+    rows = by_id(table.rows(client))
+
+    assert rows[changed["product_id"]]["price"] == 99.0
+    assert deleted["product_id"] not in rows
+
+
+def test_read_racing_mark_stale_is_not_trusted(client, backend):
+    table = products()
+    backend.during = table.mark_stale
+
+    table.rows(client)
+    requests = client.requests
+    table.rows(client)
+
+    # Inside min_sync_interval, but the first read may predate the write that marked it
+    assert client.requests > requests
+
+
+def test_first_load_is_shared_by_concurrent_readers(client, backend):
+    table = products()
+    backend.hold.clear()
+    results = []
+    readers = [threading.Thread(target=lambda: results.append(table.rows(client))) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    backend.entered.wait(5)
+    backend.hold.set()
+    for thread in readers:
+        thread.join(5)
+
+    assert [len(rows) for rows in results] == [50] * 4
+    # One load: its page of 50 rows and the empty page that ends the scan
+    assert client.requests == 2
+
+
+def test_waiter_retries_after_a_failed_first_load(client, backend):
+    table = products()
+    backend.hold.clear()
+    backend.failures = 1
+    outcomes = []
+
+    def read():
+        try:
+            outcomes.append(len(table.rows(client)))
+        except ConnectionError as e:
+            outcomes.append(e)
+
+    first = threading.Thread(target=read)
+    first.start()
+    backend.entered.wait(5)
+    second = threading.Thread(target=read)
+    second.start()
+    # The first load fails; the reader waiting on it then loads for itself
+    backend.hold.set()
+    first.join(5)
+    second.join(5)
+
+    assert isinstance(outcomes[0], ConnectionError) and outcomes[1] == 50
+
+
+def test_open_breaker_serves_the_loaded_rows_without_a_request(client, backend):
+    guarded = GuardedClient(client, CircuitBreaker(failure_threshold=1))
+    table = products(min_sync_interval=0)
+    table.rows(guarded)
+
+    backend.down = True
+    with pytest.raises(ConnectionError):
+        guarded.table("suppliers").select("supplier_id").execute()
+    assert circuit_breaker.get_breaker(guarded).is_open()
+    requests = client.requests
+
+    assert len(table.rows(guarded)) == 50
+    assert client.requests == requests
@@ -0,0 +1,102 @@
+"""
+Snapshot exports that die half way, rows that commit late, and exports from
+another backend.
+"""
+
+from datetime import date
+
+import pytest
+
+import db_functions
+
+import snapshots
+from fake_supabase import generate_dataset
+from sqlite_backend import SQLiteClient
+
+
+@pytest.fixture
+def dataset():
+    return generate_dataset(products=200, seed=4)
+
+
+def sqlite_client(path, tables):
+    client = SQLiteClient(str(path))
+    client.load_tables(tables)
+    return client
+
+
+def entry_ids(base_dir):
+    return snapshots.read_snapshot("stock_entries", columns=["entry_id"], base_dir=base_dir) \
+        .column("entry_id").to_pylist()
+
+
+def test_failed_run_leaves_no_duplicate_rows(tmp_path, dataset, monkeypatch):
+    client = sqlite_client(tmp_path / "a.db", dataset)
+    base_dir = str(tmp_path / "snapshots")
+    write_state = snapshots._write_state
+    calls = []
+
+    def dies_on_second_flush(directory, state):
+        calls.append(state["last_key"])
+        if len(calls) == 2:
+            raise OSError("disk full")
+        write_state(directory, state)
+
+    monkeypatch.setattr(snapshots, "_write_state", dies_on_second_flush)
+    with pytest.raises(OSError):
+        snapshots.export_snapshots(client, ["stock_entries"], base_dir, batch_rows=1000)
+    # The parts of the unrecorded flush are on disk but not read
+    assert sorted(entry_ids(base_dir)) == list(range(1, calls[0] + 1))
+
+    # Different batch boundaries give the rewritten parts other names
+    monkeypatch.setattr(snapshots, "_write_state", write_state)
+    snapshots.export_snapshots(client, ["stock_entries"], base_dir, batch_rows=5000)
+
+    assert sorted(entry_ids(base_dir)) == [r["entry_id"] for r in dataset["stock_entries"]]
+
+
+def test_export_is_only_used_with_its_own_backend(tmp_path, dataset):
+    first = sqlite_client(tmp_path / "a.db", dataset)
+    second = sqlite_client(tmp_path / "b.db", dataset)
+    base_dir = str(tmp_path / "snapshots")
+
+    snapshots.export_snapshots(first, ["stock_entries"], base_dir)
+
+    assert snapshots.snapshot_state("stock_entries", base_dir, supabase=first) is not None
+    assert snapshots.snapshot_state("stock_entries", base_dir, supabase=second) is None
+
+    # Exporting from the other backend replaces the snapshot instead of appending to it
+    second.table("stock_entries").insert({
+        "product_id": 1, "change_quantity": 5, "change_type": "Restock", "entry_date": "2026-01-02",
+    }).execute()
+    snapshots.export_snapshots(second, ["stock_entries"], base_dir)
+    state = snapshots.snapshot_state("stock_entries", base_dir, supabase=second)
+    assert state["rows"] == len(dataset["stock_entries"]) + 1
+    assert len(entry_ids(base_dir)) == state["rows"]
+
+
+def test_rows_committed_below_the_exported_key_are_not_lost(tmp_path, dataset, monkeypatch):
+    client = sqlite_client(tmp_path / "a.db", dataset)
+    base_dir = str(tmp_path / "snapshots")
+    monkeypatch.setattr(snapshots, "DEFAULT_DIR", base_dir)
+    # A transaction holding this entry_id has not committed yet
+    late = dict(dataset["stock_entries"][-5])
+    client._conn.execute("DELETE FROM stock_entries WHERE entry_id = ?", (late["entry_id"],))
+    client._conn.commit()
+    snapshots.export_snapshots(client, ["stock_entries"], base_dir)
+    state = snapshots.snapshot_state("stock_entries", base_dir)
+    assert state["last_key"] > late["entry_id"] and late["entry_id"] in state["missing"]
+
+    # It commits after the export
+    client.table("stock_entries").insert(late).execute()
+
+    # The dashboard's read of the rows the snapshot lacks finds it
+    since = date.fromisoformat(min(r["entry_date"] for r in dataset["stock_entries"])[:10])
+    tail = [row for page in db_functions._snapshot_pages(client, state, (late["change_type"],), since)
+            if isinstance(page, list) for row in page]
+    assert [row["entry_id"] for row in tail] == [late["entry_id"]]
+
+    # And the next export adds it once
+    assert snapshots.export_snapshots(client, ["stock_entries"], base_dir) == {"stock_entries": 1}
+    assert sorted(entry_ids(base_dir)) == [r["entry_id"] for r in dataset["stock_entries"]]
+    assert snapshots.snapshot_state("stock_entries", base_dir)["missing"] == []
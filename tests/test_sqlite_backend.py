@@ -0,0 +1,65 @@
+"""
+The SQLite backend's stock_entries_daily rollup, kept by triggers like the
+Postgres one.
+"""
+
+from datetime import date
+
+import pytest
+
+import db_functions
+from fake_supabase import generate_dataset
+from sqlite_backend import SQLiteClient
+
+
+@pytest.fixture
+def client():
+    client = SQLiteClient()
+    client.load_tables(generate_dataset(products=30, seed=12))
+    return client
+
+
+def rollup(client):
+    rows = client._conn.execute(
+        "SELECT product_id, change_type, day, entry_count, total_quantity, total_abs_quantity "
+        "FROM stock_entries_daily"
+    ).fetchall()
+    return sorted(tuple(row) for row in rows)
+
+
+def regrouped(client):
+    rows = client._conn.execute(
+        "SELECT product_id, change_type, date(entry_date), COUNT(*), SUM(change_quantity), "
+        "SUM(ABS(change_quantity)) FROM stock_entries GROUP BY 1, 2, 3"
+    ).fetchall()
+    return sorted(tuple(row) for row in rows)
+
+
+def test_rollup_follows_inserts_updates_and_deletes(client):
+    assert rollup(client) == regrouped(client)
+    entry = client.table("stock_entries").select("*").limit(1).execute().data[0]
+
+    client.table("stock_entries").insert({
+        "product_id": entry["product_id"], "change_quantity": -7, "change_type": "Sale",
+        "entry_date": entry["entry_date"],
+    }).execute()
+    client.table("stock_entries").update({"change_quantity": 3, "entry_date": "2020-01-01"}) \
+        .eq("entry_id", entry["entry_id"]).execute()
+    assert rollup(client) == regrouped(client)
+
+    with client._conn:
+        client._conn.execute("DELETE FROM stock_entries WHERE entry_id = ?", (entry["entry_id"],))
+    assert rollup(client) == regrouped(client)
+    assert not [row for row in rollup(client) if row[2] == "2020-01-01"]
+
+
+def test_window_reads_the_rollup_without_a_failed_request(client):
+    since = date(2000, 1, 1)
+    client.reset_counters()
+
+    rows = [row for page in db_functions._window_pages(client, ("Sale", "Restock"), since) for row in page]
+
+    # One page of rollup rows and the empty page after it
+    assert client.requests == 2
+    assert sum(abs(r["change_quantity"]) for r in rows if r["change_type"] == "Sale") == client._conn.execute(
+        "SELECT SUM(ABS(change_quantity)) FROM stock_entries WHERE change_type = 'Sale'").fetchone()[0]
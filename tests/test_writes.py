@@ -0,0 +1,96 @@
+"""
+db_functions writes, through their RPCs on SQLite and their row-by-row
+fallbacks on the fake client.
+"""
+
+import pytest
+
+import query_cache
+import replica
+from db_functions import _new_product_id, add_new_manual_id, mark_reorder_as_received, mark_reorders_as_received
+from fake_supabase import FakeSupabase, generate_dataset
+from sqlite_backend import SQLiteClient
+
+
+@pytest.fixture(autouse=True)
+def clear_state():
+    query_cache.clear()
+    replica.clear()
+    yield
+    query_cache.clear()
+    replica.clear()
+
+
+@pytest.fixture
+def dataset():
+    return generate_dataset(products=20, seed=11)
+
+
+@pytest.fixture
+def sqlite_client(dataset):
+    client = SQLiteClient()
+    client.load_tables(dataset)
+    return client
+
+
+def add_widget(client, supplier_id):
+    return add_new_manual_id(client, None, "Widget", "Tools", 2.5, 10, 3, supplier_id)
+
+
+@pytest.mark.parametrize("backend", ["rpc", "fallback"])
+def test_add_new_manual_id_returns_the_new_product_id(backend, dataset, sqlite_client):
+    client = sqlite_client if backend == "rpc" else FakeSupabase(dataset)
+    supplier_id = dataset["suppliers"][0]["supplier_id"]
+
+    product_id = add_widget(client, supplier_id)
+
+    assert isinstance(product_id, int)
+    [row] = client.table("products_").select("product_name").eq("product_id", product_id).execute().data
+    assert row["product_name"] == "Widget"
+
+
+@pytest.mark.parametrize("data", [42, [42], [{"add_new_product_manual_id": 42}]])
+def test_new_product_id_accepts_every_scalar_shape(data):
+    assert _new_product_id(data) == 42
+
+
+def open_reorders(dataset, count):
+    return [r["reorder_id"] for r in dataset["reorders"] if r["status"] in ("Pending", "Ordered")][:count]
+
+
+def stock(client):
+    return {p["product_id"]: p["stock_quantity"]
+            for p in client.table("products_").select("product_id, stock_quantity").execute().data}
+
+
+def test_fallback_receives_a_batch_like_the_rpc():
+    dataset = generate_dataset(products=100, seed=11)
+    fake = FakeSupabase(dataset)
+    sqlite_client = SQLiteClient()
+    sqlite_client.load_tables(dataset)
+    # A reorder already received and one that does not exist
+    received = next(r["reorder_id"] for r in dataset["reorders"] if r["status"] == "Received")
+    reorder_ids = open_reorders(dataset, 10) + [received, 10 ** 6]
+    products = {r["product_id"] for r in dataset["reorders"] if r["reorder_id"] in reorder_ids[:10]}
+
+    outcomes = mark_reorders_as_received(fake, None, reorder_ids)
+    requests = fake.requests
+
+    assert outcomes == mark_reorders_as_received(sqlite_client, None, reorder_ids)
+    assert list(outcomes.values()) == ["Received"] * 10 + ["Not found or already received"] * 2
+    assert stock(fake) == stock(sqlite_client)
+    assert len(fake.tables["shipments"]) == len(dataset["shipments"]) + 10
+    assert len(fake.tables["stock_entries"]) == len(dataset["stock_entries"]) + 10
+    # The missing RPC, then batched reads and inserts; only the stock updates are one per product
+    assert requests == 1 + 7 + len(products)
+
+
+def test_fallback_does_not_receive_a_reorder_twice(dataset):
+    fake = FakeSupabase(dataset)
+    [reorder_id] = open_reorders(dataset, 1)
+    mark_reorder_as_received(fake, None, reorder_id)
+    before = stock(fake)
+
+    with pytest.raises(Exception, match="not found or already received"):
+        mark_reorder_as_received(fake, None, reorder_id)
+    assert stock(fake) == before